@@ -0,0 +1,301 @@
+# benchmark harness over scaled families of the demo workloads
+# usage: python -m bench.run [--families name ...] [--out results.json] [--metrics] [--mode-options key=value ...] [synth options as key=value ...]
+#        python -m bench.run --compare base.json new.json [--threshold 0.2]
+import argparse
+import itertools
+import json
+import multiprocessing
+import queue
+import resource
+import sys
+import time
+from bench.workloads import NARROW_SPECS, WORKLOADS, make_btor_solver, pipelined_adder_library
+from src.batch_sim import BatchSimulator
+from src.counterexamples import CounterexamplePool
+from src.feasibility import InfeasibleError
+from src.library_search import LibrarySearch
+from src.metrics import MetricsCollector
+from src.parallel import CubeAndConquer, Portfolio, default_configs, make_solver
+from src.terms import term_size
+
+def build(solver, workload, **kwargs):
+    #the workload, with verify_solver given by backend name (e.g. verify_solver="btor" on the command line),
+    #module level so the worker processes of the parallel modes can build it as well
+    if isinstance(kwargs.get("verify_solver"), str):
+        kwargs["verify_solver"] = make_solver(kwargs["verify_solver"])
+    return WORKLOADS[workload](solver, **kwargs)
+
+# how a family is solved, each mode returns (found, extra record fields), the cegis stats of a record are those of cs
+def solve_run(cs, workload, kwargs):
+    return cs.run() is not None, {}
+
+def solve_build(cs, workload, kwargs):
+    # encoding construction only, see the term_cache of the record
+    return None, {}
+
+def solve_optimize(cs, workload, kwargs, objective = "output", search = "binary"):
+    netlist, cost, infeasible = cs.optimize(objective, search = search)
+    return netlist is not None, {"cost": cost, "infeasible": infeasible}
+
+def solve_enumerate(cs, workload, kwargs, limit = 10, timeout = None):
+    start = time.perf_counter()
+    times = [time.perf_counter() - start for _ in cs.enumerate(limit, timeout)]
+    return len(times) > 0, {"solutions": len(times), "solution_times": times, "blocking_lemmas": len(cs.cegis.lemmas)}
+
+def solve_unbounded(cs, workload, kwargs, engine = "kind"):
+    netlist = cs.run_unbounded(engine)
+    return netlist is not None, {"proof": cs.proof.status, "final_num_cycles": cs.proof.num_cycles}
+
+def solve_abstracted(cs, workload, kwargs, widths = (2, 4)):
+    netlist = cs.run_abstracted(NARROW_SPECS[workload](**kwargs), tuple(widths))
+    return netlist is not None, {"found_width": cs.abstraction.width, "abstraction": cs.abstraction.stats}
+
+def solve_stress(cs, workload, kwargs, num_traces = 100000, num_cycles = 100):
+    # the synthesized circuit on random traces far beyond the synthesis bound, against the concrete spec of the workload
+    netlist = cs.run()
+    if netlist is None:
+        return False, {}
+    if cs.cegis_options.sim_spec is None:
+        raise ValueError(f"{workload} has no concrete spec to stress test against")
+    start = time.perf_counter()
+    failing = BatchSimulator(cs.enc).stress(netlist, cs.cegis_options.sim_spec, num_traces, num_cycles)
+    elapsed = time.perf_counter() - start
+    return True, {"stress_time": elapsed, "trace_cycles_per_s": num_traces * num_cycles / elapsed, "failing_traces": len(failing)}
+
+def solve_warm_start(cs, workload, kwargs, keep = None, related_timing = False):
+    # the counterexamples of a first run on cs, ranked, seed a related problem (the workload with timing = related_timing),
+    # which is solved cold and warm started
+    cs.run()
+    pool = CounterexamplePool.from_cegis(cs.cegis, rank = True).best(keep)
+    extra = {}
+    for start in ("cold", "warm"):
+        related_cs = build(make_btor_solver(), workload, **{**kwargs, "timing": related_timing})
+        seeded = pool.seed(related_cs.cegis) if start == "warm" else 0
+        found = related_cs.run() is not None
+        stats = related_cs.cegis.stats
+        extra[start] = {"found": found, "seeded": seeded, "iterations": stats["iterations"], "time": stats["time"]}
+    return found, extra
+
+def solve_portfolio(cs, workload, kwargs, timeout = None):
+    # the workload on every default solver configuration at once, see src.parallel.default_configs
+    configs = [{**config, "kwargs": {"workload": workload, **kwargs}} for config in default_configs()]
+    portfolio = Portfolio(build, configs, timeout)
+    res = portfolio.run()
+    return None if res is None else res[1] is not None, {"status": portfolio.status, "winner": None if res is None else res[0], "exits": portfolio.exits, "errors": portfolio.errors}
+
+def solve_cube(cs, workload, kwargs, num_workers = 1, cubes_per_worker = 4, timeout = None):
+    # compare the solve_time of the records with increasing num_workers for the speedup
+    cc = CubeAndConquer(build, num_workers, cubes_per_worker * num_workers, {"kwargs": {"workload": workload, **kwargs}}, timeout)
+    netlist = cc.run()
+    return None if cc.status not in ("sat", "unsat") else netlist is not None, {
+        "status": cc.status,
+        "cubes": sum(stats["cubes"] for stats in cc.stats.values()),
+        "shared_counterexamples": sum(stats["received"] for stats in cc.stats.values()),
+        "errors": cc.errors,
+    }
+
+def solve_library_search(cs, workload, kwargs, max_size = 6, num_workers = 1):
+    # smallest library made of the entries of kwargs["library"], which cs is built with one of each
+    kwargs = dict(kwargs)
+    menu = tuple((name, pargs) for name,pargs in kwargs.pop("library"))
+    search = LibrarySearch(pipelined_adder_library, menu, max_size = max_size, num_workers = num_workers, config = {"kwargs": kwargs})
+    res = search.run()
+    return res is not None, {"status": search.status, "library": None if res is None else [name for name,_ in res[0]], "tried": [([name for name,_ in library], status) for library,status in search.tried]}
+
+MODES = {
+    "run": solve_run,
+    "build": solve_build,
+    "optimize": solve_optimize,
+    "enumerate": solve_enumerate,
+    "unbounded": solve_unbounded,
+    "abstracted": solve_abstracted,
+    "stress": solve_stress,
+    "warm_start": solve_warm_start,
+    "portfolio": solve_portfolio,
+    "cube": solve_cube,
+    "library_search": solve_library_search,
+}
+
+# adders, registers and subtractors for the pipelined adder
+MENU = (
+    ("Add", {"N": 4, "delay": 1}),
+    ("Register", {"N": 4, "init": 0, "setup": 1, "hold": 1, "output_delay": 1}),
+    ("Sub", {"N": 4, "delay": 1}),
+)
+
+# a pipelined adder library with 1 bit outputs nothing reads, kept unless pruned
+PRESOLVE_LIBRARY = (("Add", {"N": 4, "delay": 1}),) * 3 + (("Register", {"N": 4, "init": 0, "setup": 1, "hold": 1, "output_delay": 1}),) * 2 + (("Equal", {"N": 4, "delay": 1}),) * 2
+# and with 8 bit inputs nothing drives, infeasible unless pruned
+PRESOLVE_PADDED = PRESOLVE_LIBRARY + (("Mul", {"N": 8, "delay": 1}),) * 2
+
+# workload, parameter grid and optionally the mode (run if not given) and the grid of its arguments of each family,
+# every combination is one run, the grid may hold synth options (e.g. incremental) next to the workload parameters
+FAMILIES = {
+    "pipelined_adder": ("pipelined_adder", {"depth": (1, 2, 3), "width": (4, 8), "num_cycles": (5, 10), "timing": (False, True)}),
+    "sequence_detector": ("sequence_detector", {"sequence": ((0, 2), (0, 2, 3), (0, 2, 3, 1)), "num_registers": (2, 3), "num_cycles": (8, 12), "timing": (False, True)}),
+    "fib": ("fib", {"width": (4, 8), "num_cycles": (5, 10, 20)}),
+    "adder_library": ("adder_library", {"num_ops": (5, 10, 20), "num_inputs": (3, 4)}),
+    "solver_modes": ("pipelined_adder", {"verify_solver": (None, "btor"), "incremental": (False, True)}),
+    "batch_counterexamples": ("pipelined_adder", {"num_counterexamples": (1, 2, 4, 8), "incremental": (True,)}),
+    "symmetry": ("adder_library", {"num_ops": (5, 10), "symmetry_breaking": (False, True), "incremental": (True,)}),
+    "lvar_encodings": ("adder_library", {"num_ops": (10, 20, 30), "lvar_encoding": ("binary", "onehot", "unary"), "incremental": (True,)}),
+    "lazy_timing": ("pipelined_adder", {"depth": (1, 2), "lazy_timing": (False, True), "incremental": (True,)}),
+    "lazy_timing_sequence_detector": ("sequence_detector", {"lazy_timing": (False, True), "incremental": (True,)}),
+    "truncation": ("sequence_detector", {"truncate_counterexamples": (False, True), "incremental": (True,)}),
+    "bounded_pool": ("sequence_detector", {"max_instances": (None, 16, 4), "incremental": (True,)}),
+    "presolve": ("pipelined_adder_library", {"library": (PRESOLVE_LIBRARY, PRESOLVE_PADDED), "presolve": (False, True), "prune": (False, True), "incremental": (True,)}),
+    "encoding_cache": ("adder_library", {"num_ops": (10, 20, 40), "num_inputs": (4,)}, "build"),
+    "optimize": ("pipelined_adder", {"depth": (1, 2), "width": (4,), "num_cycles": (5,), "timing": (True,)}, "optimize"),
+    "optimize_sequence_detector": ("sequence_detector", {"num_cycles": (8,), "timing": (True,)}, "optimize"),
+    "enumerate": ("adder_library", {"num_ops": (5, 10), "num_inputs": (3, 4)}, "enumerate"),
+    "unbounded": ("fib", {"width": (4, 8), "num_cycles": (3, 5)}, "unbounded"),
+    "width_abstraction": ("pipelined_adder", {"depth": (2,), "width": (8, 16, 32), "num_cycles": (10,)}, "abstracted"),
+    "batch_sim": ("pipelined_adder", {"depth": (2,), "incremental": (True,)}, "stress", {"num_traces": (100000, 1000000), "num_cycles": (100,)}),
+    "warm_start": ("pipelined_adder", {"incremental": (True,)}, "warm_start", {"keep": (None, 8)}),
+    "portfolio": ("sequence_detector", {}, "portfolio"),
+    "cube_and_conquer": ("adder_library", {"num_ops": (10,), "incremental": (True,)}, "cube", {"num_workers": (1, 2, 4, 8)}),
+    "library_search": ("pipelined_adder_library", {"library": (MENU,), "incremental": (True,)}, "library_search"),
+}
+
+# metrics compared between two result files, larger is worse for all of them
+COMPARED = ("build_time", "unroll_time", "solve_time", "iterations", "peak_rss_kib")
+
+def grid(params):
+    keys = tuple(params)
+    return [dict(zip(keys, values)) for values in itertools.product(*(params[k] for k in keys))]
+
+def run_one(workload, params, options, mode = "run", mode_options = None, metrics = False):
+    #one benchmark run, meant to be called in a fresh process so peak RSS belongs to this run only
+    kwargs = {**params, **options}
+    collector = MetricsCollector() if metrics else None
+    start = time.perf_counter()
+    try:
+        cs = build(make_btor_solver(), workload, **kwargs, **({"observers": (collector,)} if collector is not None else {}))
+    except InfeasibleError as e:
+        # proven to have no solution before any encoding was built, e.g. by presolve
+        return {"found": False, "build_time": time.perf_counter() - start, "infeasible": str(e)}
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    found, extra = MODES[mode](cs, workload, kwargs, **(mode_options or {}))
+    solve = time.perf_counter() - start
+    stats = cs.cegis.stats
+    instances = [instance for instance in cs.cegis.instances if instance is not None]
+    record = {
+        "found": found,
+        "build_time": build_time,
+        "encode_time": cs.stats["encode_time"],
+        "unroll_time": cs.stats["unroll_time"],
+        "solve_time": solve,
+        "iterations": stats["iterations"],
+        "counterexamples": stats["counterexamples"],
+        "lemmas": stats["lemmas"],
+        "reactivations": stats["reactivations"],
+        "reactivation_checks": stats["reactivation_checks"],
+        "fresh_vars": sum(len(cs.cegis.fresh_vars(A_vals)) for A_vals in cs.cegis.counterexamples),
+        "synth_times": stats["synth_times"],
+        "verify_times": stats["verify_times"],
+        "terms": {"synth_base": term_size(cs.cegis.synth_base), "synth_constrain": term_size(cs.cegis.synth_constrain), "verify": term_size(cs.cegis.verify),
+                  "instances": term_size(*instances)},
+        "term_cache": {kind:{**counts, "hit_rate": cs.enc.cache.hit_rate(kind)} for kind,counts in cs.enc.cache.stats.items()},
+        "peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        **extra,
+    }
+    if collector is not None:
+        record["metrics"] = collector.summary()
+    return record
+
+def run_child(results, *args):
+    try:
+        results.put(run_one(*args))
+    except Exception as e:
+        results.put({"error": repr(e)})
+
+def run_isolated(ctx, *args):
+    #run_one in a fresh process, not a pool worker since the parallel modes start processes of their own
+    results = ctx.Queue()
+    process = ctx.Process(target = run_child, args = (results, *args))
+    process.start()
+    record = None
+    while record is None:
+        try:
+            record = results.get(timeout = 1)
+        except queue.Empty:
+            if not process.is_alive():
+                try:
+                    record = results.get(timeout = 1)
+                except queue.Empty:
+                    record = {"error": f"benchmark process exited with code {process.exitcode}"}
+    process.join()
+    return record
+
+def run(families, options, mode_options = None, metrics = False):
+    results = []
+    ctx = multiprocessing.get_context("spawn")
+    for family in families:
+        workload, params, *rest = FAMILIES[family]
+        mode = rest[0] if len(rest) > 0 else "run"
+        mode_grid = rest[1] if len(rest) > 1 else {}
+        for p in grid(params):
+            for m in grid(mode_grid):
+                # mode options given on the command line override the family's
+                m = {**m, **(mode_options or {})}
+                record = run_isolated(ctx, workload, p, options, mode, m, metrics)
+                record = {"family": family, "mode": mode, "params": p, "mode_options": m, "options": options, **record}
+                results.append(record)
+                found = "-" if record.get("found") is None else "sat" if record["found"] else "unsat"
+                summary = record.get("error") or f"iterations {record.get('iterations', 0):4}  build {record['build_time']:8.3f}s  solve {record.get('solve_time', 0.0):8.3f}s  {found}"
+                print(f"{family:18} {p} {m}  {summary}", file = sys.stderr)
+    return results
+
+def key(record):
+    return record["family"], json.dumps(record["params"], sort_keys = True), json.dumps(record.get("mode_options", {}), sort_keys = True)
+
+def compare(base, new, threshold):
+    #ratios new/base of the compared metrics, returns the regressions larger than threshold
+    base = {key(r): r for r in base if "error" not in r}
+    regressions = []
+    for r in new:
+        if "error" in r or key(r) not in base:
+            continue
+        b = base[key(r)]
+        for metric in COMPARED:
+            # e.g. records of problems presolve proved infeasible have no solve metrics
+            if metric not in b or metric not in r or b[metric] <= 0:
+                continue
+            ratio = r[metric] / b[metric]
+            print(f"{r['family']:18} {r['params']}  {metric:14} {b[metric]:12.3f} -> {r[metric]:12.3f}  x{ratio:.2f}")
+            if ratio > 1 + threshold:
+                regressions.append((r["family"], r["params"], metric, ratio))
+    return regressions
+
+def option(s):
+    k, v = s.split("=", 1)
+    return k, json.loads(v)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("options", nargs = "*", type = option, help = "extra CircuitSynth arguments as key=json_value")
+    parser.add_argument("--families", nargs = "+", default = list(FAMILIES), choices = list(FAMILIES))
+    parser.add_argument("--out", default = None)
+    parser.add_argument("--mode-options", nargs = "*", type = option, default = [], help = "arguments of the families' mode (e.g. objective, limit, engine, widths, num_workers) as key=json_value")
+    parser.add_argument("--metrics", action = "store_true", help = "add the MetricsCollector summary of every run")
+    parser.add_argument("--compare", nargs = 2, metavar = ("BASE", "NEW"))
+    parser.add_argument("--threshold", type = float, default = 0.2)
+    args = parser.parse_args()
+
+    if args.compare is not None:
+        with open(args.compare[0]) as f:
+            base = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        regressions = compare(base, new, args.threshold)
+        for family, params, metric, ratio in regressions:
+            print(f"regression: {family} {params} {metric} x{ratio:.2f}")
+        sys.exit(1 if len(regressions) > 0 else 0)
+
+    results = run(args.families, dict(args.options), dict(args.mode_options), args.metrics)
+    if args.out is None:
+        json.dump(results, sys.stdout, indent = 2)
+    else:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent = 2)
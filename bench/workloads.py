@@ -0,0 +1,155 @@
+import functools
+import pono
+import smt_switch as ss
+import smt_switch.primops as pops
+from smt_switch.sortkinds import BOOL, BV
+from src.nodes import Nodes
+from src.circuit_synth import CircuitSynth
+from src.library_search import make_ops
+from src.options import synth_options
+from src.spec import StepSpec
+
+def make_btor_solver():
+    s = ss.create_btor_solver(False)
+    s.set_opt('produce-models', 'true')
+    s.set_opt('incremental', 'true')
+    return s
+
+def pipelined_adder_spec(s, depth, width):
+    def spec(inputs):
+        BVsort = s.make_sort(BV, width)
+        if len(inputs) <= depth:
+            return (s.make_term(0, BVsort),)
+        else:
+            res = functools.reduce(lambda a,b: s.make_term(pops.BVAdd, a, b), inputs[-1 - depth])
+            return (res,)
+    return spec
+
+def pipelined_adder_sim_spec(depth):
+    # concrete pipelined adder spec on numpy arrays for the prefilter, the state holds the sums of the last depth cycles
+    def step(state, inputs):
+        window = state + (sum(inputs),)
+        return (window[0],), window[1:]
+    return StepSpec(step, tuple(0 for _ in range(depth)))
+
+def pipelined_adder(s, num_cycles = 10, depth = 2, width = 4, num_inputs = 4, timing = True, **kwargs):
+    # sum of the inputs delayed by depth cycles, from num_inputs - 1 adders and depth registers
+    fts = pono.FunctionalTransitionSystem(s)
+    n = Nodes(fts, 16)
+    spec = pipelined_adder_spec(s, depth, width)
+
+    adders = tuple(n.Add(N = width, delay = 1 if i == 0 else 2) for i in range(num_inputs - 1))
+    registers = tuple(n.Register(N = width, init = 0, setup = 1 + i % 2, hold = 2 - i % 2, output_delay = 1) for i in range(depth))
+    timing_kwargs = {"enforce_timing": True, "input_delays": tuple(1 for _ in range(num_inputs)), "cycle_delay": 5, "max_output_delays": (1,)} if timing else {}
+    return CircuitSynth(n, (tuple(width for _ in range(num_inputs)),(width,)), adders + registers, spec, num_cycles, **synth_options(**{"sim_spec": pipelined_adder_sim_spec(depth), **timing_kwargs, **kwargs}))
+
+def fib(s, num_cycles = 10, width = 4, **kwargs):
+    # fibonacci sequence on the output, from an adder and two registers
+    fts = pono.FunctionalTransitionSystem(s)
+    n = Nodes(fts, 16)
+
+    # the state holds the next two fibonacci numbers
+    BVsort = s.make_sort(BV, width)
+    spec = StepSpec(lambda state, inputs: ((state[0],), (state[1], s.make_term(pops.BVAdd, state[0], state[1]))),
+                    (s.make_term(0, BVsort), s.make_term(1, BVsort)))
+
+    # the same on numpy arrays for the prefilter
+    sim_spec = StepSpec(lambda state, inputs: ((state[0],), (state[1], state[0] + state[1])), (0, 1))
+
+    ops = (n.Add(N = width, delay = 1), n.Register(N = width, init = 0, setup = 1, hold = 1, output_delay = 1), n.Register(N = width, init = 1, setup = 1, hold = 1, output_delay = 1))
+    return CircuitSynth(n, ((width,),(width,)), ops, spec, num_cycles, **synth_options(**{"sim_spec": sim_spec, **kwargs}))
+
+def sequence_detector(s, num_cycles = 10, sequence = (0,2,3), delay = 2, num_registers = 2, timing = True, **kwargs):
+    # SequenceDetector op whose output has to be delayed by delay cycles with num_registers 1 bit registers
+    fts = pono.FunctionalTransitionSystem(s)
+    n = Nodes(fts, 16)
+
+    def sequence_detector_func(pargs, *inputs):
+        BVsort = s.make_sort(BV, pargs["N"])
+        seq = pargs["sequence"]
+        if len(inputs) < len(seq):
+            res =  s.make_term(0, s.make_sort(BOOL))
+        else:
+            seq = tuple(s.make_term(e, BVsort) for e in seq)
+            inputs = tuple(i[0] for i in inputs)
+            match = tuple(s.make_term(pops.Equal, i, e) for i,e in zip(inputs[-len(seq):], seq))
+            res = functools.reduce(lambda a,b: s.make_term(pops.And, a, b), match)
+        return (res,)
+
+    def spec(inputs):
+        BVsort = s.make_sort(BV, 4)
+        seq = sequence
+        if len(inputs) < (len(seq) + delay):
+            res =  s.make_term(0, s.make_sort(BOOL))
+        else:
+            seq = tuple(s.make_term(e, BVsort) for e in seq)
+            inputs = tuple(i[0] for i in inputs)
+            match = tuple(s.make_term(pops.Equal, i, e) for i,e in zip(inputs[-len(seq)-delay:len(inputs)-delay], seq))
+            res = functools.reduce(lambda a,b: s.make_term(pops.And, a, b), match)
+        return (res,)
+
+    def sequence_detector_delay_func(pargs, delay):
+        delaysort = s.make_sort(BV, n.delay_width)
+        setup = s.make_term(pargs["setup"], delaysort)
+        delay_with_setup = s.make_term(pops.BVAdd, delay, setup)
+        hold = s.make_term(pargs["hold"], delaysort)
+        delay_without_hold = s.make_term(pops.BVAdd, delay, s.make_term(pops.BVNeg, hold))
+        in_out_delay = s.make_term(pargs["delay"], delaysort)
+        return (delay_with_setup,), (delay_without_hold,),(s.make_term(pops.BVAdd, delay, in_out_delay),)
+
+    sequence_detector_sta_func = lambda pargs, delay: ((delay + pargs["setup"],), (delay - pargs["hold"],), (delay + pargs["delay"],))
+
+    # the state is the window of the last len(sequence) inputs
+    def sequence_detector_step_func(pargs, window, x):
+        BVsort = s.make_sort(BV, pargs["N"])
+        window = (window + (x,))[-len(pargs["sequence"]):]
+        if len(window) < len(pargs["sequence"]):
+            return (s.make_term(0, s.make_sort(BOOL)),), window
+        match = tuple(s.make_term(pops.Equal, i, s.make_term(e, BVsort)) for i,e in zip(window, pargs["sequence"]))
+        return (functools.reduce(lambda a,b: s.make_term(pops.And, a, b), match),), window
+
+    sequence_detector_type_func = lambda pargs: ((pargs["N"],), (1,))
+    SequenceDetector = n.make_spec("SequenceDetector", {"N": int, "sequence": tuple, "setup": int, "hold": int, "delay": int}, sequence_detector_func, sequence_detector_type_func, sequence_detector_delay_func, (False,),
+                                   sta_func = sequence_detector_sta_func, step_funcs = (lambda pargs: (), sequence_detector_step_func))
+
+    ops = (
+        SequenceDetector(N = 4, sequence = sequence, setup = 1, hold = 1, delay = 2),
+        n.Register(N = 4, init = 0, setup = 2, hold = 1, output_delay = 1),
+        ) + tuple(n.Register(N = 1, init = 0, setup = 1, hold = 1, output_delay = 1 if i == 0 else 0) for i in range(num_registers))
+    timing_kwargs = {"enforce_timing": True, "input_delays": (1,), "cycle_delay": 6, "max_output_delays": (3,)} if timing else {}
+    return CircuitSynth(n, ((4,),(1,)), ops, spec, num_cycles, **synth_options(**timing_kwargs, **kwargs))
+
+def adder_library(s, num_ops = 10, num_inputs = 4, num_cycles = 0, **kwargs):
+    # sum of the inputs from a library of num_ops adders, most of which stay unused
+    fts = pono.FunctionalTransitionSystem(s)
+    n = Nodes(fts, 16)
+
+    def spec(inputs):
+        return (functools.reduce(lambda a,b: s.make_term(pops.BVAdd, a, b), inputs[-1]),)
+
+    ops = tuple(n.Add(N = 4, delay = 1) for _ in range(num_ops))
+    return CircuitSynth(n, (tuple(4 for _ in range(num_inputs)),(4,)), ops, spec, num_cycles, **synth_options(**kwargs))
+
+def pipelined_adder_library(s, library, num_cycles = 10, depth = 2, width = 4, num_inputs = 4, **kwargs):
+    # the pipelined adder spec over a library of (name, pargs) ops, see src.library_search
+    fts = pono.FunctionalTransitionSystem(s)
+    n = Nodes(fts, 16)
+    return CircuitSynth(n, (tuple(width for _ in range(num_inputs)),(width,)), make_ops(n, library), pipelined_adder_spec(s, depth, width), num_cycles,
+                        **synth_options(**{"sim_spec": pipelined_adder_sim_spec(depth), **kwargs}))
+
+def pipelined_adder_narrow_spec(depth = 2, width = 4, **params):
+    # make_spec of pipelined_adder for CircuitSynth.run_abstracted
+    return lambda s, scale: pipelined_adder_spec(s, depth, scale(width))
+
+# make_spec builders of the workloads that can be solved through narrow copies, called with the workload parameters
+NARROW_SPECS = {
+    "pipelined_adder": pipelined_adder_narrow_spec,
+}
+
+WORKLOADS = {
+    "pipelined_adder": pipelined_adder,
+    "sequence_detector": sequence_detector,
+    "adder_library": adder_library,
+    "fib": fib,
+    "pipelined_adder_library": pipelined_adder_library,
+}
@@ -5,6 +5,7 @@ import smt_switch.primops as pops
 from smt_switch.sortkinds import BOOL, BV
 from src.nodes import Nodes
 from src.circuit_synth import CircuitSynth
+from src.spec import memoize_prefix
 
 s = ss.create_btor_solver(False)
 s.set_opt('produce-models', 'true')
@@ -20,7 +21,8 @@ def pipelined_adder(inputs):
     else:
         res = functools.reduce(lambda a,b: s.make_term(pops.BVAdd, a, b), inputs[-1 - depth])
         return (res,)
-    
+
+@memoize_prefix
 def fib(inputs):
     BVsort = s.make_sort(BV, 4)
     if len(inputs) == 1:
@@ -0,0 +1,64 @@
+from src.simulator import Simulator
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class BatchSimulator(Simulator):
+    #runs a decoded netlist on many input traces at once, one uint64 array entry per trace
+    #the ops' concrete sim functions are applied to whole arrays and every result is cast back and masked to its width,
+    #SpecNode sim callbacks get the arrays of every cycle so far, like their spec_func
+    def __init__(self, enc):
+        if np is None:
+            raise ImportError("BatchSimulator needs numpy")
+        super().__init__(enc)
+        widths = tuple(enc.types[0]) + tuple(enc.types[1]) + tuple(t for op in self.ops for tps in op.types for t in tps)
+        self.supported = self.supported and all(w <= 64 for w in widths)
+
+    def cast(self, vals, widths):
+        return tuple(np.asarray(v).astype(np.uint64) & np.uint64((1 << w) - 1) for v,w in zip(vals, widths))
+
+    def init_state(self, op, inputs):
+        num_traces = len(inputs[0][0]) if len(inputs) > 0 and len(inputs[0]) > 0 else 1
+        return np.full(num_traces, op.sim_init(), dtype = np.uint64)
+
+    # run is Simulator.run, with inputs holding one tuple of arrays (one per circuit input) per cycle
+    # and outputs of every cycle as tuples of arrays
+
+    def random_inputs(self, num_traces, num_cycles, seed = 0):
+        rng = np.random.default_rng(seed)
+        return [tuple(rng.integers(0, 1 << w, size = num_traces, dtype = np.uint64, endpoint = False) for w in self.enc.types[0]) for _ in range(num_cycles)]
+
+    @staticmethod
+    def mismatches(outputs, expected):
+        #boolean array of the traces on which two output sequences differ in any cycle
+        differ = None
+        for outs,exps in zip(outputs, expected):
+            for o,e in zip(outs, exps):
+                d = np.asarray(o) != np.asarray(e)
+                differ = d if differ is None else differ | d
+        return differ
+
+    @staticmethod
+    def failing(differ):
+        #indices of the traces that differ in any of the given boolean arrays
+        return np.flatnonzero(np.logical_or.reduce(differ))
+
+    def compare(self, netlist_a, netlist_b, inputs):
+        #traces on which two candidate circuits disagree
+        return self.mismatches(self.run(netlist_a, inputs), self.run(netlist_b, inputs))
+
+    def expected(self, reference, inputs):
+        #outputs of every cycle of a reference src.spec.StepSpec whose step works on arrays, cast like the circuit outputs
+        num_traces = len(inputs[0][0]) if len(inputs) > 0 and len(inputs[0]) > 0 else 1
+        state = reference.init
+        expected = []
+        for inputs_at_cycle in inputs:
+            outs, state = reference.step(state, inputs_at_cycle)
+            expected.append(self.cast(tuple(np.broadcast_to(o, (num_traces,)) for o in outs), self.enc.types[1]))
+        return expected
+
+    def stress(self, netlist, reference, num_traces, num_cycles, seed = 0):
+        #indices of random traces the netlist gets wrong, reference is a src.spec.StepSpec whose step works on arrays
+        inputs = self.random_inputs(num_traces, num_cycles, seed)
+        return np.flatnonzero(self.mismatches(self.run(netlist, inputs), self.expected(reference, inputs)))
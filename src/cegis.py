@@ -1,9 +1,19 @@
+import functools
 import itertools
+import time
+import smt_switch as ss
+from src.options import CegisOptions
+from src.terms import term_size, term_to_int
 import smt_switch.primops as pops
 from smt_switch.sortkinds import BOOL, BV
 
 class Cegis():
-    def __init__(self, solver, synth_base, synth_constrain, verify, E_vars, A_vars, D_vars):
+    count = 0
+
+    def __init__(self, solver, synth_base, synth_constrain, verify, E_vars, A_vars, D_vars, options = None, prefilter = None, translators = None, refine = None, observers = (),
+                 prefixes = None, distinguish = (), assumptions = None, shared = None, max_iterations = None, timeout = None):
+        #options is a src.options.CegisOptions, of which incremental, verify_solver, num_counterexamples and max_instances are used here
+        options = options if options is not None else CegisOptions()
         self.solver = solver
         self.synth_base = synth_base
         self.synth_constrain = synth_constrain
@@ -11,31 +21,394 @@ class Cegis():
         self.E_vars = E_vars
         self.A_vars = A_vars
         self.D_vars = D_vars
+        self.incremental = options.incremental
+        self.verify_solver = options.verify_solver
+        self.prefilter = prefilter
+        self.num_counterexamples = options.num_counterexamples
+        # refine(E_vals) returns constraints the candidate violates without running the verifier, e.g. timing paths
+        self.refine = refine
+        # observers get an event for every solver call and counterexample, see src/metrics.py
+        self.observers = tuple(observers)
+        self.max_iterations = max_iterations
+        self.timeout = timeout
+        # nodes of every term handed to the synth solver so far, only tracked for observers
+        self.terms_seen = set()
+        self.term_count = 0
+        self.counterexamples = []
+        # instances[k] is None while counterexample k is evicted from a bounded pool
+        self.instances = []
+        # with max_instances, only that many instances are asserted, each behind an activation literal,
+        # the least recently added or reactivated one is evicted to make room and reactivated if a later candidate fails on it,
+        # which is the least recently used to refute a candidate: candidates always satisfy the active instances
+        self.max_instances = options.max_instances
+        # evicted counterexamples checked against each candidate, most recently evicted first
+        self.reactivation_checks = 8
+        # counterexample index to activation literal, least recently used first
+        self.active = {}
+        self.evicted = []
+        # guarded instances still asserted in the incremental scope after their eviction
+        self.stale = 0
+        self.num_instantiated = 0
+        # synthesize constraints of the current run, see open_scope
+        self.constraint = None
+        self.scope_literal = None
+        self.num_scopes = 0
+        self.scope_open = False
+        # assumption term to the literal implying it in the current incremental scope
+        self.assumption_literals = {}
+        self.lemmas = []
+        # asserted in every synthesize step of the next runs, but never turned into instances or lemmas,
+        # the list is read on every synthesize step, so its owner (e.g. CircuitSynth) can change it in place between runs
+        self.assumptions = assumptions if assumptions is not None else []
+        # shared(cegis) returns counterexamples found elsewhere (e.g. other processes), added before every synthesize step
+        self.shared = shared
+        # (check, synth_constrain, A_vars, D_vars) of every prefix of cycles, check holds if the last cycle of the prefix is correct,
+        # if set, counterexamples are cut after their first failing cycle and only instantiate the prefix up to it
+        self.prefixes = prefixes
+        # terms whose values tell counterexamples of one round apart, e.g. whether each output is right on each cycle,
+        # the next counterexample has to differ in them, and in the A_vars if there are none
+        self.distinguish = tuple(distinguish)
+        # every candidate refuted by a counterexample, in order
+        self.candidates = []
+        self.stats = self.empty_stats()
+        # fresh symbol names have to be unique across every Cegis built on the same solver
+        self.id = type(self).count
+        type(self).count += 1
+
+        verify_solver = self.verify_solver
+        if verify_solver is not None:
+            # the verifier holds Not(verify) for the lifetime of this object, each round only fixes the E_vars
+            if translators is None:
+                translators = (ss.TermTranslator(verify_solver), ss.TermTranslator(solver))
+            self.to_verifier, self.from_verifier = translators
+            verify_solver.push()
+            verify_solver.assert_formula(verify_solver.make_term(pops.Not, self.to_verifier.transfer_term(verify)))
+            self.verifier_E_vars = {var:self.to_verifier.transfer_term(var) for var in E_vars}
+
+    def close(self):
+        #release the synthesize scope and the verifier scope so another Cegis can use the same solvers
+        self.close_scope()
+        if self.verify_solver is not None:
+            self.verify_solver.pop()
+            self.verify_solver = None
+
+    def prefix(self, A_vals):
+        #(synth_constrain, A_vars, D_vars) of the shortest prefix of cycles covering a counterexample, the whole problem without prefixes
+        if self.prefixes is not None:
+            for _, synth_constrain, A_vars, D_vars in self.prefixes:
+                if all(var in A_vars for var in A_vals):
+                    return synth_constrain, A_vars, D_vars
+        return self.synth_constrain, self.A_vars, self.D_vars
+
+    def fresh_vars(self, A_vals):
+        _, A_vars, D_vars = self.prefix(A_vals)
+        return tuple(D_vars) + tuple(var for var in A_vars if var not in A_vals)
+
+    def instantiate(self, A_vals):
+        #copy of synth_constrain for one counterexample, with fresh dependent vars
+        #inputs missing from A_vals (e.g. a counterexample over fewer cycles) get fresh copies as well
+        self.num_instantiated += 1
+        n = self.num_instantiated
+        new_vars = {var:self.solver.make_symbol(f"{str(var)}@{self.id}_{n}", var.get_sort()) for var in self.fresh_vars(A_vals)}
+        mapping = {**A_vals, **new_vars}
+        return self.solver.substitute(self.prefix(A_vals)[0], mapping)
+
+    def count_terms(self, term):
+        if len(self.observers) > 0:
+            if self.term_count == 0:
+                self.term_count = term_size(self.synth_base, seen = self.terms_seen)
+            self.term_count += term_size(term, seen = self.terms_seen)
+
+    def add_counterexample(self, A_vals):
+        #returns the term to add to the synth constraints, the instance behind its activation literal if the pool is bounded
+        self.counterexamples.append(A_vals)
+        self.instances.append(None)
+        term = self.activate(len(self.counterexamples) - 1)
+        self.emit("on_counterexample", A_vals = A_vals, fresh_vars = len(self.fresh_vars(A_vals)), term_count = self.term_count)
+        return term
+
+    def activate(self, k):
+        if self.instances[k] is None:
+            self.instances[k] = self.instantiate(self.counterexamples[k])
+            self.count_terms(self.instances[k])
+        if self.max_instances is None:
+            return self.instances[k]
+        self.active[k] = self.solver.make_symbol(f"active@{self.id}_{self.num_instantiated}", self.solver.make_sort(BOOL))
+        while len(self.active) > self.max_instances:
+            evicted = next(iter(self.active))
+            del self.active[evicted]
+            self.instances[evicted] = None
+            self.evicted.append(evicted)
+            self.stale += 1
+        return self.guarded(k)
+
+    def guarded(self, k):
+        return self.solver.make_term(pops.Implies, self.active[k], self.instances[k])
 
-    def run(self):
-        # TODO edit this function to make better use of incremental solving
-        synth_constrain = self.solver.make_term(1, self.solver.make_sort(BOOL))
-        for i in itertools.count(1):
-            # synthesize step
+    def pooled_instances(self):
+        #instances to assert in a synthesize step
+        if self.max_instances is None:
+            return list(self.instances)
+        return [self.guarded(k) for k in self.active]
+
+    def refutes(self, E_vals, k):
+        #whether the instance of counterexample k excludes the candidate, on the prefix of cycles it covers
+        #with the E_vars and A_vars fixed, only the dependent vars are left, so this is mostly propagation
+        A_vals = self.counterexamples[k]
+        self.solver.push()
+        self.solver.assert_formula(self.solver.substitute(self.prefix(A_vals)[0], {**E_vals, **A_vals}))
+        sat = self.solver.check_sat().is_sat()
+        self.solver.pop()
+        return not sat
+
+    def reactivate(self, E_vals):
+        #index of an evicted counterexample the candidate fails on, None if there is none
+        #up to reactivation_checks of the most recently evicted are tried, the ones the candidate passes are tried last next time
+        passed = []
+        found = None
+        for k in reversed(self.evicted[-self.reactivation_checks:]):
+            self.stats["reactivation_checks"] += 1
+            if self.refutes(E_vals, k):
+                found = k
+                break
+            passed.append(k)
+        skip = set(passed) | {found}
+        self.evicted = passed[::-1] + [k for k in self.evicted if k not in skip]
+        return found
+
+    def add_lemma(self, lemma):
+        #constraint on the E_vars only, kept for every later synthesize step
+        self.lemmas.append(lemma)
+        self.count_terms(lemma)
+        return lemma
+
+    def add_lemma_to_scope(self, lemma):
+        #add a lemma between runs, to the synthesize scope kept open by the last run as well if there is one
+        self.add_lemma(lemma)
+        if self.scope_open:
+            self.add_term(lemma)
+
+    def models(self, solver, terms, k, block):
+        #up to k models of the asserted formulas, each one blocked on the values of terms[block] so the next one differs in them
+        res = []
+        while len(res) < k and solver.check_sat().is_sat():
+            vals = {t:solver.get_value(t) for t in terms}
+            res.append(vals)
+            same = functools.reduce(lambda a,b: solver.make_term(pops.And, a, b), (solver.make_term(pops.Equal, t, vals[t]) for t in terms[block]))
+            solver.assert_formula(solver.make_term(pops.Not, same))
+        return res
+
+    def check(self, E_vals, terms = (), k = 1, A_vals = None):
+        #returns up to k counterexamples as values of the A_vars, the extra terms and the distinguish terms, none if the candidate is correct
+        #A_vals restricts the search to one known counterexample
+        terms = tuple(self.A_vars) + tuple(terms) + tuple(self.distinguish)
+        block = slice(len(terms) - len(self.distinguish), None) if len(self.distinguish) > 0 else slice(0, len(self.A_vars))
+        A_vals = A_vals if A_vals is not None else {}
+        if self.verify_solver is None:
             self.solver.push()
-            self.solver.assert_formula(self.synth_base)
-            self.solver.assert_formula(synth_constrain)
-            res = self.solver.check_sat()
+            self.solver.assert_formula(self.solver.make_term(pops.Not, self.solver.substitute(self.verify, {**E_vals, **A_vals})))
+            res = self.models(self.solver, terms, k, block)
             self.solver.pop()
-            if res.is_unsat():
-                return None
+            return res
+
+        vs = self.verify_solver
+        vs.push()
+        for var,val in E_vals.items():
+            vs.assert_formula(vs.make_term(pops.Equal, self.verifier_E_vars[var], self.to_verifier.transfer_term(val)))
+        for var,val in A_vals.items():
+            vs.assert_formula(vs.make_term(pops.Equal, self.to_verifier.transfer_term(var), self.to_verifier.transfer_term(val)))
+        verifier_terms = tuple(self.to_verifier.transfer_term(t) for t in terms)
+        res = self.models(vs, verifier_terms, k, block)
+        vs.pop()
+        return [{t:self.from_verifier.transfer_term(vals[vt]) for t,vt in zip(terms, verifier_terms)} for vals in res]
+
+    def find_counterexamples(self, E_vals):
+        #simulate the candidate on known traces first and only call the verifier if it passes them all
+        k = self.num_counterexamples
+        checks = tuple(check for check,_,_,_ in self.prefixes) if self.prefixes is not None else ()
+        if self.prefilter is None:
+            res = self.check(E_vals, checks, k)
+        else:
+            cexs = self.prefilter.check(E_vals, k, self.prefixes is not None)
+            if len(cexs) > 0:
+                return cexs
+            res = self.check(E_vals, self.prefilter.terms + checks, k)
+            for vals in res:
+                self.prefilter.add(vals)
+        if self.prefixes is None:
+            return [{var:vals[var] for var in self.A_vars} for vals in res]
+        # the inputs up to the first failing cycle already make the candidate fail
+        cexs = []
+        for vals in res:
+            A_vars = next((A_vars for check,_,A_vars,_ in self.prefixes if term_to_int(vals[check]) == 0), self.A_vars)
+            cexs.append({var:vals[var] for var in A_vars})
+        return cexs
+
+    @staticmethod
+    def empty_stats():
+        return {"status": None, "iterations": 0, "counterexamples": 0, "lemmas": 0, "reactivations": 0, "reactivation_checks": 0, "time": 0.0, "synth_times": [], "verify_times": []}
 
-            # verify step
-            E_vals = {var:self.solver.get_value(var) for var in self.E_vars}
+    def emit(self, event, **kwargs):
+        for observer in self.observers:
+            getattr(observer, event)(self, **kwargs)
+
+    def out_of_budget(self, iteration, start):
+        #name of the exhausted budget, None if the run may go on
+        if self.max_iterations is not None and iteration > self.max_iterations:
+            return "max_iterations"
+        if self.timeout is not None and time.perf_counter() - start > self.timeout:
+            return "timeout"
+        return None
+
+    def run(self, keep_scope = False):
+        #returns E_vals of a correct candidate, or None if there is none or a budget ran out (see stats["status"])
+        #with keep_scope the synthesize scope stays open for the next run, which keeps what the solver learned,
+        #until a run without keep_scope or close_scope
+        self.stats = self.empty_stats()
+        start = time.perf_counter()
+        self.emit("on_start")
+        res = None
+        try:
+            if not self.scope_open:
+                self.open_scope()
+            try:
+                for i in itertools.count(1):
+                    done, res = self.iterate(i, start)
+                    if done:
+                        return res
+            finally:
+                if not keep_scope:
+                    self.close_scope()
+        finally:
+            self.stats["time"] = time.perf_counter() - start
+            self.emit("on_finish", result = res)
+
+    def iterate(self, i, start):
+        #one synthesize, refine and verify round, returns (done, E_vals of a correct candidate or None)
+        budget = self.out_of_budget(i, start)
+        if budget is not None:
+            self.stats["status"] = budget
+            return True, None
+        self.stats["iterations"] = i
+        self.refresh_scope()
+        if self.shared is not None:
+            for A_vals in self.shared(self):
+                self.add_term(self.add_counterexample(A_vals))
+
+        # synthesize step
+        step = time.perf_counter()
+        E_vals = self.synthesize()
+        self.stats["synth_times"].append(time.perf_counter() - step)
+        self.emit("on_synth", iteration = i, duration = self.stats["synth_times"][-1], sat = E_vals is not None)
+        if E_vals is None:
+            self.stats["status"] = "unsat"
+            return True, None
+
+        # refine step
+        step = time.perf_counter()
+        lemmas = self.refine(E_vals) if self.refine is not None else []
+        if len(lemmas) > 0:
+            self.stats["lemmas"] += len(lemmas)
+            for lemma in lemmas:
+                self.add_term(self.add_lemma(lemma))
+            self.stats["verify_times"].append(time.perf_counter() - step)
+            self.emit("on_refine", iteration = i, duration = self.stats["verify_times"][-1], lemmas = lemmas)
+            return False, None
+
+        # verify step
+        k = self.reactivate(E_vals) if self.max_instances is not None else None
+        if k is not None:
+            self.stats["reactivations"] += 1
+            self.candidates.append(E_vals)
+            self.add_term(self.activate(k))
+            self.stats["verify_times"].append(time.perf_counter() - step)
+            self.emit("on_verify", iteration = i, duration = self.stats["verify_times"][-1], counterexamples = [self.counterexamples[k]])
+            return False, None
+        cexs = self.find_counterexamples(E_vals)
+        self.stats["verify_times"].append(time.perf_counter() - step)
+        self.emit("on_verify", iteration = i, duration = self.stats["verify_times"][-1], counterexamples = cexs)
+        if len(cexs) == 0:
+            self.stats["status"] = "sat"
+            return True, E_vals
+
+        self.stats["counterexamples"] += len(cexs)
+        self.candidates.append(E_vals)
+        for A_vals in cexs:
+            self.add_term(self.add_counterexample(A_vals))
+        return False, None
+
+    # the synthesize constraints of a run live in a scope, which is all the incremental and the plain mode differ in:
+    # incremental mode asserts synth_base once in an outer scope and every counterexample instance on its own,
+    # so the solver keeps what it learned between iterations, plain mode collects them in self.constraint
+    # and asserts it in a fresh scope for every synthesize step
+
+    def conj(self, terms):
+        return functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), terms, self.solver.make_term(1, self.solver.make_sort(BOOL)))
+
+    def open_scope(self):
+        self.scope_open = True
+        if self.incremental:
             self.solver.push()
-            self.solver.assert_formula(self.solver.make_term(pops.Not, self.solver.substitute(self.verify, E_vals)))
-            res = self.solver.check_sat()
+            self.assert_scope()
+        else:
+            self.constraint = self.conj(self.lemmas + self.pooled_instances())
+
+    def close_scope(self):
+        if self.incremental and self.scope_open:
+            self.solver.pop()
+        self.scope_open = False
+
+    def assert_scope(self):
+        #every term of the incremental scope is guarded by scope_literal, which only the synthesize step assumes,
+        #so the checks made inside the scope (verify, refutes) see none of it, as if they had a solver of their own
+        self.num_scopes += 1
+        self.scope_literal = self.solver.make_symbol(f"scope@{self.id}_{self.num_scopes}", self.solver.make_sort(BOOL))
+        self.assumption_literals = {}
+        for term in [self.synth_base] + self.lemmas + self.pooled_instances():
+            self.add_term(term)
+        self.stale = 0
+
+    def assumption_literal(self, term):
+        #literal implying an assumption, asserted once per incremental scope and only assumed while the term is in assumptions
+        if term not in self.assumption_literals:
+            literal = self.solver.make_symbol(f"assume@{self.id}_{self.num_scopes}_{len(self.assumption_literals)}", self.solver.make_sort(BOOL))
+            self.solver.assert_formula(self.solver.make_term(pops.Implies, literal, term))
+            self.assumption_literals[term] = literal
+        return self.assumption_literals[term]
+
+    def refresh_scope(self):
+        #drop the instances evicted from a bounded pool
+        if self.max_instances is None:
+            return
+        if not self.incremental:
+            # only the instances in the pool, so evicted ones are not kept alive by the constraint
+            self.constraint = self.conj(self.lemmas + self.pooled_instances())
+        elif self.stale > self.max_instances:
+            # start a fresh scope without the evicted instances, so the solver only holds up to twice the pool
             self.solver.pop()
-            if res.is_unsat():
-                return E_vals
-            
-            A_vals = {var:self.solver.get_value(var) for var in self.A_vars}
-            new_D_vars = {var:self.solver.make_symbol(f"{str(var)}@{i}", var.get_sort()) for var in self.D_vars}
-            mapping = {**A_vals, **new_D_vars}
-            new_constraint = self.solver.substitute(self.synth_constrain, mapping)
-            synth_constrain = self.solver.make_term(pops.And, synth_constrain, new_constraint)
+            self.solver.push()
+            self.assert_scope()
+
+    def add_term(self, term):
+        #add a term to the synthesize constraints of this and every later iteration of the run
+        if self.incremental:
+            self.solver.assert_formula(self.solver.make_term(pops.Implies, self.scope_literal, term))
+        else:
+            self.constraint = self.solver.make_term(pops.And, self.constraint, term)
+
+    def synthesize(self):
+        #E_vals of a candidate meeting the synthesize constraints, None if there is none
+        if self.incremental:
+            assumptions = [self.assumption_literal(term) for term in self.assumptions]
+            sat = self.solver.check_sat_assuming([self.scope_literal] + list(self.active.values()) + assumptions).is_sat()
+            return {var:self.solver.get_value(var) for var in self.E_vars} if sat else None
+
+        self.solver.push()
+        self.solver.assert_formula(self.synth_base)
+        self.solver.assert_formula(self.constraint)
+        for term in list(self.assumptions) + list(self.active.values()):
+            self.solver.assert_formula(term)
+        sat = self.solver.check_sat().is_sat()
+        E_vals = {var:self.solver.get_value(var) for var in self.E_vars} if sat else None
+        self.solver.pop()
+        return E_vals
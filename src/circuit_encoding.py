@@ -1,10 +1,21 @@
 import functools
+import itertools
 from itertools import combinations
 import smt_switch.primops as pops
 from smt_switch.sortkinds import BOOL, BV
+from src.feasibility import InfeasibleError
+from src.lvar_encoding import LVAR_ENCODINGS
+from src.terms import TermCache
+
+def cached(func):
+    #property whose terms are built on first access and then reused
+    @functools.wraps(func)
+    def wrapper(self):
+        return self.cache.get((func.__name__,), lambda: func(self))
+    return property(wrapper)
 
 class CircuitEncoding:
-    def __init__(self, nodes, types, ops, input_delays):
+    def __init__(self, nodes, types, ops, input_delays, symmetry_breaking = False, lvar_encoding = "binary", domains = None):
         if not isinstance(types, tuple):
             raise TypeError(f"CircuitSynth input types should be a tuple, got {type(types)}")
         if not isinstance(types[0], tuple):
@@ -16,24 +27,30 @@ class CircuitEncoding:
         for op in ops:
             if not isinstance(op, (nodes.SeqNode, nodes.CombNode, nodes.SpecNode)):
                 raise TypeError(f"CircuitSynth input ops should have elements of type SeqNode or CombNode, got {type(op)}")
+        if lvar_encoding not in LVAR_ENCODINGS:
+            raise ValueError(f"CircuitSynth lvar_encoding should be one of {tuple(LVAR_ENCODINGS)}, got {lvar_encoding}")
 
         self.nodes = nodes
         self.fts = nodes.fts
         self.solver = nodes.fts.solver
         self.types = types
         self.ops = ops
+        self.symmetry_breaking = symmetry_breaking
+        self.lvar_encoding = lvar_encoding
+        # sources each sink may use, by the names of lvar(), e.g. from src.feasibility.Presolve, all sources of its type if None
+        self.domains = domains
+        self.cache = TermCache()
 
         self.num_inputs = len(types[0])
         self.num_outputs = len(types[1])
         self.num_op_outputs = sum(len(op.types[1]) for op in ops)
         self.num_lines = self.num_inputs + self.num_op_outputs
-        self.lvar_width = (self.num_lines - 1).bit_length()
-        BV_LVAR = self.solver.make_sort(BV, self.lvar_width)
+        self.lvars = LVAR_ENCODINGS[lvar_encoding](self.solver, self.num_lines, self.cache)
 
-        self.input_lvars = tuple(self.solver.make_term(i, BV_LVAR) for i in range(self.num_inputs))
-        self.op_input_lvars = tuple(tuple(self.solver.make_symbol(f"op_input_lvar[{i}][{j}]", BV_LVAR) for j in range(len(op.types[0]))) for i,op in enumerate(ops))
-        self.op_output_lvars = tuple(tuple(self.solver.make_symbol(f"op_output_lvar[{i}][{j}]", BV_LVAR) for j in range(len(op.types[1]))) for i,op in enumerate(ops))
-        self.output_lvars = tuple(self.solver.make_symbol(f"output_lvar[{i}]", BV_LVAR) for i in range(self.num_outputs))
+        self.input_lvars = tuple(self.lvars.const(i) for i in range(self.num_inputs))
+        self.op_input_lvars = tuple(tuple(self.lvars.symbol(f"op_input_lvar[{i}][{j}]") for j in range(len(op.types[0]))) for i,op in enumerate(ops))
+        self.op_output_lvars = tuple(tuple(self.lvars.symbol(f"op_output_lvar[{i}][{j}]") for j in range(len(op.types[1]))) for i,op in enumerate(ops))
+        self.output_lvars = tuple(self.lvars.symbol(f"output_lvar[{i}]") for i in range(self.num_outputs))
 
         self.input_vars = tuple(self.fts.make_inputvar(f"input_var[{i}]", self.solver.make_sort(BV, N)) for i,N in enumerate(types[0]))
         self.op_input_vars = tuple(tuple(self.fts.make_inputvar(f"op_input_var[{i}][{j}]", self.solver.make_sort(BV, N)) for j,N in enumerate(op.types[0])) for i,op in enumerate(ops))
@@ -52,7 +69,7 @@ class CircuitEncoding:
 
         def flatten(tps):
             return tuple(x for tp in tps for x in tp)
-        self.E_vars = flatten(self.op_input_lvars) + flatten(self.op_output_lvars) + self.output_lvars
+        self.E_vars = flatten(self.lvars.vars(lvar) for lvar in flatten(self.op_input_lvars) + flatten(self.op_output_lvars) + self.output_lvars)
         self.A_vars = self.input_vars
         self.D_vars = (
             flatten(self.op_input_vars) + 
@@ -61,7 +78,126 @@ class CircuitEncoding:
         self.setups = flatten(op.setup for op in ops if isinstance(op, (nodes.SeqNode, nodes.SpecNode)))
         self.holds = flatten(op.hold for op in ops if isinstance(op, (nodes.SeqNode, nodes.SpecNode)))
 
+    def decode(self, E_vals):
+        #turn a model of the E_vars into concrete line numbers
+        op_input_lvars = tuple(tuple(self.lvars.decode(lvar, E_vals) for lvar in input_lvars) for input_lvars in self.op_input_lvars)
+        op_output_lvars = tuple(tuple(self.lvars.decode(lvar, E_vals) for lvar in output_lvars) for output_lvars in self.op_output_lvars)
+        output_lvars = tuple(self.lvars.decode(lvar, E_vals) for lvar in self.output_lvars)
+        return tuple(range(self.num_inputs)), op_input_lvars, op_output_lvars, output_lvars
+
+    def lvar(self, x):
+        #lvar of a source ("input", m), ("op_output", i, j) or a sink ("output", k), ("op_input", i, j)
+        if x[0] == "output":
+            return self.output_lvars[x[1]]
+        if x[0] == "input":
+            return self.input_lvars[x[1]]
+        if x[0] == "op_input":
+            return self.op_input_lvars[x[1]][x[2]]
+        return self.op_output_lvars[x[1]][x[2]]
+
+    def schedule(self, netlist):
+        #evaluation order of a decoded netlist: the seq ops, then every other op in topological order
+        op_output_lvars = netlist[2]
+        seq_ops = tuple(i for i,op in enumerate(self.ops) if isinstance(op, self.nodes.SeqNode))
+        # sorting by the first output line gives a topological order, since op inputs are always on lower lines
+        comb_ops = tuple(sorted((i for i,op in enumerate(self.ops) if not isinstance(op, self.nodes.SeqNode)), key = lambda i: min(op_output_lvars[i])))
+        return seq_ops, comb_ops
+
+    def drivers(self, netlist):
+        #(op, output) driving each line that is not a circuit input
+        return {line:(i, j) for i,lines in enumerate(netlist[2]) for j,line in enumerate(lines)}
+
+    def used_ops(self, netlist):
+        #ops in the fan-in cone of the circuit outputs, following registers back through their inputs
+        drivers = self.drivers(netlist)
+        used = set()
+        todo = list(netlist[3])
+        while len(todo) > 0:
+            line = todo.pop()
+            if line not in drivers or drivers[line][0] in used:
+                continue
+            i = drivers[line][0]
+            used.add(i)
+            todo.extend(netlist[1][i])
+        return used
+
+    def signature(self, netlist):
+        #structure of the used part of a netlist, the same for netlists that only differ by line placement,
+        #which of several identical ops is used, or the input order of commutative ops
+        drivers = self.drivers(netlist)
+        seq_ids = {}
+        memo = {}
+        def describe(line):
+            if line not in drivers:
+                return ("input", line)
+            if line in memo:
+                return memo[line]
+            i, j = drivers[line]
+            op = self.ops[i]
+            if isinstance(op, self.nodes.SeqNode):
+                seq_ids.setdefault(i, len(seq_ids))
+                res = ("state", str(op), seq_ids[i], j)
+            else:
+                args = tuple(describe(l) for l in netlist[1][i])
+                if op.commutative:
+                    args = tuple(sorted(args, key = repr))
+                res = (str(op), j, args)
+            memo[line] = res
+            return res
+
+        outputs = tuple(describe(line) for line in netlist[3])
+        seq_inputs = []
+        # registers found while describing register inputs are appended to seq_ids as well
+        while len(seq_inputs) < len(seq_ids):
+            i = next(i for i,k in seq_ids.items() if k == len(seq_inputs))
+            seq_inputs.append(tuple(describe(l) for l in netlist[1][i]))
+        return outputs, tuple(seq_inputs)
+
+    def blocking_lemmas(self, netlist, max_blocks = 64):
+        #constraints excluding the connections of the used ops of netlist, wherever their lines are placed,
+        #also for up to max_blocks relabelings of the used ops onto identical ops
+        drivers = self.drivers(netlist)
+        used = sorted(self.used_ops(netlist))
+        groups = {}
+        for i,op in enumerate(self.ops):
+            groups.setdefault((type(op), str(op)), []).append(i)
+        choices = []
+        for members in groups.values():
+            members_used = tuple(i for i in members if i in used)
+            choices.append([dict(zip(members_used, image)) for image in itertools.permutations(members, len(members_used))])
+
+        def source(line, relabel):
+            if line not in drivers:
+                return self.input_lvars[line]
+            i, j = drivers[line]
+            return self.op_output_lvars[relabel[i]][j]
+
+        identity = {i:i for i in used}
+        relabels = (functools.reduce(lambda a,b: {**a, **b}, maps, {}) for maps in itertools.product(*choices))
+        lemmas = []
+        for relabel in itertools.islice(itertools.chain((identity,), (r for r in relabels if r != identity)), max_blocks):
+            eqs = [self.lvars.equal(lvar, source(line, relabel)) for lvar,line in zip(self.output_lvars, netlist[3])]
+            for i in used:
+                eqs.extend(self.lvars.equal(lvar, source(line, relabel)) for lvar,line in zip(self.op_input_lvars[relabel[i]], netlist[1][i]))
+            lemmas.append(self.solver.make_term(pops.Not, self.lvars.conj(eqs)))
+        return lemmas
+
+    def encode(self, netlist):
+        #E_vals of a decoded netlist
+        _, op_input_lvars, op_output_lvars, output_lvars = netlist
+        E_vals = {}
+        for lvars,lines in zip(self.op_input_lvars + self.op_output_lvars + (self.output_lvars,), op_input_lvars + op_output_lvars + (output_lvars,)):
+            for lvar,line in zip(lvars, lines):
+                E_vals.update(self.lvars.encode(lvar, line))
+        return E_vals
+
     def select_var(self, target_lvar, target_t):
+        return self.cache.get(("select_var", target_lvar, target_t), lambda: self.build_select_var(target_lvar, target_t))
+
+    def select_delay(self, target_lvar, target_t):
+        return self.cache.get(("select_delay", target_lvar, target_t), lambda: self.build_select_delay(target_lvar, target_t))
+
+    def build_select_var(self, target_lvar, target_t):
         # dont include non-matching types in the resulting formula
         possible_pairs = []
         for lvar, var, t in zip(self.input_lvars, self.input_vars, self.types[0]):
@@ -76,10 +212,10 @@ class CircuitEncoding:
         assert len(possible_pairs) != 0
         res = possible_pairs[0][1]
         for lvar,var in possible_pairs[1:]:
-            res = self.solver.make_term(pops.Ite, self.solver.make_term(pops.Equal, target_lvar, lvar), var, res)
+            res = self.solver.make_term(pops.Ite, self.lvars.equal(target_lvar, lvar), var, res)
         return res
 
-    def select_delay(self, target_lvar, target_t):
+    def build_select_delay(self, target_lvar, target_t):
         # dont include non-matching types in the resulting formula
         possible_pairs = []
         for lvar, delay, t in zip(self.input_lvars, self.input_delays, self.types[0]):
@@ -94,109 +230,169 @@ class CircuitEncoding:
         assert len(possible_pairs) != 0
         res = possible_pairs[0][1]
         for lvar,delay in possible_pairs[1:]:
-            res = self.solver.make_term(pops.Ite, self.solver.make_term(pops.Equal, target_lvar, lvar), delay, res)
+            res = self.solver.make_term(pops.Ite, self.lvars.equal(target_lvar, lvar), delay, res)
         return res
 
-    @property
+    @cached
     def P_acyc(self):
         #the circuit must be acyclic
-        BV_LVAR = self.solver.make_sort(BV, self.lvar_width)
         cond = []
         hardcoded_lvars = self.num_inputs
         for input_lvars, output_lvars, op in zip(self.op_input_lvars, self.op_output_lvars, self.ops):
             if isinstance(op, self.nodes.CombNode):
                 # the output lvars are increasing by 1
                 for input_lvar in input_lvars:
-                    cond.append(self.solver.make_term(pops.BVUlt, input_lvar, output_lvars[0]))
+                    cond.append(self.lvars.ult(input_lvar, output_lvars[0]))
             elif isinstance(op, self.nodes.SeqNode):
                 # the output lvars are increasing by 1
-                cond.append(self.solver.make_term(pops.Equal, output_lvars[0], self.solver.make_term(hardcoded_lvars, BV_LVAR)))
+                cond.append(self.lvars.is_line(output_lvars[0], hardcoded_lvars))
                 hardcoded_lvars += len(output_lvars)
             else:
                 #special case here where the output lvars are NOT increasing by 1
                 assert isinstance(op, self.nodes.SpecNode)
                 for output_lvar,moore in zip(output_lvars, op.is_moores):
                     if moore:
-                        cond.append(self.solver.make_term(pops.Equal, output_lvar, self.solver.make_term(hardcoded_lvars, BV_LVAR)))
+                        cond.append(self.lvars.is_line(output_lvar, hardcoded_lvars))
                         hardcoded_lvars += 1
                     else:
                         for input_lvar in input_lvars:
-                            cond.append(self.solver.make_term(pops.BVUlt, input_lvar, output_lvar))
+                            cond.append(self.lvars.ult(input_lvar, output_lvar))
 
                         
 
 
         return functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), cond)
 
-    @property
+    @cached
     def P_lvars_in_range(self):
         #all src lvars must be a valid line number
-        BV_LVAR = self.solver.make_sort(BV, self.lvar_width)
-        min_lvar = self.solver.make_term(self.num_inputs, BV_LVAR)
-        max_lvar = self.solver.make_term(self.num_lines-1, BV_LVAR)
+        min_lvar = self.lvars.const(self.num_inputs)
+        max_lvar = self.lvars.const(self.num_lines-1)
         cond = []
         for out_lvars in self.op_output_lvars:
             for lvar in out_lvars:
-                cond.append(self.solver.make_term(pops.BVUge, lvar, min_lvar))
-                cond.append(self.solver.make_term(pops.BVUle, lvar, max_lvar))
+                cond.append(self.lvars.ule(min_lvar, lvar))
+                cond.append(self.lvars.ule(lvar, max_lvar))
         return functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), cond)
 
-    @property
+    @cached
     def P_multi_out(self):
         #successive outputs of an op should have lvar values increasing by 1, except for SpecNodes
         cond = [self.solver.make_term(1, self.solver.make_sort(BOOL))]
-        BV_LVAR = self.solver.make_sort(BV, self.lvar_width)
-        one = self.solver.make_term(1, BV_LVAR)
         for output_lvars,op in zip(self.op_output_lvars, self.ops):
             if isinstance(op, self.nodes.SpecNode):
                 continue
             for l,r in zip(output_lvars[:-1], output_lvars[1:]):
-                cond.append(self.solver.make_term(pops.Equal, self.solver.make_term(pops.BVAdd, l, one), r))
+                cond.append(self.lvars.offset(l, r, 1))
         return functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), cond)
 
-    @property
+    @cached
     def P_src_lvars_unique(self):
         #all src lvars must be a unique line number
         cond = [self.solver.make_term(1, self.solver.make_sort(BOOL))]
         lvars_all = tuple(lvar for output_lvars in self.op_output_lvars for lvar in output_lvars)
         for a,b in combinations(lvars_all, 2):
-            cond.append(self.solver.make_term(pops.Not, self.solver.make_term(pops.Equal, a, b)))
+            cond.append(self.solver.make_term(pops.Not, self.lvars.equal(a, b)))
         return functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), cond)
 
-    @property
+    @cached
     def P_well_typed(self):
         #sink lvars can only correspond to source lvars of the same bit width
         cond = []
 
         #collect sources of each type
         srcs = {}
-        for lvar, t in zip(self.input_lvars, self.types[0]):
-            srcs.setdefault(t, []).append(lvar)
-        for output_lvars,op in zip(self.op_output_lvars, self.ops):
-            for lvar, t in zip(output_lvars, op.types[1]):
-                srcs.setdefault(t, []).append(lvar)
-        
-        #constrain sinks of each type
-        for lvar, t in zip(self.output_lvars, self.types[1]):
-            assert t in srcs
-            c = tuple(self.solver.make_term(pops.Equal, lvar, s) for s in srcs[t])
+        for m, t in enumerate(self.types[0]):
+            srcs.setdefault(t, []).append(("input", m))
+        for i,op in enumerate(self.ops):
+            for j, t in enumerate(op.types[1]):
+                srcs.setdefault(t, []).append(("op_output", i, j))
+
+        #constrain sinks of each type, to their domain if there is one
+        sinks = tuple((("output", k), t) for k,t in enumerate(self.types[1])) + tuple((("op_input", i, j), t) for i,op in enumerate(self.ops) for j,t in enumerate(op.types[0]))
+        for sink, t in sinks:
+            allowed = srcs.get(t, []) if self.domains is None else [s for s in srcs.get(t, []) if s in self.domains[sink]]
+            if len(allowed) == 0:
+                raise InfeasibleError(f"{sink[0]} {sink[1:]} of width {t} has no source")
+            c = tuple(self.lvars.equal(self.lvar(sink), self.lvar(s)) for s in allowed)
             cond.append(functools.reduce(lambda a,b: self.solver.make_term(pops.Or, a, b), c))
+        
+        return functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), cond)
+
+    @cached
+    def P_symmetry(self):
+        #keep one program out of each set that only differs by permuting identical ops or commutative inputs
+        cond = [self.solver.make_term(1, self.solver.make_sort(BOOL))]
 
         for input_lvars, op in zip(self.op_input_lvars, self.ops):
-            for lvar,t in zip(input_lvars, op.types[0]):
-                assert t in srcs
-                c = tuple(self.solver.make_term(pops.Equal, lvar, s) for s in srcs[t])
-                cond.append(functools.reduce(lambda a,b: self.solver.make_term(pops.Or, a, b), c))
-        
+            if isinstance(op, self.nodes.CombNode) and op.commutative:
+                cond.append(self.lvars.ule(input_lvars[0], input_lvars[1]))
+
+        #identical ops, in the order they appear in ops
+        groups = {}
+        for i,op in enumerate(self.ops):
+            groups.setdefault((type(op), str(op)), []).append(i)
+
+        #identical comb ops can swap places without renaming any line, so their output lines are ordered
+        for (cls, _), group in groups.items():
+            if issubclass(cls, self.nodes.CombNode):
+                for i,j in zip(group[:-1], group[1:]):
+                    cond.append(self.lvars.ult(self.op_output_lvars[i][0], self.op_output_lvars[j][0]))
+
+        #swapping identical seq ops also swaps their hardcoded output lines, so a lex-leader constraint
+        #over the seq op input lvars is used: the inputs must not be lex larger than their swapped image
+        hardcoded = {}
+        hardcoded_lvars = self.num_inputs
+        for i,op in enumerate(self.ops):
+            if isinstance(op, self.nodes.SeqNode):
+                hardcoded[i] = hardcoded_lvars
+                hardcoded_lvars += len(op.types[1])
+            elif isinstance(op, self.nodes.SpecNode):
+                hardcoded_lvars += sum(op.is_moores)
+        seq_inputs = tuple((i, k) for i in hardcoded for k in range(len(self.ops[i].types[0])))
+
+        def relabel(lvar, i, j):
+            for k in range(len(self.ops[i].types[1])):
+                a = hardcoded[i] + k
+                b = hardcoded[j] + k
+                lvar = self.lvars.ite(self.lvars.is_line(lvar, a), self.lvars.const(b), 
+                                      self.lvars.ite(self.lvars.is_line(lvar, b), self.lvars.const(a), lvar))
+            return lvar
+
+        for (cls, _), group in groups.items():
+            if not issubclass(cls, self.nodes.SeqNode):
+                continue
+            for i,j in zip(group[:-1], group[1:]):
+                swap = {i: j, j: i}
+                prefix = seq_inputs[:max(p for p,(m,_) in enumerate(seq_inputs) if m == j) + 1]
+                lex_le = self.solver.make_term(1, self.solver.make_sort(BOOL))
+                for m,k in reversed(prefix):
+                    a = self.op_input_lvars[m][k]
+                    b = relabel(self.op_input_lvars[swap.get(m, m)][k], i, j)
+                    lex_le = self.solver.make_term(pops.Or, self.lvars.ult(a, b), 
+                                                   self.solver.make_term(pops.And, self.lvars.equal(a, b), lex_le))
+                cond.append(lex_le)
+
+        return functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), cond)
+
+    @cached
+    def P_lvars_valid(self):
+        #every lvar symbol encodes exactly one line (always true for the binary encoding)
+        cond = [self.solver.make_term(1, self.solver.make_sort(BOOL))]
+        lvars_all = tuple(lvar for lvars in self.op_input_lvars + self.op_output_lvars + (self.output_lvars,) for lvar in lvars)
+        for lvar in lvars_all:
+            cond.append(self.lvars.valid(lvar))
         return functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), cond)
 
-    @property
+    @cached
     def P_wfp(self):
         #well formed program
-        cond = (self.P_acyc, self.P_lvars_in_range, self.P_multi_out, self.P_src_lvars_unique, self.P_well_typed)
+        cond = (self.P_lvars_valid, self.P_acyc, self.P_lvars_in_range, self.P_multi_out, self.P_src_lvars_unique, self.P_well_typed)
+        if self.symmetry_breaking:
+            cond += (self.P_symmetry,)
         return functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), cond)
 
-    @property
+    @cached
     def P_conn_vars(self):
         #assert that the op input values are assigned to the corresponding sources
         cond = []
@@ -206,7 +402,7 @@ class CircuitEncoding:
 
         return functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), cond)
 
-    @property
+    @cached
     def P_conn_delays(self):
         #assert that the op input delays are assigned to the corresponding source delays
         cond = []
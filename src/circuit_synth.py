@@ -1,86 +1,449 @@
 from src.cegis import Cegis
 from src.circuit_encoding import CircuitEncoding
+from src.feasibility import InfeasibleError, Presolve
+from src.options import Budget, CegisOptions, EncodingOptions
+from src.proof import EquivalenceProof
+from src.simulator import SimFilter
+from src.spec import StepSpec
+from src.timing import StaticTiming
+from src.width_abstraction import WidthAbstraction
+import dataclasses
 import functools
+import time
 import pono
+import smt_switch as ss
 import smt_switch.primops as pops
 from smt_switch.sortkinds import BOOL, BV
 
 class CircuitSynth:
-    def __init__(self, nodes, types, ops, spec_func, num_cycles, enforce_timing = False, input_delays = None, cycle_delay = None, max_output_delays = None):
-        self.enc = CircuitEncoding(nodes, types, ops, input_delays)
+    # cost literals made by optimize, whose names have to be unique on the solver
+    num_probes = 0
+
+    def __init__(self, nodes, types, ops, spec_func, num_cycles, enforce_timing = False, input_delays = None, cycle_delay = None, max_output_delays = None, encoding_options = None, cegis_options = None, budget = None, observers = (), cache = None, shared = None):
+        #encoding_options, cegis_options and budget are src.options objects, the defaults if None, see src.options.synth_options for flat keyword arguments
+        start = time.perf_counter()
+        # copies, since the budget is adjusted while running
+        self.encoding_options = dataclasses.replace(encoding_options) if encoding_options is not None else EncodingOptions()
+        self.cegis_options = dataclasses.replace(cegis_options) if cegis_options is not None else CegisOptions()
+        self.budget = dataclasses.replace(budget) if budget is not None else Budget()
+        eo = self.encoding_options
+        co = self.cegis_options
+
+        # netlists of the ops kept by prune are mapped back to ops by expand
+        self.ops = ops
+        self.kept = None
+        domains = None
+        if eo.presolve or eo.prune:
+            kept, domains = Presolve(nodes, types, ops, (enforce_timing, input_delays, cycle_delay, max_output_delays), eo.prune).run()
+            # the encoding needs at least one op
+            if len(kept) == 0:
+                raise InfeasibleError(f"prune drops all {len(ops)} ops as unusable, but the encoding needs at least one")
+            if len(kept) < len(ops):
+                self.kept = tuple(kept)
+                ops = tuple(ops[i] for i in kept)
+        self.enc = CircuitEncoding(nodes, types, ops, input_delays, eo.symmetry_breaking, eo.lvar_encoding, domains)
+        self.stats = {"encode_time": time.perf_counter() - start, "unroll_time": 0.0}
+        self.nodes = nodes
         self.ur = pono.Unroller(nodes.fts)
         self.solver = nodes.fts.solver
+        self.spec_func = spec_func
+        self.num_cycles = num_cycles
+        self.observers = tuple(observers)
+        # ResultCache for netlists of identical problems solved before
+        self.cache = cache
+        self.timing_params = (enforce_timing, input_delays, cycle_delay, max_output_delays)
+        self.timing = None
+        # (cycle_bound, output_bound) solver variables, once optimize has made the delay limits symbolic
+        self.delay_bounds = None
+        # (literal, weights, limit) of the cost optimize probes with lazy timing, see refine
+        self.cost_probe = None
+
+        # translators are shared by every Cegis built for this problem, so each symbol is only declared once in the verifier
+        self.translators = None
+        if co.verify_solver is not None:
+            self.translators = (ss.TermTranslator(co.verify_solver), ss.TermTranslator(self.solver))
 
         if enforce_timing:
             assert input_delays is not None
             assert cycle_delay is not None
             assert max_output_delays is not None
 
+            # lazy timing: synthesize without any delay terms and only add back the paths a candidate violates
+            if co.lazy_timing:
+                timing = StaticTiming(self.enc, input_delays, cycle_delay, max_output_delays)
+                if timing.supported:
+                    self.timing = timing
+
+        if not enforce_timing or self.timing is not None:
+            self.synth_base = self.enc.P_wfp
+        else:
             cycle_delay = self.solver.make_term(cycle_delay, self.solver.make_sort(BV, nodes.delay_width))
-            zero = self.solver.make_term(0, self.solver.make_sort(BV, nodes.delay_width))
-            setup_conds = tuple(self.solver.make_term(pops.BVSle, setup, cycle_delay) for setup in self.enc.setups)
-            hold_conds = tuple(self.solver.make_term(pops.BVSge, hold, zero) for hold in self.enc.holds)
             assert len(self.enc.output_delays) == len(max_output_delays)
             max_output_delays = tuple(self.solver.make_term(d, self.solver.make_sort(BV, nodes.delay_width)) for d in max_output_delays)
-            assert len(self.enc.output_delays) == len(max_output_delays)
-            output_delay_conds = tuple(self.solver.make_term(pops.BVSle, delay, max_delay) for delay,max_delay in zip(self.enc.output_delays, max_output_delays))
-            P_timing = functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), setup_conds + hold_conds + output_delay_conds)
-            synth_base = functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), [P_timing, self.enc.P_conn_delays, self.enc.P_wfp])
-        else:
-            synth_base = self.enc.P_wfp
-
-        P_conn_vars = []
-        for n in range(num_cycles + 1):
-            P_conn_vars.append(self.ur.at_time(self.enc.P_conn_vars, n))
-        P_conn_vars = functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), P_conn_vars)
-
-        P_state = [self.ur.at_time(nodes.fts.init, 0)]
-        for n in range(num_cycles):
-            P_state.append(self.ur.at_time(nodes.fts.trans, n))
-        P_state = functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), P_state)
-
-        P_spec_nodes = [self.solver.make_term(1, self.solver.make_sort(BOOL))]
-        for input_vars,output_vars,op in zip(self.enc.op_input_vars, self.enc.op_output_vars, self.enc.ops):
-            if not isinstance(op, nodes.SpecNode):
-                continue
-            input_vars_up_to_cycle = []
-            for n in range(num_cycles + 1):
+            P_timing = self.make_P_timing(cycle_delay, max_output_delays)
+            self.synth_base = functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), [P_timing, self.enc.P_conn_delays, self.enc.P_wfp])
+
+        # extra constraints of the next synthesize steps only, e.g. the cost bound probed by optimize
+        self.assumptions = []
+        # source of counterexamples found by other processes, see Cegis.shared
+        self.shared = shared
+
+        # per cycle slices of the unrolled problem, extended on demand by unroll, the spec ones by unroll_spec
+        self.input_vars = []
+        self.spec_outputs = []
+        self.P_conn_vars = []
+        self.P_state = []
+        self.P_spec = []
+        self.outputs_equal = []
+        self.P_spec_nodes = []
+        self.dependent_vars = []
+        self.spec_node_inputs = tuple([] for op in self.enc.ops if isinstance(op, nodes.SpecNode))
+        # stepped specs carry their state from one cycle to the next instead of being evaluated on every prefix
+        self.spec_node_states = [op.init_state() if op.can_step else None for op in self.enc.ops if isinstance(op, nodes.SpecNode)]
+        self.spec_state = spec_func.init if isinstance(spec_func, StepSpec) else None
+
+        self.bound = min(co.initial_cycles, num_cycles) if co.deepening else num_cycles
+        self.cegis = self.make_cegis(self.bound)
+
+    def make_P_timing(self, cycle_delay, max_output_delays):
+        #setup, hold and output delay constraints, for delay terms that may be constants or solver variables
+        zero = self.solver.make_term(0, self.solver.make_sort(BV, self.nodes.delay_width))
+        setup_conds = tuple(self.solver.make_term(pops.BVSle, setup, cycle_delay) for setup in self.enc.setups)
+        hold_conds = tuple(self.solver.make_term(pops.BVSge, hold, zero) for hold in self.enc.holds)
+        assert len(self.enc.output_delays) == len(max_output_delays)
+        output_delay_conds = tuple(self.solver.make_term(pops.BVSle, delay, max_delay) for delay,max_delay in zip(self.enc.output_delays, max_output_delays))
+        return functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), setup_conds + hold_conds + output_delay_conds)
+
+    def unroll_spec(self, num_cycles):
+        #extend the input vars, spec outputs and SpecNode constraints up to and including cycle num_cycles,
+        #the part of unroll that only evaluates the spec, without the transition system
+        start = time.perf_counter()
+        true = self.solver.make_term(1, self.solver.make_sort(BOOL))
+        for n in range(len(self.spec_outputs), num_cycles + 1):
+            P_spec_nodes = [true]
+            spec_ops = ((input_vars, output_vars, op) for input_vars,output_vars,op in zip(self.enc.op_input_vars, self.enc.op_output_vars, self.enc.ops) if isinstance(op, self.nodes.SpecNode))
+            for k,(input_vars_up_to_cycle,(input_vars,output_vars,op)) in enumerate(zip(self.spec_node_inputs, spec_ops)):
                 input_vars_at_cycle = tuple(self.ur.at_time(var, n) for var in input_vars)
-                input_vars_up_to_cycle.append(input_vars_at_cycle)
-                result_at_cycle = op.eval(*input_vars_up_to_cycle)
+                if op.can_step:
+                    result_at_cycle, self.spec_node_states[k] = op.step(self.spec_node_states[k], *input_vars_at_cycle)
+                else:
+                    input_vars_up_to_cycle.append(input_vars_at_cycle)
+                    result_at_cycle = op.eval(*input_vars_up_to_cycle)
                 output_vars_at_cycle = tuple(self.ur.at_time(var, n) for var in output_vars)
                 equals = tuple(self.solver.make_term(pops.Equal, res, out) for res,out in zip(result_at_cycle, output_vars_at_cycle))
                 P_spec_nodes.append(functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), equals))
-        P_spec_nodes = functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), P_spec_nodes)
+            self.P_spec_nodes.append(functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), P_spec_nodes))
 
-        P_spec = []
-        input_vars = []
-        for n in range(num_cycles + 1):
-            input_vars.append(tuple(self.ur.at_time(var, n) for var in self.enc.input_vars))
-            spec_outputs = spec_func(tuple(input_vars))
+            self.input_vars.append(tuple(self.ur.at_time(var, n) for var in self.enc.input_vars))
+            if isinstance(self.spec_func, StepSpec):
+                spec_outputs, self.spec_state = self.spec_func.step(self.spec_state, self.input_vars[-1])
+            else:
+                spec_outputs = self.spec_func(tuple(self.input_vars))
+            self.spec_outputs.append(spec_outputs)
+        self.stats["unroll_time"] += time.perf_counter() - start
+
+    def unroll(self, num_cycles):
+        #extend the per cycle slices up to and including cycle num_cycles, reusing the cycles already built
+        self.unroll_spec(num_cycles)
+        start = time.perf_counter()
+        for n in range(len(self.P_spec), num_cycles + 1):
+            self.P_conn_vars.append(self.ur.at_time(self.enc.P_conn_vars, n))
+            self.P_state.append(self.ur.at_time(self.nodes.fts.init, 0) if n == 0 else self.ur.at_time(self.nodes.fts.trans, n - 1))
             circuit_outputs = tuple(self.ur.at_time(var, n) for var in self.enc.output_vars)
-            outputs_equal = tuple(self.solver.make_term(pops.Equal, so, co) for so, co in zip(spec_outputs, circuit_outputs))
-            P_spec.append(functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), outputs_equal))
-        P_spec = functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), P_spec)
+            outputs_equal = tuple(self.solver.make_term(pops.Equal, so, co) for so, co in zip(self.spec_outputs[n], circuit_outputs))
+            self.P_spec.append(functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), outputs_equal))
+            self.outputs_equal.append(outputs_equal)
+
+            self.dependent_vars.append(tuple(self.ur.at_time(var, n) for var in self.enc.D_vars))
+        self.stats["unroll_time"] += time.perf_counter() - start
 
-        synth_constrain = functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), [P_conn_vars, P_state, P_spec, P_spec_nodes])
-        verify = self.solver.make_term(pops.Implies, functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), [synth_base, P_conn_vars, P_state, P_spec_nodes]), P_spec)
+    def make_cegis(self, num_cycles):
+        #CEGIS problem over cycles 0..num_cycles
+        self.unroll(num_cycles)
+        conj = lambda terms: functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), terms)
+        P_conn_vars = conj(self.P_conn_vars[:num_cycles + 1])
+        P_state = conj(self.P_state[:num_cycles + 1])
+        P_spec = conj(self.P_spec[:num_cycles + 1])
+        P_spec_nodes = conj(self.P_spec_nodes[:num_cycles + 1])
 
-        dependent_vars = []
-        for n in range(num_cycles + 1):
-            for var in self.enc.D_vars:
-                dependent_vars.append(self.ur.at_time(var, n))
+        synth_constrain = conj([P_conn_vars, P_state, P_spec, P_spec_nodes])
+        verify = self.solver.make_term(pops.Implies, conj([self.synth_base, P_conn_vars, P_state, P_spec_nodes]), P_spec)
 
+        dependent_vars = tuple(var for vars_ in self.dependent_vars[:num_cycles + 1] for var in vars_)
+        input_vars = tuple(self.input_vars[:num_cycles + 1])
         input_vars_flat = tuple(var for vars_ in input_vars for var in vars_)
-        self.cegis = Cegis(self.solver, synth_base, synth_constrain, verify, self.enc.E_vars, input_vars_flat, dependent_vars)
+        self.sim_filter = None
+        co = self.cegis_options
+        if co.prefilter:
+            sim_filter = SimFilter(self.solver, self.enc, input_vars, tuple(self.spec_outputs[:num_cycles + 1]), co.sim_spec, co.sim_traces)
+            if sim_filter.sim.supported:
+                self.sim_filter = sim_filter
+        distinguish = ()
+        if co.num_counterexamples > 1:
+            # the counterexamples of one round fail on different outputs or cycles
+            distinguish = tuple(eq for outputs_equal in self.outputs_equal[:num_cycles + 1] for eq in outputs_equal)
+        prefixes = None
+        if co.truncate_counterexamples:
+            prefixes = []
+            prefix = None
+            for n in range(num_cycles + 1):
+                cycle = conj([self.P_conn_vars[n], self.P_state[n], self.P_spec[n], self.P_spec_nodes[n]])
+                prefix = cycle if prefix is None else self.solver.make_term(pops.And, prefix, cycle)
+                A_vars = tuple(var for vars_ in self.input_vars[:n + 1] for var in vars_)
+                D_vars = tuple(var for vars_ in self.dependent_vars[:n + 1] for var in vars_)
+                prefixes.append((self.P_spec[n], prefix, A_vars, D_vars))
+        return Cegis(self.solver, self.synth_base, synth_constrain, verify, self.enc.E_vars, input_vars_flat, dependent_vars, co, self.sim_filter, self.translators,
+                     self.refine if self.timing is not None else None, self.observers, prefixes, distinguish, self.assumptions, self.shared)
 
+    def refine(self, E_vals):
+        #static timing lemmas of a candidate, and while optimize probes a cost, the critical paths above it under the probe literal
+        lemmas = self.timing.lemmas(E_vals)
+        if self.cost_probe is not None:
+            literal, weights, limit = self.cost_probe
+            lemmas += [self.solver.make_term(pops.Implies, literal, lemma) for lemma in self.timing.cost_lemmas(E_vals, weights, limit)]
+        return lemmas
 
-    def run(self):
-        res = self.cegis.run()
-        if res is None:
+    def extend(self, num_cycles):
+        #move the CEGIS problem to a larger bound, carrying over every counterexample found so far
+        old = self.cegis
+        # the old verifier scope has to be released first, the new Cegis pushes its own on the same verify_solver
+        old.close()
+        cegis = self.make_cegis(num_cycles)
+        for A_vals in old.counterexamples:
+            cegis.add_counterexample(A_vals)
+        for lemma in old.lemmas:
+            cegis.add_lemma(lemma)
+        cegis.candidates = list(old.candidates)
+        self.cegis = cegis
+        self.bound = num_cycles
+
+    def run_cegis(self, start, iterations, keep_scope = False):
+        #run the current Cegis with what is left of the budgets
+        if self.budget.max_iterations is not None:
+            self.cegis.max_iterations = self.budget.max_iterations - iterations
+        if self.budget.timeout is not None:
+            self.cegis.timeout = self.budget.timeout - (time.perf_counter() - start)
+        return self.cegis.run(keep_scope)
+
+    def synthesize(self, keep_scope = False):
+        #None if there is no solution or a budget ran out, cegis.stats["status"] tells which
+        #with keep_scope the synthesize scope stays open for the next call, see Cegis.run
+        start = time.perf_counter()
+        res = self.run_cegis(start, 0, keep_scope)
+        if not self.cegis_options.deepening:
+            return res
+
+        iterations = self.cegis.stats["iterations"]
+        while res is not None and self.bound < self.num_cycles:
+            # the candidate is correct up to the current bound, check it at the next one
+            self.extend(min(max(2 * self.bound, 1), self.num_cycles))
+            cexs = self.cegis.find_counterexamples(res)
+            if len(cexs) > 0:
+                for A_vals in cexs:
+                    self.cegis.add_counterexample(A_vals)
+                res = self.run_cegis(start, iterations, keep_scope)
+                iterations += self.cegis.stats["iterations"]
+        # a program space that is empty for fewer cycles stays empty for more
+        return res
+
+    def counterexamples_of(self, netlist):
+        #None if a decoded netlist is not a well formed (and timed) program, otherwise its counterexamples over all num_cycles
+        E_vals = self.enc.encode(netlist)
+        self.solver.push()
+        self.solver.assert_formula(self.solver.substitute(self.synth_base, E_vals))
+        wfp = self.solver.check_sat().is_sat()
+        self.solver.pop()
+        if not wfp or (self.timing is not None and len(self.timing.lemmas(E_vals)) > 0):
             return None
-        op_input_lvars = tuple(tuple(res[lvar] for lvar in input_lvars) for input_lvars in self.enc.op_input_lvars)
-        op_output_lvars = tuple(tuple(res[lvar] for lvar in output_lvars) for output_lvars in self.enc.op_output_lvars)
-        output_lvars = tuple(res[lvar] for lvar in self.enc.output_lvars)
-        return self.enc.input_lvars, op_input_lvars, op_output_lvars, output_lvars
+        if self.bound < self.num_cycles:
+            self.extend(self.num_cycles)
+        return [{var:vals[var] for var in self.cegis.A_vars} for vals in self.cegis.check(E_vals, (), self.cegis_options.num_counterexamples)]
+
+    def check_netlist(self, netlist):
+        #whether a decoded netlist is a well formed (and timed) program that meets the spec for all num_cycles
+        cexs = self.counterexamples_of(netlist)
+        return cexs is not None and len(cexs) == 0
+
+    def expand(self, netlist):
+        #netlist over the ops given to the constructor, with None for the connections of ops dropped by prune
+        if netlist is None or self.kept is None:
+            return netlist
+        input_lvars, op_input_lvars, op_output_lvars, output_lvars = netlist
+        index = {i:n for n,i in enumerate(self.kept)}
+        return (input_lvars,
+                tuple(op_input_lvars[index[i]] if i in index else None for i in range(len(self.ops))),
+                tuple(op_output_lvars[index[i]] if i in index else None for i in range(len(self.ops))),
+                output_lvars)
+
+    def run(self):
+        #returns the line numbers (input_lvars, op_input_lvars, op_output_lvars, output_lvars) of a solution, or None
+        return self.expand(self.solve())
+
+    def solve(self):
+        #run over the ops of the encoding, the netlists used inside CircuitSynth
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(self)
+            entry = self.cache.get(key)
+            # unsat entries are trusted, see ResultCache.trust_unsat
+            if entry is not None and entry["netlist"] is None:
+                self.cegis.stats["status"] = "unsat"
+                return None
+            if entry is not None and self.check_netlist(entry["netlist"]):
+                return entry["netlist"]
+
+        res = self.synthesize()
+        netlist = None if res is None else self.enc.decode(res)
+        if key is not None and (netlist is not None or self.cegis.stats["status"] == "unsat"):
+            self.cache.put(key, netlist)
+        return netlist
+
+    def enumerate(self, limit = None, timeout = None, max_blocks = 64):
+        #generator over distinct solutions, found one after the other in one synthesize scope with the same counterexamples,
+        #the blocking lemmas of each solution are added to that scope
+        #each solution is blocked up to line placement, unused ops and up to max_blocks relabelings of identical ops,
+        #other relabelings and commutative input orders are skipped when found, so they are never yielded twice
+        #stops when there are no more solutions, after limit solutions, or timeout seconds in all
+        start = time.perf_counter()
+        timeout_before = self.budget.timeout
+        seen = set()
+        count = 0
+        try:
+            while limit is None or count < limit:
+                if timeout is not None:
+                    self.budget.timeout = timeout - (time.perf_counter() - start)
+                    if self.budget.timeout <= 0:
+                        return
+                res = self.synthesize(keep_scope = True)
+                if res is None:
+                    return
+                netlist = self.enc.decode(res)
+                for lemma in self.enc.blocking_lemmas(netlist, max_blocks):
+                    self.cegis.add_lemma_to_scope(lemma)
+                signature = self.enc.signature(netlist)
+                if signature in seen:
+                    continue
+                seen.add(signature)
+                count += 1
+                yield self.expand(netlist)
+        finally:
+            self.budget.timeout = timeout_before
+            self.cegis.close_scope()
+
+    def make_delay_bounds(self):
+        #swap the constant delay limits in synth_base for bound variables capped by them, keeping the counterexamples,
+        #only used without lazy timing, which probes costs through refine instead
+        if self.delay_bounds is not None:
+            return self.delay_bounds
+        enforce_timing, input_delays, cycle_delay, max_output_delays = self.timing_params
+        delaysort = self.solver.make_sort(BV, self.nodes.delay_width)
+        zero = self.solver.make_term(0, delaysort)
+        cycle_bound = self.solver.make_symbol("cycle_bound", delaysort)
+        output_bound = self.solver.make_symbol("output_bound", delaysort)
+        caps = (
+            self.solver.make_term(pops.BVSge, cycle_bound, zero),
+            self.solver.make_term(pops.BVSge, output_bound, zero),
+            self.solver.make_term(pops.BVSle, cycle_bound, self.solver.make_term(cycle_delay, delaysort)),
+        ) + tuple(self.solver.make_term(pops.BVSle, delay, self.solver.make_term(d, delaysort)) for delay,d in zip(self.enc.output_delays, max_output_delays))
+        P_timing = self.make_P_timing(cycle_bound, tuple(output_bound for _ in self.enc.output_delays))
+        self.synth_base = functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), caps + (P_timing, self.enc.P_conn_delays, self.enc.P_wfp))
+        self.extend(self.bound)
+        self.delay_bounds = (cycle_bound, output_bound)
+        return self.delay_bounds
+
+    def optimize(self, objective = "output", weights = (1, 1), search = "binary"):
+        #minimize the output delay, the cycle delay or weights[0] * output delay + weights[1] * cycle delay,
+        #below the limits given to the constructor, with one encoding and counterexample set for every probed cost,
+        #all probes share one synthesize scope and only differ in the assumption bounding the cost
+        #returns (netlist, cost, infeasible) where infeasible is the largest cost proven impossible, -1 if none was
+        enforce_timing, input_delays, cycle_delay, max_output_delays = self.timing_params
+        if not enforce_timing:
+            raise ValueError("CircuitSynth.optimize needs enforce_timing and its delay limits")
+        if objective not in ("output", "cycle", "weighted"):
+            raise ValueError(f"CircuitSynth.optimize objective should be one of ('output', 'cycle', 'weighted'), got {objective}")
+        if search not in ("binary", "linear"):
+            raise ValueError(f"CircuitSynth.optimize search should be one of ('binary', 'linear'), got {search}")
+        weights = {"output": (1, 0), "cycle": (0, 1), "weighted": weights}[objective]
+
+        if self.timing is None:
+            cycle_bound, output_bound = self.make_delay_bounds()
+            # the cost is computed wide enough that the weighted sum cannot wrap around
+            widesort = self.solver.make_sort(BV, self.nodes.delay_width + 16)
+            extend = lambda t: self.solver.make_term(ss.Op(pops.Zero_Extend, 16), t)
+            cost = self.solver.make_term(pops.BVAdd,
+                                         self.solver.make_term(pops.BVMul, self.solver.make_term(weights[0], widesort), extend(output_bound)),
+                                         self.solver.make_term(pops.BVMul, self.solver.make_term(weights[1], widesort), extend(cycle_bound)))
+        sta = StaticTiming(self.enc, input_delays, cycle_delay, max_output_delays)
+        limit = weights[0] * max(max_output_delays, default = 0) + weights[1] * cycle_delay
+
+        def bound(probe):
+            #assumption that the cost is at most probe
+            if self.timing is None:
+                return self.solver.make_term(pops.BVUle, cost, self.solver.make_term(probe, widesort))
+            # lazy timing: candidates above the probe get their critical paths blocked under a literal of the probe
+            type(self).num_probes += 1
+            literal = self.solver.make_symbol(f"cost_probe_{type(self).num_probes}", self.solver.make_sort(BOOL))
+            self.cost_probe = (literal, weights, probe)
+            return literal
+
+        best = None
+        infeasible = -1
+        try:
+            while best is None or best[1] - infeasible > 1:
+                if best is None:
+                    probe = None
+                elif search == "binary":
+                    probe = (best[1] + infeasible) // 2
+                else:
+                    probe = best[1] - 1
+                self.assumptions[:] = [] if probe is None else [bound(probe)]
+
+                res = self.synthesize(keep_scope = True)
+                if res is None:
+                    if self.cegis.stats["status"] != "unsat" or probe is None:
+                        # out of budget, or no circuit meets even the limits
+                        break
+                    infeasible = probe
+                    continue
+
+                netlist = self.enc.decode(res)
+                if sta.supported:
+                    cycle, output = sta.worst(netlist)
+                    best = (netlist, weights[0] * output + weights[1] * cycle)
+                else:
+                    best = (netlist, probe if probe is not None else limit)
+        finally:
+            self.assumptions[:] = []
+            self.cost_probe = None
+            self.cegis.close_scope()
+
+        if best is None:
+            return None, None, infeasible
+        return self.expand(best[0]), best[1], infeasible
+
+    def run_abstracted(self, make_spec, widths = (2, 4), max_rounds = 8):
+        #synthesize at the narrower widths first and verify at full width, see WidthAbstraction
+        #self.abstraction.width tells at which width the returned netlist was found
+        self.abstraction = WidthAbstraction(self, make_spec, widths, max_rounds)
+        return self.expand(self.abstraction.run())
+
+    def run_unbounded(self, engine = "kind", prover_solver = None, max_steps = 100, max_rounds = None):
+        #synthesize up to num_cycles, then prove the result for all cycles, feeding failing traces back as counterexamples
+        #self.proof.status tells whether the returned netlist is proved or the engine gave up,
+        #self.proof.num_cycles up to which cycle the netlists were synthesized in the end
+        self.proof = EquivalenceProof(self, engine, prover_solver, max_steps)
+        netlist = self.solve()
+        rounds = 0
+        while netlist is not None:
+            A_vals = self.proof.check(netlist)
+            rounds += 1
+            if A_vals is None or (max_rounds is not None and rounds >= max_rounds):
+                return self.expand(netlist)
 
+            # the trace may be longer than the current bound, past num_cycles the answers no longer match the cache key
+            if self.bound < self.proof.num_cycles:
+                self.extend(self.proof.num_cycles)
+            self.cegis.add_counterexample(A_vals)
+            res = self.synthesize()
+            netlist = None if res is None else self.enc.decode(res)
+        return None
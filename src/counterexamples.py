@@ -0,0 +1,91 @@
+import json
+import os
+import tempfile
+from src.terms import term_to_int
+
+# bump whenever the file format changes
+VERSION = 1
+
+class CounterexamplePool:
+    #counterexamples of a run, stored by input var name so they can seed a related problem in another process
+    def __init__(self, entries = ()):
+        # entries are (vals, score), vals maps var names to (width, value)
+        self.entries = list(entries)
+
+    @classmethod
+    def from_cegis(cls, cegis, rank = False, max_candidates = 16):
+        #scores count the candidates of the run a counterexample refutes, 1 each unless rank is set, see rank for max_candidates
+        scores = cls.rank(cegis, max_candidates) if rank else [1 for _ in cegis.counterexamples]
+        return cls((cls.to_vals(A_vals), score) for A_vals,score in zip(cegis.counterexamples, scores))
+
+    @staticmethod
+    def to_vals(A_vals):
+        #plain {name: (width, value)} form of a counterexample, which can be pickled or written as json
+        return {str(var):(val.get_sort().get_width(), term_to_int(val)) for var,val in A_vals.items()}
+
+    @staticmethod
+    def to_A_vals(cegis, vals):
+        #counterexample over the inputs of cegis, inputs it does not mention are left out
+        A_vars = {str(var):var for var in cegis.A_vars}
+        A_vals = {}
+        for name,(width,val) in vals.items():
+            var = A_vars.get(name)
+            if var is None:
+                # e.g. a cycle past the bound of cegis
+                continue
+            if var.get_sort().get_width() != width:
+                raise ValueError(f"counterexample value of {name} has width {width}, expected {var.get_sort().get_width()}")
+            A_vals[var] = cegis.solver.make_term(val, var.get_sort())
+        return A_vals
+
+    @staticmethod
+    def rank(cegis, max_candidates = 16):
+        #one synth solver call per counterexample and candidate, only the last max_candidates candidates (all if None) are scored against,
+        #which are the ones the final counterexamples were found for
+        candidates = cegis.candidates if max_candidates is None else cegis.candidates[-max_candidates:]
+        return [sum(cegis.refutes(E_vals, k) for E_vals in candidates) for k in range(len(cegis.counterexamples))]
+
+    def best(self, k = None):
+        #the k highest scoring counterexamples, earlier ones first among equal scores
+        ranked = sorted(self.entries, key = lambda entry: -entry[1])
+        return CounterexamplePool(ranked if k is None else ranked[:k])
+
+    def merge(self, other):
+        #union of both pools, the scores of counterexamples in both are added up
+        merged = {}
+        for vals,score in self.entries + other.entries:
+            key = json.dumps(vals, sort_keys = True)
+            merged[key] = (vals, merged[key][1] + score if key in merged else score)
+        return CounterexamplePool(merged.values())
+
+    def seed(self, cegis):
+        #add every counterexample over inputs of cegis, inputs it does not mention get fresh copies
+        added = 0
+        for vals,_ in self.entries:
+            A_vals = self.to_A_vals(cegis, vals)
+            if len(A_vals) > 0:
+                cegis.add_counterexample(A_vals)
+                added += 1
+        return added
+
+    def save(self, path):
+        #written through a temp file and renamed, so readers never see a partial pool
+        fd, tmp = tempfile.mkstemp(dir = os.path.dirname(os.path.abspath(path)), suffix = ".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"version": VERSION, "counterexamples": [{"vals": vals, "score": score} for vals,score in self.entries]}, f)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") != VERSION:
+            raise ValueError(f"counterexample pool {path} has version {data.get('version')}, expected {VERSION}")
+        return cls(({name:tuple(v) for name,v in entry["vals"].items()}, entry["score"]) for entry in data["counterexamples"])
+
+    def __len__(self):
+        return len(self.entries)
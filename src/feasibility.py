@@ -0,0 +1,171 @@
+class InfeasibleError(ValueError):
+    #a CircuitSynth problem without any solution, found before solving it, reason says why
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Presolve:
+    #static pass over the types and the concrete timing of a problem, before its encoding is built
+    #finds problems without solutions and the sources each sink can possibly use, and with prune the ops that can never be part of one
+    #sources and sinks are named like the cubes of src.parallel: ("input", m), ("op_output", i, j), ("output", k), ("op_input", i, j)
+    def __init__(self, nodes, types, ops, timing_params, prune = False):
+        self.nodes = nodes
+        # drop the ops that can never be used instead of raising for them, see run_pruned
+        self.prune = prune
+        self.types = types
+        self.ops = ops
+        self.enforce_timing, self.input_delays, self.cycle_delay, self.max_output_delays = timing_params
+        if self.input_delays is None:
+            self.input_delays = tuple(0 for _ in types[0])
+
+    def is_stateful(self, op, j):
+        #whether output j of op comes from state, so it may feed the op's own inputs
+        if isinstance(op, self.nodes.SeqNode):
+            return True
+        return isinstance(op, self.nodes.SpecNode) and op.is_moores[j]
+
+    def can_time(self, op):
+        return op.can_sta and not (isinstance(op, self.nodes.SpecNode) and any(op.is_moores))
+
+    def driven(self, kept):
+        #the ops among kept whose inputs can all be driven by the others, and the types available at all
+        kept = set(kept)
+        while True:
+            avail = set(self.types[0])
+            for i in kept:
+                avail |= {t for j,t in enumerate(self.ops[i].types[1]) if self.is_stateful(self.ops[i], j)}
+            # the other outputs are only computed once all the op inputs are
+            changed = True
+            while changed:
+                changed = False
+                for i in kept:
+                    op = self.ops[i]
+                    if all(t in avail for t in op.types[0]) and not set(op.types[1]) <= avail:
+                        avail |= set(op.types[1])
+                        changed = True
+            driven = {i for i in kept if all(t in avail for t in self.ops[i].types[0])}
+            if driven == kept:
+                return kept, avail
+            kept = driven
+
+    def usable(self, kept):
+        #the ops among kept whose inputs can all be driven and whose outputs can reach a circuit output, and the types available at all
+        kept, avail = self.driven(kept)
+        useful_types = set(self.types[1])
+        useful = set()
+        changed = True
+        while changed:
+            changed = False
+            for i in kept - useful:
+                if any(t in useful_types for t in self.ops[i].types[1]):
+                    useful.add(i)
+                    useful_types |= set(self.ops[i].types[0])
+                    changed = True
+        return sorted(useful), avail
+
+    def sources(self, kept):
+        #(source, type) of every circuit input and output of a kept op
+        res = [(("input", m), t) for m,t in enumerate(self.types[0])]
+        for i in kept:
+            res.extend((("op_output", i, j), t) for j,t in enumerate(self.ops[i].types[1]))
+        return res
+
+    def arrivals(self, kept):
+        #lower bound on the arrival time of every source, -inf where an op has no concrete timing
+        #delays are monotone in the input delays, so the earliest inputs give the earliest outputs
+        sources = self.sources(kept)
+        arrival = {("input", m):d for m,d in enumerate(self.input_delays)}
+        comb = []
+        for i in kept:
+            op = self.ops[i]
+            if not self.can_time(op):
+                arrival.update({("op_output", i, j):float("-inf") for j in range(len(op.types[1]))})
+            elif isinstance(op, self.nodes.SeqNode):
+                arrival.update({("op_output", i, j):d for j,d in enumerate(op.sta_launch())})
+            else:
+                arrival.update({("op_output", i, j):float("inf") for j in range(len(op.types[1]))})
+                comb.append(i)
+
+        for _ in range(len(comb)):
+            changed = False
+            for i in comb:
+                op = self.ops[i]
+                delays = tuple(min((arrival[s] for s,ts in sources if ts == t and s[:2] != ("op_output", i)), default = float("inf")) for t in op.types[0])
+                if float("inf") in delays:
+                    continue
+                outs = op.sta(*delays)[2] if isinstance(op, self.nodes.SpecNode) else op.sta(*delays)
+                for j,d in enumerate(outs):
+                    if d < arrival[("op_output", i, j)]:
+                        arrival[("op_output", i, j)] = d
+                        changed = True
+            if not changed:
+                break
+        return arrival
+
+    def domains(self, kept):
+        #sources each sink can use, and the kept ops with an input no source can drive in time
+        sources = self.sources(kept)
+        arrival = self.arrivals(kept) if self.enforce_timing else None
+        res = {}
+        late = set()
+        for k,t in enumerate(self.types[1]):
+            srcs = [s for s,ts in sources if ts == t]
+            if arrival is not None:
+                earliest = min((arrival[s] for s in srcs), default = float("inf"))
+                srcs = [s for s in srcs if arrival[s] <= self.max_output_delays[k]]
+                if len(srcs) == 0:
+                    raise InfeasibleError(f"output {k} has a max output delay of {self.max_output_delays[k]}, but its earliest source of width {t} arrives at {earliest}")
+            res[("output", k)] = srcs
+
+        for i in kept:
+            op = self.ops[i]
+            for j,t in enumerate(op.types[0]):
+                # an op output that is not stateful comes after the op inputs
+                srcs = [s for s,ts in sources if ts == t and not (s[:2] == ("op_output", i) and not self.is_stateful(op, s[2]))]
+                if arrival is not None and isinstance(op, self.nodes.SeqNode) and op.can_sta:
+                    earliest = tuple(min((arrival[s] for s,ts in sources if ts == tj), default = float("inf")) for tj in op.types[0])
+                    srcs = [s for s in srcs if all(d <= self.cycle_delay for d in op.sta_capture(*(earliest[:j] + (arrival[s],) + earliest[j + 1:]))[0])]
+                if len(srcs) == 0:
+                    late.add(i)
+                res[("op_input", i, j)] = srcs
+        return res, late
+
+    def run(self):
+        #(kept op indices, domains over the kept ops renumbered from 0), raises InfeasibleError if there is no solution
+        #every op is kept and has to be connected and meet timing even when unused, as in the encoding,
+        #so an op with an input no source can drive (in time) makes the whole problem infeasible
+        if self.prune:
+            return self.run_pruned()
+        kept = range(len(self.ops))
+        driven, avail = self.driven(kept)
+        for i in kept:
+            if i not in driven:
+                t = next(t for t in self.ops[i].types[0] if t not in avail)
+                raise InfeasibleError(f"op {i} has an input of width {t}, but the inputs and ops only provide widths {sorted(avail)}")
+        self.check_outputs(avail)
+        domains, late = self.domains(kept)
+        for i in sorted(late):
+            j = next(j for j in range(len(self.ops[i].types[0])) if len(domains[("op_input", i, j)]) == 0)
+            raise InfeasibleError(f"op {i} input {j} has no source that arrives in time for a cycle delay of {self.cycle_delay}")
+        return list(kept), {sink:tuple(srcs) for sink,srcs in domains.items()}
+
+    def run_pruned(self):
+        #like run, but the ops that can never be part of a solution are dropped instead: ops with an input no source can drive (in time)
+        #and ops whose outputs never reach a circuit output, so a problem only infeasible because of such ops is solved without them
+        kept = range(len(self.ops))
+        while True:
+            kept, avail = self.usable(kept)
+            self.check_outputs(avail)
+            domains, late = self.domains(kept)
+            if len(late) == 0:
+                break
+            kept = [i for i in kept if i not in late]
+        index = {i:n for n,i in enumerate(kept)}
+        renumber = lambda x: (x[0], index[x[1]], x[2]) if x[0] in ("op_output", "op_input") else x
+        return kept, {renumber(sink):tuple(map(renumber, srcs)) for sink,srcs in domains.items()}
+
+    def check_outputs(self, avail):
+        for k,t in enumerate(self.types[1]):
+            if t not in avail:
+                raise InfeasibleError(f"output {k} of width {t} has no source, the inputs and usable ops only provide widths {sorted(avail)}")
@@ -0,0 +1,160 @@
+import itertools
+import multiprocessing
+import queue
+import time
+from src.counterexamples import CounterexamplePool
+from src.feasibility import InfeasibleError
+from src.parallel import make_solver
+
+def make_ops(nodes, library):
+    #ops of a library given as (name, pargs) pairs, name is a constructor of nodes such as "Add" or "Register"
+    ops = []
+    for name,pargs in library:
+        if not hasattr(nodes, name):
+            raise ValueError(f"{name} is not an op constructor of Nodes")
+        ops.append(getattr(nodes, name)(**pargs))
+    return tuple(ops)
+
+def solve_library(build, library, config, entries):
+    #(netlist, status, counterexample pool entries) of one library, seeded with the entries of the libraries tried before
+    solver = make_solver(config.get("backend", "btor"), config.get("options"))
+    cs = build(solver, library, **config.get("kwargs", {}))
+    CounterexamplePool(entries).seed(cs.cegis)
+    res = cs.synthesize()
+    netlist = None if res is None else cs.expand(cs.enc.decode(res))
+    return netlist, cs.cegis.stats["status"], CounterexamplePool.from_cegis(cs.cegis).entries
+
+def try_library(build, library, config, entries):
+    # a library the problem provably cannot be built with (e.g. no source for some type) is unsat,
+    # any other exception is an error of that library only
+    try:
+        return (*solve_library(build, library, config, entries), None)
+    except InfeasibleError:
+        return None, "unsat", [], None
+    except Exception as e:
+        return None, "error", [], repr(e)
+
+def library_worker(index, build, library, config, entries, results):
+    results.put((index, *try_library(build, library, config, entries)))
+
+
+class LibrarySearch:
+    #smallest multiset of ops from a menu with which a problem has a solution, trying libraries by increasing size
+    #all libraries of one size are independent and run in parallel, every counterexample of a failed library
+    #is an input trace that refutes the same circuits in a larger library, so they seed the next size
+    def __init__(self, build, menu, min_counts = None, max_counts = None, max_size = None, num_workers = 1, config = None, timeout = None, mp_context = None):
+        # build(solver, library, **config["kwargs"]) must be a picklable (module level) function returning a CircuitSynth,
+        # library is a tuple of (name, pargs) menu entries, see make_ops
+        self.build = build
+        self.menu = tuple(menu)
+        self.min_counts = tuple(min_counts) if min_counts is not None else tuple(0 for _ in self.menu)
+        self.max_counts = tuple(max_counts) if max_counts is not None else tuple(None for _ in self.menu)
+        if len(self.menu) == 0:
+            raise ValueError("LibrarySearch needs a non-empty menu")
+        if len(self.min_counts) != len(self.menu) or len(self.max_counts) != len(self.menu):
+            raise ValueError(f"LibrarySearch min_counts and max_counts should have one entry per menu item, got {len(self.min_counts)} and {len(self.max_counts)} for {len(self.menu)}")
+        bounded = all(m is not None for m in self.max_counts)
+        self.max_size = max_size if max_size is not None or not bounded else sum(self.max_counts)
+        if self.max_size is None:
+            raise ValueError("LibrarySearch needs max_size unless every menu item has a max_count")
+        # the encoding needs at least one op
+        self.min_size = max(1, sum(self.min_counts))
+        self.num_workers = num_workers
+        self.config = config if config is not None else {}
+        self.timeout = timeout
+        self.ctx = multiprocessing.get_context(mp_context)
+        self.pool = CounterexamplePool()
+        # (library, status) of every library tried, in order
+        self.tried = []
+        # (library, error) of every library that could not be built or solved
+        self.errors = []
+        # "sat" once the returned library is proven the smallest, "unsat" if no library up to max_size works,
+        # "open" if a smaller library ran out of budget or failed with an error, so the answer may not be the smallest
+        self.status = None
+
+    def libraries(self, size):
+        #every library of size ops within the counts, as counts per menu item
+        res = []
+        for items in itertools.combinations_with_replacement(range(len(self.menu)), size):
+            counts = tuple(items.count(k) for k in range(len(self.menu)))
+            if all(c >= lo and (hi is None or c <= hi) for c,lo,hi in zip(counts, self.min_counts, self.max_counts)):
+                res.append(counts)
+        return res
+
+    def expand(self, counts):
+        return tuple(entry for entry,count in zip(self.menu, counts) for _ in range(count))
+
+    def run(self):
+        #(library, netlist) of the first solution found among the smallest libraries, None if no library up to max_size works,
+        #only libraries proven unsat are ruled out, self.status tells whether the answer is proven
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        self.tried = []
+        self.errors = []
+        self.status = "open"
+        for size in range(self.min_size, self.max_size + 1):
+            libraries = [self.expand(counts) for counts in self.libraries(size)]
+            if len(libraries) == 0:
+                continue
+            res = self.run_size(libraries, deadline)
+            if res is not None:
+                self.status = "sat" if self.proven(size) else "open"
+                return res
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+        if self.proven(self.max_size + 1):
+            self.status = "unsat"
+        return None
+
+    def proven(self, size):
+        #whether every library smaller than size was tried and proven unsat
+        tried = sum(len(self.libraries(n)) for n in range(self.min_size, size))
+        return tried == len([1 for library,status in self.tried if len(library) < size and status == "unsat"])
+
+    def run_size(self, libraries, deadline):
+        if self.num_workers == 1:
+            for library in libraries:
+                netlist, status, entries, error = try_library(self.build, library, self.config, self.pool.entries)
+                if error is not None:
+                    self.errors.append((library, error))
+                if self.record(library, netlist, status, entries):
+                    return library, netlist
+                if deadline is not None and time.monotonic() >= deadline:
+                    return None
+            return None
+
+        results = self.ctx.Queue()
+        pending = list(enumerate(libraries))
+        running = {}
+        # the pool is fixed for the whole size, so every library of a size gets the same seed
+        entries = list(self.pool.entries)
+        try:
+            while len(pending) > 0 or len(running) > 0:
+                while len(pending) > 0 and len(running) < self.num_workers:
+                    index, library = pending.pop(0)
+                    running[index] = self.ctx.Process(target = library_worker, args = (index, self.build, library, self.config, entries, results), daemon = True)
+                    running[index].start()
+                remaining = None if deadline is None else max(0, deadline - time.monotonic())
+                try:
+                    index, netlist, status, new_entries, error = results.get(timeout = remaining)
+                except queue.Empty:
+                    return None
+                running.pop(index).join()
+                if error is not None:
+                    self.errors.append((libraries[index], error))
+                if self.record(libraries[index], netlist, status, new_entries):
+                    return libraries[index], netlist
+            return None
+        finally:
+            for w in running.values():
+                if w.is_alive():
+                    w.terminate()
+            for w in running.values():
+                w.join()
+
+    def record(self, library, netlist, status, entries):
+        #whether the library works, the counterexamples of one that does not are added to the pool
+        self.tried.append((library, status))
+        if netlist is not None:
+            return True
+        self.pool = self.pool.merge(CounterexamplePool(entries))
+        return False
@@ -0,0 +1,176 @@
+import functools
+import smt_switch.primops as pops
+from smt_switch.sortkinds import BOOL, BV
+from src.terms import TermCache, term_to_int
+
+class LvarEncoding:
+    #how a location variable (the line an op input, op output or circuit output is connected to) is represented
+    def __init__(self, solver, num_lines, cache = None):
+        self.solver = solver
+        self.num_lines = num_lines
+        self.true = solver.make_term(1, solver.make_sort(BOOL))
+        self.false = solver.make_term(0, solver.make_sort(BOOL))
+
+        # the same constants and comparisons are requested over and over while building the encoding
+        self.cache = cache if cache is not None else TermCache()
+        for name in ("const", "equal", "ult", "is_line"):
+            setattr(self, name, self.cache.memoize(f"lvar_{name}", getattr(self, name)))
+
+    def conj(self, terms):
+        return functools.reduce(lambda a,b: self.solver.make_term(pops.And, a, b), terms, self.true)
+
+    def disj(self, terms):
+        return functools.reduce(lambda a,b: self.solver.make_term(pops.Or, a, b), terms, self.false)
+
+    def const(self, k):
+        raise NotImplementedError("Abstract method")
+
+    def symbol(self, name):
+        raise NotImplementedError("Abstract method")
+
+    def vars(self, lvar):
+        #the solver symbols making up lvar
+        raise NotImplementedError("Abstract method")
+
+    def valid(self, lvar):
+        #constraint that lvar encodes some line
+        return self.true
+
+    def decode(self, lvar, vals):
+        raise NotImplementedError("Abstract method")
+
+    def encode(self, lvar, line):
+        #values of the symbols of lvar for the given line, the inverse of decode
+        return dict(zip(self.vars(lvar), self.vars(self.const(line))))
+
+    def equal(self, a, b):
+        raise NotImplementedError("Abstract method")
+
+    def ult(self, a, b):
+        raise NotImplementedError("Abstract method")
+
+    def is_line(self, lvar, k):
+        return self.equal(lvar, self.const(k))
+
+    def ule(self, a, b):
+        return self.solver.make_term(pops.Not, self.ult(b, a))
+
+    def offset(self, a, b, k):
+        #b is k lines after a
+        return self.disj(self.solver.make_term(pops.And, self.is_line(a, m), self.is_line(b, m + k)) for m in range(self.num_lines - k))
+
+    def ite(self, cond, a, b):
+        return tuple(self.solver.make_term(pops.Ite, cond, x, y) for x,y in zip(a, b))
+
+
+class BinaryLvars(LvarEncoding):
+    #one bit vector per lvar holding the line number
+    def __init__(self, solver, num_lines, cache = None):
+        self.width = (num_lines - 1).bit_length()
+        self.sort = solver.make_sort(BV, self.width)
+        super().__init__(solver, num_lines, cache)
+
+    def const(self, k):
+        return self.solver.make_term(k, self.sort)
+
+    def symbol(self, name):
+        return self.solver.make_symbol(name, self.sort)
+
+    def vars(self, lvar):
+        return (lvar,)
+
+    def decode(self, lvar, vals):
+        return term_to_int(vals[lvar])
+
+    def equal(self, a, b):
+        return self.solver.make_term(pops.Equal, a, b)
+
+    def ult(self, a, b):
+        return self.solver.make_term(pops.BVUlt, a, b)
+
+    def ule(self, a, b):
+        return self.solver.make_term(pops.BVUle, a, b)
+
+    def offset(self, a, b, k):
+        return self.solver.make_term(pops.Equal, self.solver.make_term(pops.BVAdd, a, self.const(k)), b)
+
+    def ite(self, cond, a, b):
+        return self.solver.make_term(pops.Ite, cond, a, b)
+
+
+class OneHotLvars(LvarEncoding):
+    #one Boolean per line, exactly one of them is set
+    def const(self, k):
+        return tuple(self.true if m == k else self.false for m in range(self.num_lines))
+
+    def symbol(self, name):
+        BOOLsort = self.solver.make_sort(BOOL)
+        return tuple(self.solver.make_symbol(f"{name}[{m}]", BOOLsort) for m in range(self.num_lines))
+
+    def vars(self, lvar):
+        return lvar
+
+    def valid(self, lvar):
+        # ladder encoding: below[m] holds if a line before m is set, which is built once and shared,
+        # so at most one is linear in the number of lines rather than pairwise
+        below = [self.false]
+        for x in lvar[:-1]:
+            below.append(self.solver.make_term(pops.Or, below[-1], x))
+        at_most_one = (self.solver.make_term(pops.Not, self.solver.make_term(pops.And, b, x)) for b,x in zip(below[1:], lvar[1:]))
+        at_least_one = self.solver.make_term(pops.Or, below[-1], lvar[-1])
+        return self.solver.make_term(pops.And, at_least_one, self.conj(at_most_one))
+
+    def decode(self, lvar, vals):
+        return next(m for m,x in enumerate(lvar) if term_to_int(vals[x]) == 1)
+
+    def is_line(self, lvar, k):
+        return lvar[k]
+
+    def equal(self, a, b):
+        return self.disj(self.solver.make_term(pops.And, x, y) for x,y in zip(a, b))
+
+    def ult(self, a, b):
+        # above[m] holds if b is on a line after m
+        above = [self.false]
+        for y in reversed(b[1:]):
+            above.append(self.solver.make_term(pops.Or, y, above[-1]))
+        above.reverse()
+        return self.disj(self.solver.make_term(pops.And, x, gt) for x,gt in zip(a, above))
+
+
+class UnaryLvars(LvarEncoding):
+    #ordered encoding, bit m holds if the line number is larger than m
+    def const(self, k):
+        return tuple(self.true if m < k else self.false for m in range(self.num_lines - 1))
+
+    def symbol(self, name):
+        BOOLsort = self.solver.make_sort(BOOL)
+        return tuple(self.solver.make_symbol(f"{name}[{m}]", BOOLsort) for m in range(self.num_lines - 1))
+
+    def vars(self, lvar):
+        return lvar
+
+    def valid(self, lvar):
+        return self.conj(self.solver.make_term(pops.Implies, y, x) for x,y in zip(lvar[:-1], lvar[1:]))
+
+    def decode(self, lvar, vals):
+        return sum(term_to_int(vals[x]) for x in lvar)
+
+    def is_line(self, lvar, k):
+        above = lvar[k - 1] if k > 0 else self.true
+        below = self.solver.make_term(pops.Not, lvar[k]) if k < len(lvar) else self.true
+        return self.solver.make_term(pops.And, above, below)
+
+    def equal(self, a, b):
+        return self.conj(self.solver.make_term(pops.Equal, x, y) for x,y in zip(a, b))
+
+    def ult(self, a, b):
+        # a <= m < b for some m
+        return self.disj(self.solver.make_term(pops.And, self.solver.make_term(pops.Not, x), y) for x,y in zip(a, b))
+
+
+LVAR_ENCODINGS = {
+    "binary": BinaryLvars,
+    "onehot": OneHotLvars,
+    "unary": UnaryLvars,
+}
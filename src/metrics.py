@@ -0,0 +1,84 @@
+import logging
+
+class Observer:
+    #base class for Cegis observers, every event is a no-op unless overridden
+    def on_start(self, cegis):
+        pass
+
+    def on_synth(self, cegis, iteration, duration, sat):
+        pass
+
+    def on_refine(self, cegis, iteration, duration, lemmas):
+        pass
+
+    def on_verify(self, cegis, iteration, duration, counterexamples):
+        pass
+
+    def on_counterexample(self, cegis, A_vals, fresh_vars, term_count):
+        pass
+
+    def on_finish(self, cegis, result):
+        pass
+
+
+class MetricsCollector(Observer):
+    #one record per CEGIS iteration, for every Cegis it observes (CircuitSynth builds a new one per bound when deepening)
+    def __init__(self):
+        self.runs = []
+
+    def on_start(self, cegis):
+        self.runs.append({"cegis": cegis.id, "iterations": [], "fresh_vars": 0, "term_count": cegis.term_count, "status": None, "time": None})
+
+    def on_synth(self, cegis, iteration, duration, sat):
+        self.runs[-1]["iterations"].append({"iteration": iteration, "synth_time": duration, "sat": sat, "verify_time": None, "counterexamples": [], "lemmas": 0})
+
+    def on_refine(self, cegis, iteration, duration, lemmas):
+        self.runs[-1]["iterations"][-1].update(verify_time = duration, lemmas = len(lemmas))
+
+    def on_verify(self, cegis, iteration, duration, counterexamples):
+        self.runs[-1]["iterations"][-1].update(verify_time = duration, counterexamples = counterexamples)
+
+    def on_counterexample(self, cegis, A_vals, fresh_vars, term_count):
+        # counterexamples can be added outside of run, e.g. when they are carried over to a larger bound
+        if len(self.runs) > 0:
+            self.runs[-1]["fresh_vars"] += fresh_vars
+            self.runs[-1]["term_count"] = term_count
+
+    def on_finish(self, cegis, result):
+        self.runs[-1].update(status = cegis.stats["status"], time = cegis.stats["time"])
+
+    def summary(self):
+        iterations = [it for run in self.runs for it in run["iterations"]]
+        return {
+            "runs": len(self.runs),
+            "iterations": len(iterations),
+            "synth_time": sum(it["synth_time"] for it in iterations),
+            "verify_time": sum(it["verify_time"] for it in iterations if it["verify_time"] is not None),
+            "counterexamples": sum(len(it["counterexamples"]) for it in iterations),
+            "lemmas": sum(it["lemmas"] for it in iterations),
+            "fresh_vars": sum(run["fresh_vars"] for run in self.runs),
+            "term_count": self.runs[-1]["term_count"] if len(self.runs) > 0 else 0,
+            "status": self.runs[-1]["status"] if len(self.runs) > 0 else None,
+        }
+
+
+class LogObserver(Observer):
+    #one log line per solver call, to see whether a long run is stuck in synth or in verify
+    def __init__(self, logger = None, level = logging.INFO):
+        self.logger = logger if logger is not None else logging.getLogger("cegis")
+        self.level = level
+
+    def on_synth(self, cegis, iteration, duration, sat):
+        self.logger.log(self.level, f"cegis {cegis.id} iteration {iteration}: synth {'sat' if sat else 'unsat'} in {duration:.3f}s")
+
+    def on_refine(self, cegis, iteration, duration, lemmas):
+        self.logger.log(self.level, f"cegis {cegis.id} iteration {iteration}: {len(lemmas)} lemmas in {duration:.3f}s")
+
+    def on_verify(self, cegis, iteration, duration, counterexamples):
+        self.logger.log(self.level, f"cegis {cegis.id} iteration {iteration}: verify found {len(counterexamples)} counterexamples in {duration:.3f}s")
+
+    def on_counterexample(self, cegis, A_vals, fresh_vars, term_count):
+        self.logger.log(self.level, f"cegis {cegis.id}: {len(cegis.instances)} instances, {fresh_vars} fresh vars, {term_count} terms")
+
+    def on_finish(self, cegis, result):
+        self.logger.log(self.level, f"cegis {cegis.id}: {cegis.stats['status']} after {cegis.stats['iterations']} iterations in {cegis.stats['time']:.3f}s")
@@ -5,10 +5,17 @@ from smt_switch.sortkinds import BV
 
 
 class Nodes:
-    def __init__(self, fts, delay_width):
+    def __init__(self, fts, delay_width, prefix = ""):
         self.fts = fts
         solver = fts.solver
         self.delay_width = delay_width
+        # prepended to state var names, so several Nodes can build transition systems on one solver
+        self.prefix = prefix
+
+        mask = lambda pargs: (1 << pargs["N"]) - 1
+
+        # concrete timing for static timing analysis, the latest input arrival plus the op delay
+        max_delay_sta_func = lambda pargs, *delays: (max(delays) + pargs["delay"],)
 
         bin_type_func = lambda pargs: ((pargs["N"], pargs["N"]), (pargs["N"],))
         def bin_delay_func(pargs, *delays):
@@ -16,12 +23,12 @@ class Nodes:
             op_delay = solver.make_term(pargs["delay"], solver.make_sort(BV, delay_width))
             return (solver.make_term(ops.BVAdd, max_in_delay, op_delay),)
 
-        self.Add = self.make_comb("Add", {"N": int, "delay": int}, lambda x, y: (solver.make_term(ops.BVAdd, x, y),), bin_type_func, bin_delay_func)
-        self.Sub = self.make_comb("Sub", {"N": int, "delay": int}, lambda x, y: (solver.make_term(ops.BVSub, x, y),), bin_type_func, bin_delay_func)
-        self.Mul = self.make_comb("Mul", {"N": int, "delay": int}, lambda x, y: (solver.make_term(ops.BVMul, x, y),), bin_type_func, bin_delay_func)
-        self.And = self.make_comb("And", {"N": int, "delay": int}, lambda x, y: (solver.make_term(ops.BVAnd, x, y),), bin_type_func, bin_delay_func)
-        self.Or = self.make_comb("Or", {"N": int, "delay": int}, lambda x, y: (solver.make_term(ops.BVOr, x, y),), bin_type_func, bin_delay_func)
-        self.Xor = self.make_comb("Xor", {"N": int, "delay": int}, lambda x, y: (solver.make_term(ops.BVXor, x, y),), bin_type_func, bin_delay_func)
+        self.Add = self.make_comb("Add", {"N": int, "delay": int}, lambda x, y: (solver.make_term(ops.BVAdd, x, y),), bin_type_func, bin_delay_func, lambda pargs, x, y: ((x + y) & mask(pargs),), True, sta_func = max_delay_sta_func)
+        self.Sub = self.make_comb("Sub", {"N": int, "delay": int}, lambda x, y: (solver.make_term(ops.BVSub, x, y),), bin_type_func, bin_delay_func, lambda pargs, x, y: ((x - y) & mask(pargs),), sta_func = max_delay_sta_func)
+        self.Mul = self.make_comb("Mul", {"N": int, "delay": int}, lambda x, y: (solver.make_term(ops.BVMul, x, y),), bin_type_func, bin_delay_func, lambda pargs, x, y: ((x * y) & mask(pargs),), True, sta_func = max_delay_sta_func)
+        self.And = self.make_comb("And", {"N": int, "delay": int}, lambda x, y: (solver.make_term(ops.BVAnd, x, y),), bin_type_func, bin_delay_func, lambda pargs, x, y: (x & y,), True, sta_func = max_delay_sta_func)
+        self.Or = self.make_comb("Or", {"N": int, "delay": int}, lambda x, y: (solver.make_term(ops.BVOr, x, y),), bin_type_func, bin_delay_func, lambda pargs, x, y: (x | y,), True, sta_func = max_delay_sta_func)
+        self.Xor = self.make_comb("Xor", {"N": int, "delay": int}, lambda x, y: (solver.make_term(ops.BVXor, x, y),), bin_type_func, bin_delay_func, lambda pargs, x, y: (x ^ y,), True, sta_func = max_delay_sta_func)
 
         cmp_type_func = lambda pargs: ((pargs["N"], pargs["N"]), (1,))
         def cmp_delay_func(pargs, *delays):
@@ -29,11 +36,11 @@ class Nodes:
             op_delay = solver.make_term(pargs["delay"], solver.make_sort(BV, delay_width))
             return (solver.make_term(ops.BVAdd, max_in_delay, op_delay),)
 
-        self.Equal = self.make_comb("Equals", {"N": int, "delay": int}, lambda x, y: (solver.make_term(ops.Equal, x, y),), cmp_type_func, cmp_delay_func)
-        self.Ult = self.make_comb("Lt", {"N": int, "delay": int}, lambda x, y: (solver.make_term(ops.BVUlt, x, y),), cmp_type_func, cmp_delay_func)
-        self.Ugt = self.make_comb("Gt", {"N": int, "delay": int}, lambda x, y: (solver.make_term(ops.BVUgt, x, y),), cmp_type_func, cmp_delay_func)
-        self.Ule = self.make_comb("Lte", {"N": int, "delay": int}, lambda x, y: (solver.make_term(ops.BVUle, x, y),), cmp_type_func, cmp_delay_func)
-        self.Uge = self.make_comb("Gte", {"N": int, "delay": int}, lambda x, y: (solver.make_term(ops.BVUge, x, y),), cmp_type_func, cmp_delay_func)
+        self.Equal = self.make_comb("Equals", {"N": int, "delay": int}, lambda x, y: (solver.make_term(ops.Equal, x, y),), cmp_type_func, cmp_delay_func, lambda pargs, x, y: (1 * (x == y),), True, sta_func = max_delay_sta_func)
+        self.Ult = self.make_comb("Lt", {"N": int, "delay": int}, lambda x, y: (solver.make_term(ops.BVUlt, x, y),), cmp_type_func, cmp_delay_func, lambda pargs, x, y: (1 * (x < y),), sta_func = max_delay_sta_func)
+        self.Ugt = self.make_comb("Gt", {"N": int, "delay": int}, lambda x, y: (solver.make_term(ops.BVUgt, x, y),), cmp_type_func, cmp_delay_func, lambda pargs, x, y: (1 * (x > y),), sta_func = max_delay_sta_func)
+        self.Ule = self.make_comb("Lte", {"N": int, "delay": int}, lambda x, y: (solver.make_term(ops.BVUle, x, y),), cmp_type_func, cmp_delay_func, lambda pargs, x, y: (1 * (x <= y),), sta_func = max_delay_sta_func)
+        self.Uge = self.make_comb("Gte", {"N": int, "delay": int}, lambda x, y: (solver.make_term(ops.BVUge, x, y),), cmp_type_func, cmp_delay_func, lambda pargs, x, y: (1 * (x >= y),), sta_func = max_delay_sta_func)
 
         mux_type_func = lambda pargs: ((1, pargs["N"], pargs["N"]), (pargs["N"],))
         def mux_delay_func(pargs, *delays):
@@ -42,12 +49,12 @@ class Nodes:
             op_delay = solver.make_term(pargs["delay"], solver.make_sort(BV, delay_width))
             return (solver.make_term(ops.BVAdd, max_in_delay, op_delay),)
 
-        self.Mux = self.make_comb("Mux", {"N": int, "delay": int}, lambda s, x, y: (solver.make_term(ops.Ite, s, x, y),), mux_type_func, mux_delay_func)
+        self.Mux = self.make_comb("Mux", {"N": int, "delay": int}, lambda s, x, y: (solver.make_term(ops.Ite, s, x, y),), mux_type_func, mux_delay_func, lambda pargs, s, x, y: (s * x + (1 - s) * y,), sta_func = max_delay_sta_func)
 
         def register_eval_func(inst, d):
             BVN = solver.make_sort(BV, inst.pargs["N"])
 
-            reg = fts.make_statevar(f"Register{type(inst).count}", BVN)
+            reg = fts.make_statevar(f"{self.prefix}Register{type(inst).count}", BVN)
             type(inst).count += 1
 
             fts.constrain_init(solver.make_term(ops.Equal, reg, solver.make_term(inst.pargs["init"], BVN)))
@@ -63,15 +70,42 @@ class Nodes:
             delay_without_hold = solver.make_term(ops.BVAdd, delay, solver.make_term(ops.BVNeg, hold))
             return (delay_with_setup,), (delay_without_hold,),(solver.make_term(pargs["output_delay"], delaysort),)
 
-        self.Register = self.make_seq("Register", {"N": int, "init": int, "setup": int, "hold": int, "output_delay": int}, register_eval_func, register_type_func, register_delay_func)
+        # concrete semantics: initial state, outputs from the current state, next state from the inputs
+        register_sim_funcs = (lambda pargs: pargs["init"] & mask(pargs), lambda pargs, state: (state,), lambda pargs, state, d: d)
+        # concrete timing: output delays launched by the clock, (setup, hold) of the captured inputs
+        register_sta_funcs = (lambda pargs: (pargs["output_delay"],), lambda pargs, d: ((d + pargs["setup"],), (d - pargs["hold"],)))
+        self.Register = self.make_seq("Register", {"N": int, "init": int, "setup": int, "hold": int, "output_delay": int}, register_eval_func, register_type_func, register_delay_func, register_sim_funcs, register_sta_funcs)
+
+
+    def clone(self, op, **overrides):
+        #op with the same (or overridden) parameters built by this Nodes, e.g. on another transition system
+        classes = {cls.__name__:cls for cls in vars(self).values() if isinstance(cls, type) and issubclass(cls, self.Node)}
+        cls = classes.get(type(op).__name__)
+        if cls is None:
+            if isinstance(op, self.SeqNode):
+                raise ValueError(f"{type(op).__name__} is not an op of this Nodes, its state would live in another transition system")
+            # comb and spec ops only build terms, so the class they were made with still works
+            cls = type(op)
+        return cls(**{**op.pargs, **overrides})
 
 
     class Node:
+        can_sim = False
+        can_sta = False
+        can_step = False
+        commutative = False
+
         def __init__(self, **pargs):
             self.pargs = pargs
 
         def eval(self, *args):
             raise NotImplementedError("Abstract method")
+
+        def sim(self, *args):
+            raise NotImplementedError(f"{type(self).__name__} has no concrete semantics")
+
+        def sta(self, *delays):
+            raise NotImplementedError(f"{type(self).__name__} has no concrete timing")
         
         def __call__(self, *args):
             return self.eval(*args)
@@ -145,10 +179,24 @@ class Nodes:
         return attributes
     
 
-    def make_seq(self, name, params, eval_func, type_func, timing_func):
+    def make_seq(self, name, params, eval_func, type_func, timing_func, sim_funcs = None, sta_funcs = None):
         attributes = self.make_attributes(name, params, eval_func, True, type_func)
         attributes["count"] = 0
 
+        if sim_funcs is not None:
+            sim_init_func, sim_output_func, sim_next_func = sim_funcs
+            attributes["can_sim"] = True
+            attributes["sim_init"] = lambda self: sim_init_func(self.pargs)
+            attributes["sim"] = lambda self, state: sim_output_func(self.pargs, state)
+            attributes["sim_next"] = lambda self, state, *args: sim_next_func(self.pargs, state, *args)
+
+        if sta_funcs is not None:
+            # outputs are launched by the clock so their delays cannot depend on the input delays
+            sta_launch_func, sta_capture_func = sta_funcs
+            attributes["can_sta"] = True
+            attributes["sta_launch"] = lambda self: sta_launch_func(self.pargs)
+            attributes["sta_capture"] = lambda self, *delays: sta_capture_func(self.pargs, *delays)
+
         def timing(self, *input_delays):
             assert all((isinstance(i, ss.Term) and i.get_sort().get_sort_kind() == BV) for i in input_delays)
             assert len(input_delays) == len(self.types[0])
@@ -165,8 +213,17 @@ class Nodes:
         return type(name, (self.SeqNode,), attributes)
 
 
-    def make_comb(self, name, params, eval_func, type_func, timing_func):
+    def make_comb(self, name, params, eval_func, type_func, timing_func, sim_func = None, commutative = False, sta_func = None):
         attributes = self.make_attributes(name, params, eval_func, False, type_func)
+        attributes["commutative"] = commutative
+
+        if sim_func is not None:
+            attributes["can_sim"] = True
+            attributes["sim"] = lambda self, *args: sim_func(self.pargs, *args)
+
+        if sta_func is not None:
+            attributes["can_sta"] = True
+            attributes["sta"] = lambda self, *delays: sta_func(self.pargs, *delays)
 
         def timing(self, *input_delays):
             assert all((isinstance(i, ss.Term) and i.get_sort().get_sort_kind() == BV) for i in input_delays)
@@ -179,8 +236,31 @@ class Nodes:
         attributes["timing"] = timing
         return type(name, (self.CombNode,), attributes)
 
-    def make_spec(self, name, params, spec_func, type_func, timing_func, is_moores):
+    def make_spec(self, name, params, spec_func, type_func, timing_func, is_moores, sim_func = None, sta_func = None, step_funcs = None):
+        if step_funcs is not None:
+            # init(pargs) is the state before cycle 0, step(pargs, state, *inputs) returns (outputs, next state) for one cycle
+            init_func, step_func = step_funcs
+            if spec_func is None:
+                def spec_func(pargs, *args):
+                    state = init_func(pargs)
+                    for inputs in args:
+                        out, state = step_func(pargs, state, *inputs)
+                    return out
+        elif spec_func is None:
+            raise ValueError(f"{name} needs a spec_func or step_funcs")
+
         attributes = self.make_attributes(name, params, spec_func, False, type_func)
+
+        if sim_func is not None:
+            # called with the concrete input values of every cycle so far, like spec_func
+            attributes["can_sim"] = True
+            attributes["sim"] = lambda self, *args: sim_func(self.pargs, *args)
+
+        if sta_func is not None:
+            # concrete version of timing_func, returns (setup, hold, output_delays) as ints
+            attributes["can_sta"] = True
+            attributes["sta"] = lambda self, *delays: sta_func(self.pargs, *delays)
+
         def timing(self, *input_delays):
             assert all((isinstance(i, ss.Term) and i.get_sort().get_sort_kind() == BV) for i in input_delays)
             assert len(input_delays) == len(self.types[0])
@@ -215,6 +295,30 @@ class Nodes:
             
             return out
 
+        def tc_step_func(self, state, *inputs):
+            assert all((isinstance(a, ss.Term) and a.get_sort().get_sort_kind() == BV) for a in inputs)
+            actual_in_t = tuple(a.get_sort().get_width() for a in inputs)
+            if not self.types[0] == actual_in_t:
+                raise TypeError(f"{self.name} expects input values of type {self.types[0]}, got {actual_in_t}")
+
+            out, state = step_func(self.pargs, state, *inputs)
+
+            if not isinstance(out, tuple):
+                raise TypeError(f"{self.name} expects a tuple output value, got {type(out)}")
+
+            assert all((isinstance(o, ss.Term) and o.get_sort().get_sort_kind() == BV) for o in out)
+
+            actual_out_t = tuple(o.get_sort().get_width() for o in out)
+            if not self.types[1] == actual_out_t:
+                raise TypeError(f"{self.name} expects output values of type {self.types[1]}, got {actual_out_t}")
+
+            return out, state
+
+        if step_funcs is not None:
+            attributes["can_step"] = True
+            attributes["init_state"] = lambda self: init_func(self.pargs)
+            attributes["step"] = tc_step_func
+
         attributes["timing"] = timing
         attributes["eval"] = tc_spec_func
         attributes["is_moores"] = is_moores
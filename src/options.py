@@ -0,0 +1,62 @@
+import dataclasses
+
+@dataclasses.dataclass
+class EncodingOptions:
+    #how the program space is encoded, see CircuitEncoding and src.feasibility.Presolve
+    symmetry_breaking: bool = False
+    lvar_encoding: str = "binary"
+    # narrow the sources of every sink before encoding and raise InfeasibleError for problems proven to have no solution
+    presolve: bool = False
+    # implies presolve, also drops the ops that can never be used instead of raising for them
+    prune: bool = False
+
+
+@dataclasses.dataclass
+class CegisOptions:
+    #how the CEGIS loop runs, see Cegis
+    incremental: bool = False
+    # dedicated solver for the verify step, the synth solver is the one of the nodes
+    verify_solver: object = None
+    # simulate candidates on known traces before calling the verifier, see src.simulator.SimFilter:
+    # sim_traces random traces checked against sim_spec, a concrete src.spec.StepSpec, and the traces of past counterexamples
+    prefilter: bool = False
+    sim_spec: object = None
+    sim_traces: int = 32
+    num_counterexamples: int = 1
+    # counterexamples only instantiate the cycles up to their first failing one
+    truncate_counterexamples: bool = False
+    # bound on the counterexample instances asserted at once, see Cegis.max_instances
+    max_instances: int = None
+    # synthesize without any delay terms and only add back the paths a candidate violates
+    lazy_timing: bool = False
+    # solve for initial_cycles cycles first and double the bound until num_cycles
+    deepening: bool = False
+    initial_cycles: int = 1
+
+
+@dataclasses.dataclass
+class Budget:
+    #limits of a whole synthesize call, shared by every bound when deepening
+    max_iterations: int = None
+    timeout: float = None
+
+
+# CircuitSynth keyword argument of each option group
+GROUPS = {"encoding_options": EncodingOptions, "cegis_options": CegisOptions, "budget": Budget}
+
+def synth_options(**kwargs):
+    #CircuitSynth keyword arguments from flat ones, e.g. incremental = True becomes cegis_options = CegisOptions(incremental = True),
+    #arguments that are no field of an option group (enforce_timing, observers, cache, ...) are passed through
+    fields = {f.name:group for group,cls in GROUPS.items() for f in dataclasses.fields(cls)}
+    res = {}
+    grouped = {}
+    for k,v in kwargs.items():
+        if k in fields:
+            grouped.setdefault(fields[k], {})[k] = v
+        else:
+            res[k] = v
+    for group,values in grouped.items():
+        if group in res:
+            raise TypeError(f"synth_options got {group} and its fields {sorted(values)} at once")
+        res[group] = GROUPS[group](**values)
+    return res
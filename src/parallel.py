@@ -0,0 +1,274 @@
+import json
+import multiprocessing
+import queue
+import time
+import smt_switch as ss
+from src.counterexamples import CounterexamplePool
+from src.metrics import Observer
+
+BACKENDS = {
+    "btor": "create_btor_solver",
+    "bitwuzla": "create_bitwuzla_solver",
+    "cvc5": "create_cvc5_solver",
+    "yices2": "create_yices2_solver",
+}
+
+def available_backends():
+    #the backends smt_switch was built with
+    return tuple(backend for backend,create in BACKENDS.items() if hasattr(ss, create))
+
+def make_solver(backend = "btor", options = None):
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown solver backend {backend}, expected one of {tuple(BACKENDS)}")
+    if not hasattr(ss, BACKENDS[backend]):
+        raise ValueError(f"smt_switch was built without the {backend} backend")
+    s = getattr(ss, BACKENDS[backend])(False)
+    s.set_opt('produce-models', 'true')
+    s.set_opt('incremental', 'true')
+    for k,v in (options or {}).items():
+        s.set_opt(k, str(v))
+    return s
+
+# solver options of the configurations tried per backend, seeds for every backend that takes one,
+# and eager next to the default lazy bit-blasting where the backend has the choice
+VARIANTS = {
+    "btor": ({}, {"seed": 1}),
+    "bitwuzla": ({}, {"seed": 1}),
+    "cvc5": ({}, {"seed": 1}, {"bitblast": "eager"}),
+    "yices2": ({},),
+}
+
+def default_configs():
+    return tuple({"backend": backend, "options": options} if len(options) > 0 else {"backend": backend} for backend in available_backends() for options in VARIANTS[backend])
+
+
+def portfolio_worker(index, build, config, results):
+    # the whole problem (Nodes, CircuitEncoding, CircuitSynth) is built inside the worker,
+    # so every worker has its own solver, transition system and Register counts
+    try:
+        solver = make_solver(config.get("backend", "btor"), config.get("options"))
+        cs = build(solver, **config.get("kwargs", {}))
+        netlist = cs.run()
+        results.put((index, cs.cegis.stats["status"], netlist, None))
+    except Exception as e:
+        results.put((index, "error", None, repr(e)))
+
+
+class Portfolio:
+    def __init__(self, build, configs = None, timeout = None, mp_context = None):
+        # build(solver, **config["kwargs"]) must be a picklable (module level) function returning a CircuitSynth
+        self.build = build
+        self.configs = tuple(configs) if configs is not None else default_configs()
+        self.timeout = timeout
+        self.ctx = multiprocessing.get_context(mp_context)
+        # "sat" or "unsat" as answered by the winner, otherwise why there is no answer (timeout or the budget of the last worker)
+        self.status = None
+        # worker index to the budget it ran out of, or to its error
+        self.exits = {}
+        self.errors = {}
+
+        if len(self.configs) == 0:
+            raise ValueError("Portfolio needs at least one solver configuration")
+
+    def run(self):
+        #returns (config, netlist) of the first worker to answer, netlist is None if that worker proved unsat (see status),
+        #None if no worker answered, either because of the timeout or because every worker ran out of its own budget
+        results = self.ctx.Queue()
+        workers = [self.ctx.Process(target = portfolio_worker, args = (i, self.build, config, results), daemon = True) for i,config in enumerate(self.configs)]
+        for w in workers:
+            w.start()
+
+        self.status = None
+        self.exits = {}
+        self.errors = {}
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        try:
+            while len(self.exits) < len(workers):
+                remaining = None if deadline is None else max(0, deadline - time.monotonic())
+                try:
+                    index, status, netlist, error = results.get(timeout = remaining)
+                except queue.Empty:
+                    self.status = "timeout"
+                    return None
+                if error is not None:
+                    self.errors[index] = error
+                if status not in ("sat", "unsat"):
+                    # a budget exit says nothing about the problem, the other workers may still answer
+                    self.exits[index] = status
+                    continue
+                self.status = status
+                return self.configs[index], netlist
+            if len(self.errors) == len(workers):
+                raise RuntimeError(f"all portfolio workers failed: {self.errors}")
+            self.status = next(status for status in self.exits.values() if status != "error")
+            return None
+        finally:
+            for w in workers:
+                if w.is_alive():
+                    w.terminate()
+            for w in workers:
+                w.join()
+
+
+def cube_sinks(enc):
+    #lvars to split the program space on, circuit outputs first, then op inputs in op order
+    return tuple(("output", k) for k in range(enc.num_outputs)) + tuple(("op_input", i, j) for i,op in enumerate(enc.ops) for j in range(len(op.types[0])))
+
+def cube_sources(enc, sink, drop_symmetric = False):
+    #circuit inputs and op outputs of the sink's type (and in its domain), drop_symmetric keeps only the first of identical ops
+    t = enc.types[1][sink[1]] if sink[0] == "output" else enc.ops[sink[1]].types[0][sink[2]]
+    sources = [("input", m) for m,tm in enumerate(enc.types[0]) if tm == t]
+    seen = set()
+    for i,op in enumerate(enc.ops):
+        for j,tj in enumerate(op.types[1]):
+            if tj != t or (drop_symmetric and (type(op), str(op), j) in seen):
+                continue
+            seen.add((type(op), str(op), j))
+            sources.append(("op_output", i, j))
+    if enc.domains is not None:
+        sources = [s for s in sources if s in enc.domains[sink]]
+    return sources
+
+def make_cubes(enc, num_cubes):
+    #at least num_cubes disjoint cubes covering every program (unless the lvars run out), each one fixes the sources of a few sinks
+    #identical ops are interchangeable, so only the first of them is tried as the source of the first sink,
+    #unless symmetry breaking picks its own representative
+    cubes = [()]
+    for level,sink in enumerate(cube_sinks(enc)):
+        if len(cubes) >= num_cubes:
+            break
+        sources = cube_sources(enc, sink, level == 0 and not enc.symmetry_breaking)
+        cubes = [cube + ((sink, source),) for cube in cubes for source in sources]
+    return cubes
+
+def cube_term(enc, cube):
+    return enc.lvars.conj(enc.lvars.equal(enc.lvar(sink), enc.lvar(source)) for sink,source in cube)
+
+
+class SharedCounterexamples(Observer):
+    #sends the counterexamples of one worker to every other worker, in the CounterexamplePool {name: (width, value)} form
+    def __init__(self, index, inboxes):
+        self.index = index
+        self.inboxes = inboxes
+        # counterexamples already sent or received, so received ones are not sent back
+        self.known = set()
+        self.stats = {"cubes": 0, "sent": 0, "received": 0}
+        for inbox in inboxes:
+            # sharing is best effort, a worker must be able to exit with counterexamples nobody read
+            inbox.cancel_join_thread()
+
+    def on_counterexample(self, cegis, A_vals, fresh_vars, term_count):
+        vals = CounterexamplePool.to_vals(A_vals)
+        key = json.dumps(vals, sort_keys = True)
+        if key in self.known:
+            return
+        self.known.add(key)
+        for k,inbox in enumerate(self.inboxes):
+            if k != self.index:
+                inbox.put(vals)
+        self.stats["sent"] += 1
+
+    def receive(self, cegis):
+        res = []
+        while True:
+            try:
+                vals = self.inboxes[self.index].get_nowait()
+            except queue.Empty:
+                return res
+            key = json.dumps(vals, sort_keys = True)
+            if key in self.known:
+                continue
+            self.known.add(key)
+            A_vals = CounterexamplePool.to_A_vals(cegis, vals)
+            if len(A_vals) > 0:
+                res.append(A_vals)
+                self.stats["received"] += 1
+
+
+def cube_worker(index, build, config, num_cubes, next_cube, inboxes, results):
+    # every worker builds the same problem and cube list, and takes the next unsolved cube from the shared counter,
+    # counterexamples and timing lemmas hold in every cube, so they are kept from one cube to the next,
+    # in one synthesize scope where only the assumed cube changes
+    try:
+        solver = make_solver(config.get("backend", "btor"), config.get("options"))
+        share = SharedCounterexamples(index, inboxes)
+        cs = build(solver, observers = (share,), shared = share.receive, **config.get("kwargs", {}))
+        cubes = make_cubes(cs.enc, num_cubes)
+        while True:
+            with next_cube.get_lock():
+                k = next_cube.value
+                next_cube.value += 1
+            if k >= len(cubes):
+                results.put((index, "unsat", None, share.stats, None))
+                return
+            cs.assumptions[:] = [cube_term(cs.enc, cubes[k])]
+            res = cs.synthesize(keep_scope = True)
+            share.stats["cubes"] += 1
+            if res is not None:
+                results.put((index, "sat", cs.expand(cs.enc.decode(res)), share.stats, None))
+                return
+            if cs.cegis.stats["status"] != "unsat":
+                # out of budget, the cube is left open
+                results.put((index, cs.cegis.stats["status"], None, share.stats, None))
+                return
+    except Exception as e:
+        results.put((index, "error", None, None, repr(e)))
+
+
+class CubeAndConquer:
+    def __init__(self, build, num_workers, num_cubes = None, config = None, timeout = None, mp_context = None):
+        # build(solver, observers = ..., shared = ..., **config["kwargs"]) must be a picklable (module level) function returning a CircuitSynth,
+        # cubes are handed out dynamically, so more cubes than workers balance the load
+        if num_workers < 1:
+            raise ValueError(f"CubeAndConquer num_workers should be positive, got {num_workers}")
+        self.build = build
+        self.num_workers = num_workers
+        self.num_cubes = num_cubes if num_cubes is not None else 4 * num_workers
+        self.config = config if config is not None else {}
+        self.timeout = timeout
+        self.ctx = multiprocessing.get_context(mp_context)
+        self.status = None
+        self.stats = {}
+        self.errors = {}
+
+    def run(self):
+        #netlist of the first worker to solve its cube, None if every cube is unsat or the run is cut short (see status)
+        results = self.ctx.Queue()
+        inboxes = [self.ctx.Queue() for _ in range(self.num_workers)]
+        next_cube = self.ctx.Value("i", 0)
+        workers = [self.ctx.Process(target = cube_worker, args = (i, self.build, self.config, self.num_cubes, next_cube, inboxes, results), daemon = True) for i in range(self.num_workers)]
+        for w in workers:
+            w.start()
+
+        self.status = None
+        self.stats = {}
+        self.errors = {}
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        try:
+            statuses = []
+            while len(statuses) < len(workers):
+                remaining = None if deadline is None else max(0, deadline - time.monotonic())
+                try:
+                    index, status, netlist, stats, error = results.get(timeout = remaining)
+                except queue.Empty:
+                    self.status = "timeout"
+                    return None
+                if error is not None:
+                    self.errors[index] = error
+                else:
+                    self.stats[index] = stats
+                if status == "sat":
+                    self.status = "sat"
+                    return netlist
+                statuses.append(status)
+            if len(self.errors) == len(workers):
+                raise RuntimeError(f"all cube and conquer workers failed: {self.errors}")
+            # one open cube (out of budget or lost to an error) leaves the whole problem open
+            self.status = "unsat" if all(status == "unsat" for status in statuses) else next(status for status in statuses if status != "unsat")
+            return None
+        finally:
+            for w in workers:
+                if w.is_alive():
+                    w.terminate()
+            for w in workers:
+                w.join()
@@ -0,0 +1,129 @@
+import functools
+import pono
+import smt_switch as ss
+import smt_switch.primops as pops
+from smt_switch.sortkinds import BOOL, BV
+from src.nodes import Nodes
+from src.parallel import make_solver
+from src.spec import StepSpec
+
+ENGINES = {
+    "kind": "KInduction",
+    "ic3bits": "IC3Bits",
+    "mbic3": "ModelBasedIC3",
+    "bmc": "Bmc",
+}
+
+class EquivalenceProof:
+    #unbounded check that a decoded netlist matches a StepSpec spec, on a product transition system of circuit and spec
+    count = 0
+
+    def __init__(self, cs, engine = "kind", solver = None, max_steps = 100):
+        if engine not in ENGINES:
+            raise ValueError(f"unknown proof engine {engine}, expected one of {tuple(ENGINES)}")
+        if not hasattr(pono, ENGINES[engine]):
+            raise ValueError(f"pono was built without {ENGINES[engine]}")
+        if not isinstance(cs.spec_func, StepSpec):
+            raise TypeError(f"unbounded proofs need a StepSpec spec, got {type(cs.spec_func)}")
+        self.cs = cs
+        self.engine = engine
+        # pono copies the transition system into the prover solver, so the synthesis solver keeps its assertions
+        self.prover_solver = solver if solver is not None else make_solver()
+        self.max_steps = max_steps
+        self.status = None
+        self.trace_length = None
+        # cycles the netlists are synthesized for, raised past cs.num_cycles by longer failing traces
+        self.num_cycles = cs.num_cycles
+
+    def make_state(self, ts, name, init):
+        #state vars mirroring a (nested) tuple of terms, starting at those terms
+        if isinstance(init, tuple):
+            return tuple(self.make_state(ts, f"{name}[{k}]", x) for k,x in enumerate(init))
+        if not isinstance(init, ss.Term):
+            raise TypeError(f"spec state {name} should be a term or a tuple of terms, got {type(init)}")
+        var = ts.make_statevar(name, init.get_sort())
+        ts.constrain_init(ts.solver.make_term(pops.Equal, var, init))
+        return var
+
+    def assign_state(self, ts, var, next_):
+        if isinstance(var, tuple):
+            for v,n in zip(var, next_):
+                self.assign_state(ts, v, n)
+        else:
+            ts.assign_next(var, next_)
+
+    def build(self, netlist):
+        #product transition system, its circuit inputs and the output equivalence property
+        cs = self.cs
+        solver = cs.solver
+        enc = cs.enc
+        prefix = f"proof{type(self).count}_"
+        type(self).count += 1
+
+        ts = pono.RelationalTransitionSystem(solver)
+        nodes = Nodes(ts, cs.nodes.delay_width, prefix)
+        input_lvars, op_input_lvars, op_output_lvars, output_lvars = netlist
+        inputs = tuple(ts.make_inputvar(f"{prefix}input[{i}]", solver.make_sort(BV, N)) for i,N in enumerate(enc.types[0]))
+        lines = dict(zip(input_lvars, inputs))
+
+        # seq ops read their inputs through placeholders, which are tied to the driving lines once those exist
+        seq_ops, comb_ops = enc.schedule(netlist)
+        placeholders = {}
+        for i in seq_ops:
+            op = nodes.clone(enc.ops[i])
+            placeholders[i] = tuple(ts.make_inputvar(f"{prefix}op_input[{i}][{j}]", solver.make_sort(BV, N)) for j,N in enumerate(op.types[0]))
+            lines.update(zip(op_output_lvars[i], op.eval(*placeholders[i])))
+
+        for i in comb_ops:
+            op = enc.ops[i]
+            args = tuple(lines[lvar] for lvar in op_input_lvars[i])
+            if isinstance(op, enc.nodes.SpecNode):
+                if not op.can_step or any(op.is_moores):
+                    raise ValueError(f"{op} needs step_funcs and no moore outputs for an unbounded proof")
+                state = self.make_state(ts, f"{prefix}op_state[{i}]", op.init_state())
+                res, next_state = op.step(state, *args)
+                self.assign_state(ts, state, next_state)
+            else:
+                res = op.eval(*args)
+            lines.update(zip(op_output_lvars[i], res))
+
+        for i in seq_ops:
+            for placeholder,lvar in zip(placeholders[i], op_input_lvars[i]):
+                ts.constrain_trans(solver.make_term(pops.Equal, placeholder, lines[lvar]))
+
+        spec = cs.spec_func
+        spec_state = self.make_state(ts, f"{prefix}spec_state", spec.init)
+        spec_outputs, next_state = spec.step(spec_state, inputs)
+        self.assign_state(ts, spec_state, next_state)
+
+        equal = (solver.make_term(pops.Equal, lines[lvar], so) for lvar,so in zip(output_lvars, spec_outputs))
+        equal = functools.reduce(lambda a,b: solver.make_term(pops.And, a, b), equal, solver.make_term(1, solver.make_sort(BOOL)))
+        # properties may only read state vars and the outputs depend on the inputs, so the comparison is latched
+        # into a state var and a mismatch on some cycle shows up on the next one
+        prop = ts.make_statevar(f"{prefix}outputs_equal", solver.make_sort(BOOL))
+        ts.constrain_init(prop)
+        ts.assign_next(prop, equal)
+        return ts, inputs, prop
+
+    def check(self, netlist):
+        #None if the netlist is proved correct for all cycles (or the engine gives up, see status),
+        #otherwise the failing trace as A_vals over cs.input_vars, unrolled up to the cycle with the mismatch
+        ts, inputs, prop = self.build(netlist)
+        prover = getattr(pono, ENGINES[self.engine])(pono.Property(self.cs.solver, prop), ts, self.prover_solver)
+        res = str(prover.check_until(self.max_steps)).split(".")[-1].upper()
+        if res != "FALSE":
+            self.status = "proved" if res == "TRUE" else "unknown"
+            return None
+
+        self.status = "refuted"
+        # the last step of the witness only holds the latched mismatch of the step before
+        witness = prover.witness()[:-1]
+        self.trace_length = len(witness) - 1
+        self.num_cycles = max(self.num_cycles, self.trace_length)
+        self.cs.unroll(self.trace_length)
+        A_vals = {}
+        for n,vals in enumerate(witness):
+            for var,cegis_var in zip(inputs, self.cs.input_vars[n]):
+                if var in vals:
+                    A_vals[cegis_var] = vals[var]
+        return A_vals
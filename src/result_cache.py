@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import tempfile
+from src.terms import term_fingerprint
+
+# bump whenever the key or the stored netlist format changes
+VERSION = 2
+
+class ResultCache:
+    #on-disk cache of decoded netlists keyed by a canonical hash of the CircuitSynth problem
+    #entries are written with an atomic rename, so processes can share the directory, and evicted by last use
+    #a hit on a netlist is checked against the problem before use, a hit on an unsat entry can only be checked by solving
+    #the problem again, so it is trusted unless trust_unsat is False, which turns such hits into misses
+    def __init__(self, directory, max_entries = 1000, trust_unsat = True):
+        if max_entries < 1:
+            raise ValueError(f"ResultCache max_entries should be positive, got {max_entries}")
+        self.directory = directory
+        self.max_entries = max_entries
+        self.trust_unsat = trust_unsat
+        self.stats = {"hits": 0, "misses": 0}
+        os.makedirs(directory, exist_ok = True)
+
+    def key(self, cs):
+        #ops by their parameters, the type tuples, the delay width and timing parameters, and the spec by the terms it evaluates to,
+        #which only needs the spec evaluated up to num_cycles, the transition system stays unrolled up to the bound of cs (see deepening)
+        cs.unroll_spec(cs.num_cycles)
+        spec = term_fingerprint(*(o for outs in cs.spec_outputs for o in outs), *cs.P_spec_nodes)
+        problem = {
+            "version": VERSION,
+            "types": cs.enc.types,
+            "ops": [str(op) for op in cs.enc.ops],
+            "num_cycles": cs.num_cycles,
+            "delay_width": cs.nodes.delay_width,
+            "timing": cs.timing_params,
+            "spec": spec,
+        }
+        return hashlib.sha256(json.dumps(problem, sort_keys = True).encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        #the stored entry {"netlist": ...} or None on a miss, netlist is None for a problem known to have no solution
+        try:
+            with open(self.path(key)) as f:
+                entry = json.load(f)
+            os.utime(self.path(key))
+        except (OSError, ValueError):
+            # missing, evicted by another process in the meantime, or not a valid entry
+            self.stats["misses"] += 1
+            return None
+        netlist = entry["netlist"]
+        if netlist is None and not self.trust_unsat:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        if netlist is not None:
+            input_lvars, op_input_lvars, op_output_lvars, output_lvars = netlist
+            netlist = (tuple(input_lvars), tuple(map(tuple, op_input_lvars)), tuple(map(tuple, op_output_lvars)), tuple(output_lvars))
+        return {"netlist": netlist}
+
+    def put(self, key, netlist):
+        fd, tmp = tempfile.mkstemp(dir = self.directory, suffix = ".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"netlist": netlist}, f)
+            os.replace(tmp, self.path(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.evict()
+
+    def evict(self):
+        #drop the least recently used entries beyond max_entries
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                entries.append((os.stat(os.path.join(self.directory, name)).st_mtime, name))
+            except FileNotFoundError:
+                pass
+        entries.sort()
+        for _, name in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
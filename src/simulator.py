@@ -0,0 +1,111 @@
+import random
+from src.terms import term_to_int
+
+class Simulator:
+    #runs a decoded netlist on concrete values, python ints here, numpy arrays of many traces in src.batch_sim.BatchSimulator
+    def __init__(self, enc):
+        self.enc = enc
+        self.nodes = enc.nodes
+        self.ops = enc.ops
+        # moore outputs of SpecNodes can feed their own inputs, which needs a fixed point to evaluate
+        self.supported = all(op.can_sim for op in self.ops) and not any(
+            any(op.is_moores) for op in self.ops if isinstance(op, self.nodes.SpecNode))
+
+    def cast(self, vals, widths):
+        #values as stored on the lines, the ops' sim functions already keep python ints within their widths
+        return tuple(vals)
+
+    def init_state(self, op, inputs):
+        return op.sim_init()
+
+    def run(self, netlist, inputs):
+        #concrete outputs of a decoded netlist for one input trace (a sequence of input tuples per cycle)
+        assert self.supported
+        input_lvars, op_input_lvars, op_output_lvars, output_lvars = netlist
+        seq_ops, comb_ops = self.enc.schedule(netlist)
+
+        states = {i:self.init_state(self.ops[i], inputs) for i in seq_ops}
+        history = {i:[] for i in comb_ops if isinstance(self.ops[i], self.nodes.SpecNode)}
+        outputs = []
+        for inputs_at_cycle in inputs:
+            lines = dict(zip(input_lvars, self.cast(inputs_at_cycle, self.enc.types[0])))
+            for i in seq_ops:
+                lines.update(zip(op_output_lvars[i], self.cast(self.ops[i].sim(states[i]), self.ops[i].types[1])))
+            for i in comb_ops:
+                args = tuple(lines[lvar] for lvar in op_input_lvars[i])
+                if i in history:
+                    history[i].append(args)
+                    res = self.ops[i].sim(*history[i])
+                else:
+                    res = self.ops[i].sim(*args)
+                lines.update(zip(op_output_lvars[i], self.cast(res, self.ops[i].types[1])))
+            for i in seq_ops:
+                states[i] = self.cast((self.ops[i].sim_next(states[i], *(lines[lvar] for lvar in op_input_lvars[i])),), self.ops[i].types[1][:1])[0]
+            outputs.append(tuple(lines[lvar] for lvar in output_lvars))
+        return outputs
+
+
+class SimFilter:
+    #pool of concrete input traces that candidates are simulated on before calling the verifier:
+    #random traces checked against sim_spec, a src.spec.StepSpec whose step works on numpy arrays (see BatchSimulator.expected),
+    #and the trace of every counterexample the verifier found, without sim_spec there are only the latter
+    def __init__(self, solver, enc, input_vars, spec_outputs, sim_spec = None, num_random = 32, seed = 0):
+        self.solver = solver
+        self.enc = enc
+        self.sim = Simulator(enc)
+        self.input_vars = input_vars
+        self.spec_outputs = spec_outputs
+        self.A_vars = tuple(var for vars_ in input_vars for var in vars_)
+        # terms whose model values make up a trace, collected from the verifier on every counterexample
+        self.terms = self.A_vars + tuple(o for outs in spec_outputs for o in outs)
+        self.traces = []
+
+        # the random traces are simulated all at once, one array entry per trace
+        self.batch = None
+        if sim_spec is not None and num_random > 0:
+            # imported here, src.batch_sim builds on Simulator
+            from src.batch_sim import BatchSimulator
+            batch = BatchSimulator(enc)
+            if batch.supported:
+                self.batch = batch
+                self.random_inputs = batch.random_inputs(num_random, len(input_vars), seed)
+                self.random_outputs = batch.expected(sim_spec, self.random_inputs)
+
+    def make_trace(self, vals, expected):
+        inputs = tuple(tuple(term_to_int(vals[var]) for var in vars_) for vars_ in self.input_vars)
+        outputs = tuple(tuple(term_to_int(o) for o in outs) for outs in expected)
+        return inputs, outputs
+
+    def add(self, vals):
+        expected = tuple(tuple(vals[o] for o in outs) for outs in self.spec_outputs)
+        self.traces.insert(0, self.make_trace(vals, expected))
+
+    def check_random(self, netlist, k):
+        #up to k (inputs, first wrong cycle) of random traces the netlist gets wrong
+        outputs = self.batch.run(netlist, self.random_inputs)
+        differ = [self.batch.mismatches((outs,), (exps,)) for outs,exps in zip(outputs, self.random_outputs)]
+        res = []
+        for n in self.batch.failing(differ)[:k]:
+            inputs = tuple(tuple(int(x[n]) for x in inputs_at_cycle) for inputs_at_cycle in self.random_inputs)
+            res.append((inputs, next(cycle for cycle,d in enumerate(differ) if d[n])))
+        return res
+
+    def check(self, E_vals, k = 1, truncate = False):
+        #returns A_vals for up to k traces the candidate gets wrong, none if it passes all of them
+        #truncate leaves out the inputs after the first wrong cycle of each trace
+        netlist = self.enc.decode(E_vals)
+        failing = []
+        passing = []
+        for trace in self.traces:
+            outputs = tuple(self.sim.run(netlist, trace[0])) if len(failing) < k else trace[1]
+            if outputs != trace[1]:
+                failing.append((trace, next(n for n,(o,e) in enumerate(zip(outputs, trace[1])) if o != e)))
+            else:
+                passing.append(trace)
+        # recently failing traces are tried first
+        self.traces = [trace for trace,_ in failing] + passing
+        failing = [(inputs, cycle) for (inputs,_),cycle in failing]
+        if len(failing) < k and self.batch is not None:
+            failing.extend(self.check_random(netlist, k - len(failing)))
+        return [{var:self.solver.make_term(val, var.get_sort()) for vars_,vals in zip(self.input_vars[:cycle + 1 if truncate else len(inputs)], inputs) for var,val in zip(vars_, vals)}
+                for inputs,cycle in failing[:k]]
@@ -0,0 +1,45 @@
+import collections
+import functools
+
+class StepSpec:
+    #spec that produces one cycle of outputs at a time from explicit state, so unrolling n cycles builds n steps
+    #step(state, inputs) returns (outputs, next_state) for the input tuple of one cycle, init is the state before cycle 0
+    def __init__(self, step, init = None):
+        self.step = step
+        self.init = init
+
+    def __call__(self, inputs):
+        #prefix API: the outputs at the last of the given cycles, by replaying all of them
+        if len(inputs) == 0:
+            raise ValueError("StepSpec needs the inputs of at least one cycle, the outputs are only defined per cycle")
+        state = self.init
+        for inputs_at_cycle in inputs:
+            outputs, state = self.step(state, inputs_at_cycle)
+        return outputs
+
+
+def memoize_prefix(spec_func = None, maxsize = None):
+    #prefix spec (a function of the inputs of every cycle so far) that evaluates each prefix only once,
+    #recursive specs have to call the wrapped function for their own prefixes to benefit
+    #the memo keeps the input and output terms of every prefix alive, up to maxsize prefixes (the least recently used are dropped)
+    #or for the lifetime of the wrapper if maxsize is None, wrapper.memo.clear() releases them
+    #usable as @memoize_prefix or @memoize_prefix(maxsize = n), a recursive spec needs maxsize above its recursion width
+    if spec_func is None:
+        return lambda func: memoize_prefix(func, maxsize)
+    if maxsize is not None and maxsize < 1:
+        raise ValueError(f"memoize_prefix maxsize should be positive or None, got {maxsize}")
+    memo = collections.OrderedDict()
+
+    @functools.wraps(spec_func)
+    def wrapper(inputs):
+        inputs = tuple(inputs)
+        if inputs in memo:
+            memo.move_to_end(inputs)
+            return memo[inputs]
+        res = memo[inputs] = spec_func(inputs)
+        if maxsize is not None and len(memo) > maxsize:
+            memo.popitem(last = False)
+        return res
+
+    wrapper.memo = memo
+    return wrapper
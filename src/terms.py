@@ -0,0 +1,83 @@
+import hashlib
+
+def term_to_int(term):
+    #convert a value term returned by the solver into a python int
+    s = str(term)
+    if s == "true":
+        return 1
+    if s == "false":
+        return 0
+    if s.startswith("#b"):
+        return int(s[2:], 2)
+    if s.startswith("#x"):
+        return int(s[2:], 16)
+    if s.startswith("(_ bv"):
+        return int(s[5:].split()[0])
+    raise ValueError(f"expected a value term, got {s}")
+
+
+class TermCache:
+    #memo table for built terms, with hit and miss counts per kind of term
+    def __init__(self):
+        self.terms = {}
+        self.stats = {}
+
+    def get(self, key, build):
+        stats = self.stats.setdefault(key[0], {"hits": 0, "misses": 0})
+        if key in self.terms:
+            stats["hits"] += 1
+            return self.terms[key]
+        stats["misses"] += 1
+        res = self.terms[key] = build()
+        return res
+
+    def memoize(self, kind, func):
+        return lambda *args: self.get((kind,) + args, lambda: func(*args))
+
+    def hit_rate(self, kind):
+        stats = self.stats.get(kind, {"hits": 0, "misses": 0})
+        total = stats["hits"] + stats["misses"]
+        return stats["hits"] / total if total > 0 else 0.0
+
+
+def term_size(*terms, seen = None):
+    #number of distinct nodes in the DAG of terms, not counting (and then adding) the nodes already in seen
+    seen = set() if seen is None else seen
+    before = len(seen)
+    todo = list(terms)
+    while len(todo) > 0:
+        t = todo.pop()
+        if t in seen:
+            continue
+        seen.add(t)
+        todo.extend(t)
+    return len(seen) - before
+
+
+def term_fingerprint(*terms):
+    #structural sha256 of the term DAGs, the same for equal terms built by different processes or solvers
+    digests = {}
+    todo = list(terms)
+    while len(todo) > 0:
+        t = todo[-1]
+        if t in digests:
+            todo.pop()
+            continue
+        children = tuple(t)
+        missing = [c for c in children if c not in digests]
+        if len(missing) > 0:
+            todo.extend(missing)
+            continue
+        todo.pop()
+        h = hashlib.sha256()
+        # leaves are symbols and values, which print as their name or literal
+        h.update((str(t.get_op()) if len(children) > 0 else str(t)).encode())
+        h.update(str(t.get_sort()).encode())
+        for c in children:
+            h.update(digests[c])
+        digests[t] = h.digest()
+
+    h = hashlib.sha256()
+    for t in terms:
+        h.update(digests[t])
+    return h.hexdigest()
@@ -0,0 +1,126 @@
+import smt_switch.primops as pops
+
+class StaticTiming:
+    #concrete timing of decoded netlists, so only the paths a candidate actually violates are added to the solver
+    def __init__(self, enc, input_delays, cycle_delay, max_output_delays):
+        self.enc = enc
+        self.nodes = enc.nodes
+        self.ops = enc.ops
+        self.input_delays = tuple(input_delays)
+        self.cycle_delay = cycle_delay
+        self.max_output_delays = tuple(max_output_delays)
+        # moore outputs of SpecNodes are only defined by the constraints on their own inputs
+        self.supported = all(op.can_sta for op in self.ops) and not any(
+            any(op.is_moores) for op in self.ops if isinstance(op, self.nodes.SpecNode))
+
+    def analyze(self, netlist):
+        #arrival time of every line, and the (op, output) driving each line that is not a circuit input
+        assert self.supported
+        input_lvars, op_input_lvars, op_output_lvars, output_lvars = netlist
+        arrival = dict(zip(input_lvars, self.input_delays))
+        driver = {}
+        seq_ops, comb_ops = self.enc.schedule(netlist)
+
+        for i in seq_ops:
+            for j,(line,delay) in enumerate(zip(op_output_lvars[i], self.ops[i].sta_launch())):
+                arrival[line] = delay
+                driver[line] = (i, j)
+        for i in comb_ops:
+            delays = tuple(arrival[line] for line in op_input_lvars[i])
+            if isinstance(self.ops[i], self.nodes.SpecNode):
+                delays = self.ops[i].sta(*delays)[2]
+            else:
+                delays = self.ops[i].sta(*delays)
+            for j,(line,delay) in enumerate(zip(op_output_lvars[i], delays)):
+                arrival[line] = delay
+                driver[line] = (i, j)
+        return arrival, driver
+
+    def violations(self, netlist, arrival):
+        #(kind, sinks) of every violated check, sinks are the (lvar, line) pairs the check reads
+        input_lvars, op_input_lvars, op_output_lvars, output_lvars = netlist
+        res = []
+        for i,op in enumerate(self.ops):
+            if isinstance(op, self.nodes.CombNode):
+                continue
+            delays = tuple(arrival[line] for line in op_input_lvars[i])
+            if isinstance(op, self.nodes.SeqNode):
+                setup, hold = op.sta_capture(*delays)
+            else:
+                setup, hold, _ = op.sta(*delays)
+            sinks = tuple(zip(self.enc.op_input_lvars[i], op_input_lvars[i]))
+            if any(d > self.cycle_delay for d in setup):
+                res.append(("setup", sinks))
+            if any(d < 0 for d in hold):
+                res.append(("hold", sinks))
+        for lvar,line,max_delay in zip(self.enc.output_lvars, output_lvars, self.max_output_delays):
+            if arrival[line] > max_delay:
+                res.append(("output", ((lvar, line),)))
+        return res
+
+    def cone(self, netlist, arrival, driver, sinks, critical):
+        #(sink lvar, source lvar) connections a check depends on, only the latest arriving input of each op is followed if critical
+        #delays are monotone in the input delays, so any program with the critical paths of a too late arrival is as late,
+        #while a too early arrival needs the whole fan-in cone to be reproduced
+        op_input_lvars = netlist[1]
+        hops = {}
+        todo = list(sinks)
+        while len(todo) > 0:
+            lvar, line = todo.pop()
+            if line not in driver:
+                hops[(lvar, self.enc.input_lvars[line])] = None
+                continue
+            i, j = driver[line]
+            hops[(lvar, self.enc.op_output_lvars[i][j])] = None
+            if isinstance(self.ops[i], self.nodes.SeqNode):
+                continue
+            inputs = tuple(zip(self.enc.op_input_lvars[i], op_input_lvars[i]))
+            if critical:
+                inputs = (max(inputs, key = lambda x: arrival[x[1]]),)
+            todo.extend(inputs)
+        return tuple(hops)
+
+    def lemmas(self, E_vals):
+        #one blocking constraint per violated check of the candidate, none if it meets timing
+        solver = self.enc.solver
+        lvars = self.enc.lvars
+        netlist = self.enc.decode(E_vals)
+        arrival, driver = self.analyze(netlist)
+        res = []
+        for kind, sinks in self.violations(netlist, arrival):
+            hops = self.cone(netlist, arrival, driver, sinks, kind != "hold")
+            path = lvars.conj(lvars.equal(sink, src) for sink,src in hops)
+            res.append(solver.make_term(pops.Not, path))
+        return res
+
+    def critical(self, netlist, arrival):
+        #(largest setup time, sinks of its check) and (latest output arrival, its sink), 0 without sinks if there is none
+        setup = (0, ())
+        for i,op in enumerate(self.ops):
+            if isinstance(op, self.nodes.CombNode):
+                continue
+            delays = tuple(arrival[line] for line in netlist[1][i])
+            setups = op.sta_capture(*delays)[0] if isinstance(op, self.nodes.SeqNode) else op.sta(*delays)[0]
+            if max(setups, default = 0) > setup[0]:
+                setup = (max(setups), tuple(zip(self.enc.op_input_lvars[i], netlist[1][i])))
+        outputs = ((arrival[line], ((lvar, line),)) for lvar,line in zip(self.enc.output_lvars, netlist[3]))
+        return setup, max(outputs, key = lambda x: x[0], default = (0, ()))
+
+    def worst(self, netlist):
+        #largest setup time and largest output arrival of a netlist, the smallest cycle and output delay it meets
+        arrival, _ = self.analyze(netlist)
+        (cycle, _), (output, _) = self.critical(netlist, arrival)
+        return cycle, output
+
+    def cost_lemmas(self, E_vals, weights, limit):
+        #one blocking constraint if weights[0] * output delay + weights[1] * cycle delay of the candidate is above limit, none otherwise,
+        #it blocks the critical paths of both delays together, since every program containing them is at least as late on both
+        netlist = self.enc.decode(E_vals)
+        arrival, driver = self.analyze(netlist)
+        (cycle, cycle_sinks), (output, output_sinks) = self.critical(netlist, arrival)
+        if weights[0] * output + weights[1] * cycle <= limit:
+            return []
+        sinks = (output_sinks if weights[0] != 0 else ()) + (cycle_sinks if weights[1] != 0 else ())
+        hops = self.cone(netlist, arrival, driver, sinks, True)
+        lvars = self.enc.lvars
+        return [self.enc.solver.make_term(pops.Not, lvars.conj(lvars.equal(sink, src) for sink,src in hops))]
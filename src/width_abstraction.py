@@ -0,0 +1,98 @@
+import dataclasses
+import pono
+from src.nodes import Nodes
+from src.parallel import make_solver
+
+class WidthAbstraction:
+    #synthesizes the connections of a CircuitSynth problem on copies with narrower datapaths, and only verifies them at full width
+    #the lvar assignment of a netlist does not depend on widths, so a narrow solution is checked as is, a wrong one is
+    #blocked in the narrow copy and its full width counterexamples refine the full problem, which is the last resort
+    def __init__(self, cs, make_spec, widths = (2, 4), max_rounds = 8, solver_config = None):
+        # make_spec(solver, scale) builds the spec of a narrow copy, scale maps a full width to its narrow width
+        self.cs = cs
+        self.make_spec = make_spec
+        self.widths = tuple(sorted(widths))
+        self.max_rounds = max_rounds
+        self.solver_config = solver_config if solver_config is not None else {}
+        self.full_widths = sorted(set(cs.enc.types[0] + cs.enc.types[1] + tuple(t for op in cs.enc.ops for tps in op.types for t in tps)))
+        # width at which the netlist of the last run was found, None if the full problem had to be solved
+        self.width = None
+        self.stats = []
+
+    def scale(self, width):
+        #increasing map from the full widths to widths of at most width, so distinct types stay distinct,
+        #as wide as possible, None if there are more full widths than that leaves room for
+        res = {}
+        prev = width + 1
+        for w in reversed(self.full_widths):
+            res[w] = min(w, prev - 1)
+            prev = res[w]
+        if prev < 1:
+            return None
+        return lambda w: res.get(w, w)
+
+    def narrow(self, scale):
+        #copy of the problem on a fresh solver with every op "N" and the circuit types scaled down
+        cs = self.cs
+        solver = make_solver(self.solver_config.get("backend", "btor"), self.solver_config.get("options"))
+        nodes = Nodes(pono.FunctionalTransitionSystem(solver), cs.nodes.delay_width)
+        ops = []
+        for op in cs.enc.ops:
+            overrides = {}
+            if "N" in op.pargs:
+                overrides["N"] = scale(op.pargs["N"])
+                if isinstance(op.pargs.get("init"), int):
+                    overrides["init"] = op.pargs["init"] & ((1 << overrides["N"]) - 1)
+            ops.append(nodes.clone(op, **overrides))
+        types = (tuple(map(scale, cs.enc.types[0])), tuple(map(scale, cs.enc.types[1])))
+        enforce_timing, input_delays, cycle_delay, max_output_delays = cs.timing_params
+        # the ops are already the ones kept by presolve, the verify solver belongs to the full width problem,
+        # and the concrete spec of the prefilter is only known at full width
+        return type(cs)(nodes, types, tuple(ops), self.make_spec(solver, scale), cs.num_cycles, enforce_timing, input_delays, cycle_delay, max_output_delays,
+                        dataclasses.replace(cs.encoding_options, presolve = False, prune = False), dataclasses.replace(cs.cegis_options, verify_solver = None, sim_spec = None))
+
+    def run(self):
+        #netlist correct at full width, or None if the full problem has no solution or runs out of budget
+        cs = self.cs
+        self.width = None
+        self.stats = []
+        refuted = []
+        for width in self.widths:
+            if width >= self.full_widths[-1]:
+                break
+            scale = self.scale(width)
+            if scale is None:
+                continue
+            small = self.narrow(scale)
+            # wrong circuits stay wrong at any width
+            for netlist in refuted:
+                for lemma in small.enc.blocking_lemmas(netlist):
+                    small.cegis.add_lemma(lemma)
+            stats = {"width": width, "rounds": 0, "counterexamples": 0}
+            self.stats.append(stats)
+            for _ in range(self.max_rounds):
+                res = small.synthesize()
+                if res is None:
+                    # an empty narrow program space says nothing about the full width
+                    break
+                stats["rounds"] += 1
+                netlist = small.enc.decode(res)
+                cexs = cs.counterexamples_of(netlist)
+                if cexs is not None and len(cexs) == 0:
+                    self.width = width
+                    return netlist
+                for lemma in small.enc.blocking_lemmas(netlist):
+                    small.cegis.add_lemma(lemma)
+                if cexs is None:
+                    # not a program at full width, e.g. too slow, which the full problem rules out by itself
+                    continue
+                refuted.append(netlist)
+                for A_vals in cexs:
+                    cs.cegis.add_counterexample(A_vals)
+                stats["counterexamples"] += len(cexs)
+
+        for netlist in refuted:
+            for lemma in cs.enc.blocking_lemmas(netlist):
+                cs.cegis.add_lemma(lemma)
+        res = cs.synthesize()
+        return None if res is None else cs.enc.decode(res)
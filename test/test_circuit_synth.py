@@ -0,0 +1,338 @@
+import pytest
+from bench.workloads import adder_library, make_btor_solver, pipelined_adder, pipelined_adder_library, pipelined_adder_narrow_spec
+from src.counterexamples import CounterexamplePool
+from src.feasibility import InfeasibleError
+from src.result_cache import ResultCache
+from src.terms import term_to_int
+
+# pipelined_adder(num_inputs = 2, depth = 2): ops are the adder, then the two registers on the hardcoded lines 2 and 3,
+# the adder output is line 4
+def adder_netlist(first_register_input):
+    return ((0, 1), ((0, 1), (first_register_input,), (2,)), ((4,), (2,), (3,)), (3,))
+
+# output = in1 two cycles ago instead of in0 + in1, correct on cycles 0 and 1 where both registers still hold their init
+wrong_after_two_cycles = adder_netlist(1)
+correct = adder_netlist(4)
+# the same with the registers in the other order
+correct_swapped = ((0, 1), ((0, 1), (3,), (4,)), ((4,), (2,), (3,)), (2,))
+
+def test_extend_replaces_verifier():
+    s = make_btor_solver()
+    cs = pipelined_adder(s, num_cycles = 2, depth = 2, num_inputs = 2, timing = False, deepening = True, initial_cycles = 1, verify_solver = make_btor_solver())
+    assert cs.bound == 1
+    E_vals = cs.enc.encode(wrong_after_two_cycles)
+    assert cs.cegis.find_counterexamples(E_vals) == []
+
+    cs.extend(2)
+    assert len(cs.cegis.find_counterexamples(E_vals)) > 0
+    assert cs.cegis.find_counterexamples(cs.enc.encode(correct)) == []
+
+def test_deepening_with_verify_solver():
+    s = make_btor_solver()
+    cs = pipelined_adder(s, num_cycles = 4, depth = 2, num_inputs = 2, timing = False, deepening = True, initial_cycles = 1, verify_solver = make_btor_solver())
+    netlist = cs.run()
+    assert netlist is not None
+
+    check = pipelined_adder(make_btor_solver(), num_cycles = 4, depth = 2, num_inputs = 2, timing = False)
+    assert check.check_netlist(netlist)
+
+def answer(make):
+    #"sat", "unsat" or the budget that ran out, with problems presolve proves infeasible counted as unsat
+    try:
+        cs = make()
+    except InfeasibleError:
+        return "unsat"
+    return "sat" if cs.run() is not None else cs.cegis.stats["status"]
+
+# timing of the register libraries, the inputs arrive at 2 and a cycle is 4 long
+register_timing = {"enforce_timing": True, "input_delays": (2, 2), "cycle_delay": 4, "max_output_delays": (10,)}
+
+def register_library(setup, output_delay):
+    return (("Add", {"N": 4, "delay": 1}), ("Register", {"N": 4, "init": 0, "setup": setup, "hold": 0, "output_delay": output_delay}))
+
+@pytest.mark.parametrize(
+    "library,expected",
+    [(register_library(1, 1), "sat"),
+     # an unused comparator does not change the answer
+     (register_library(1, 1) + (("Equal", {"N": 4, "delay": 1}),), "sat"),
+     # with its setup, every register input is captured at 5 or later, after the end of the cycle
+     (register_library(3, 2), "unsat")])
+def test_presolve_same_answer(library, expected):
+    for presolve in (False, True):
+        make = lambda: pipelined_adder_library(make_btor_solver(), library, num_cycles = 3, depth = 1, num_inputs = 2, presolve = presolve, **register_timing)
+        assert answer(make) == expected
+
+def test_prune_drops_every_op():
+    # the only op is 8 bits wide on a 4 bit problem, so nothing drives it
+    with pytest.raises(InfeasibleError) as e:
+        pipelined_adder_library(make_btor_solver(), (("Add", {"N": 8, "delay": 1}),), num_cycles = 2, depth = 1, num_inputs = 2, prune = True)
+    assert "prune" in e.value.reason
+
+@pytest.mark.parametrize(
+    "make,expected",
+    [(lambda **kwargs: pipelined_adder(make_btor_solver(), num_cycles = 3, depth = 1, num_inputs = 3, timing = True, **kwargs), "sat"),
+     (lambda **kwargs: pipelined_adder_library(make_btor_solver(), register_library(1, 1), num_cycles = 3, depth = 1, num_inputs = 2, **register_timing, **kwargs), "sat"),
+     (lambda **kwargs: pipelined_adder_library(make_btor_solver(), register_library(3, 2), num_cycles = 3, depth = 1, num_inputs = 2, **register_timing, **kwargs), "unsat")])
+def test_lazy_timing_same_answer(make, expected):
+    for lazy_timing in (False, True):
+        cs = make(lazy_timing = lazy_timing)
+        assert (cs.timing is not None) == lazy_timing
+        netlist = cs.run()
+        assert ("sat" if netlist is not None else cs.cegis.stats["status"]) == expected
+        if netlist is not None:
+            # the lazily timed netlist meets the eager timing constraints
+            assert make().check_netlist(netlist)
+
+def duplicate_library(num_registers):
+    return (("Add", {"N": 2, "delay": 1}),) * 2 + (("Register", {"N": 2, "init": 0, "setup": 1, "hold": 0, "output_delay": 1}),) * num_registers
+
+@pytest.mark.parametrize(
+    "symmetry_breaking,depth,expected",
+    [(False, 2, "sat"), (True, 2, "sat"),
+     # two 2 bit registers can not hold the three sums the outputs of cycles 3, 4 and 5 depend on
+     (False, 3, "unsat"), (True, 3, "unsat")])
+def test_symmetry_breaking_same_answer(symmetry_breaking, depth, expected):
+    make = lambda: pipelined_adder_library(make_btor_solver(), duplicate_library(2), num_cycles = depth + 3, depth = depth, width = 2, num_inputs = 3, symmetry_breaking = symmetry_breaking, incremental = True)
+    assert answer(make) == expected
+
+@pytest.mark.parametrize("lvar_encoding", ["binary", "onehot", "unary"])
+def test_lvar_encodings(lvar_encoding):
+    cs = pipelined_adder(make_btor_solver(), num_cycles = 3, depth = 1, num_inputs = 3, timing = True, lvar_encoding = lvar_encoding)
+    netlist = cs.run()
+    assert netlist is not None
+    assert cs.enc.decode(cs.enc.encode(netlist)) == netlist
+    # the netlist means the same under the default encoding
+    check = pipelined_adder(make_btor_solver(), num_cycles = 3, depth = 1, num_inputs = 3, timing = True)
+    assert check.check_netlist(netlist)
+
+@pytest.mark.parametrize("lvar_encoding", ["binary", "onehot", "unary"])
+def test_lvar_encodings_unsat(lvar_encoding):
+    # one register can not delay the sum by two cycles
+    make = lambda: pipelined_adder_library(make_btor_solver(), duplicate_library(1), num_cycles = 4, depth = 2, width = 2, num_inputs = 2, lvar_encoding = lvar_encoding)
+    assert answer(make) == "unsat"
+
+def cycles(term):
+    #cycles of the unrolled symbols in term, named like input_var[0]@2 or, once instantiated, input_var[0]@2@0_1
+    res = set()
+    todo = [term]
+    seen = set()
+    while len(todo) > 0:
+        t = todo.pop()
+        if t in seen:
+            continue
+        seen.add(t)
+        if t.is_symbolic_const() and "@" in str(t):
+            res.add(int(str(t).split("@")[1]))
+        todo.extend(t)
+    return res
+
+def test_truncated_instance():
+    cs = pipelined_adder(make_btor_solver(), num_cycles = 3, depth = 2, num_inputs = 2, timing = False, truncate_counterexamples = True)
+    # the wrong netlist first fails on cycle 2, for any input with a nonzero input 0 on cycle 0
+    cexs = cs.cegis.find_counterexamples(cs.enc.encode(wrong_after_two_cycles))
+    assert len(cexs) == 1
+    assert {int(str(var).split("@")[1]) for var in cexs[0]} == {0, 1, 2}
+    assert cycles(cs.cegis.instantiate(cexs[0])) == {0, 1, 2}
+
+    # without prefixes the same counterexample instantiates every cycle, with fresh inputs after cycle 2
+    cs.cegis.prefixes = None
+    assert cycles(cs.cegis.instantiate(cexs[0])) == {0, 1, 2, 3}
+
+def test_refutes_on_prefix():
+    cs = pipelined_adder(make_btor_solver(), num_cycles = 3, depth = 2, num_inputs = 2, timing = False, truncate_counterexamples = True)
+    wrong = cs.enc.encode(wrong_after_two_cycles)
+    cs.cegis.add_counterexample(cs.cegis.find_counterexamples(wrong)[0])
+    assert cs.cegis.refutes(wrong, 0)
+    assert not cs.cegis.refutes(cs.enc.encode(correct), 0)
+
+@pytest.mark.parametrize("incremental", [False, True])
+@pytest.mark.parametrize("max_instances", [1, 2])
+def test_bounded_pool_same_answer(incremental, max_instances):
+    make = lambda **kwargs: pipelined_adder(make_btor_solver(), num_cycles = 3, depth = 1, num_inputs = 3, timing = False, incremental = incremental, **kwargs)
+    unbounded = make().run()
+    cs = make(max_instances = max_instances)
+    netlist = cs.run()
+    assert unbounded is not None and netlist is not None
+    assert make().check_netlist(netlist)
+    assert len(cs.cegis.active) <= max_instances
+
+    make = lambda **kwargs: pipelined_adder_library(make_btor_solver(), duplicate_library(1), num_cycles = 4, depth = 2, width = 2, num_inputs = 2, incremental = incremental, **kwargs)
+    assert answer(lambda: make(max_instances = max_instances)) == answer(make) == "unsat"
+
+@pytest.mark.parametrize("verify_solver", [False, True])
+def test_incremental_same_answer(verify_solver):
+    sat = lambda incremental: pipelined_adder(make_btor_solver(), num_cycles = 3, depth = 1, num_inputs = 3, timing = True, incremental = incremental,
+                                              verify_solver = make_btor_solver() if verify_solver else None)
+    unsat = lambda incremental: pipelined_adder_library(make_btor_solver(), duplicate_library(1), num_cycles = 4, depth = 2, width = 2, num_inputs = 2, incremental = incremental,
+                                                        verify_solver = make_btor_solver() if verify_solver else None)
+    for incremental in (False, True):
+        cs = sat(incremental)
+        netlist = cs.run()
+        assert netlist is not None
+        assert sat(False).check_netlist(netlist)
+        assert answer(lambda: unsat(incremental)) == "unsat"
+
+def test_result_cache(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    sat = lambda cache, **kwargs: pipelined_adder(make_btor_solver(), num_cycles = 3, depth = 1, num_inputs = 3, timing = False, cache = cache, **kwargs)
+    unsat = lambda cache: pipelined_adder_library(make_btor_solver(), duplicate_library(1), num_cycles = 4, depth = 2, width = 2, num_inputs = 2, cache = cache)
+
+    netlist = sat(cache).run()
+    assert netlist is not None
+    assert cache.stats == {"hits": 0, "misses": 1}
+    # a hit is checked and returned without a synthesize step
+    cs = sat(cache)
+    assert cs.run() == netlist
+    assert cs.cegis.stats["iterations"] == 0
+    assert cache.stats == {"hits": 1, "misses": 1}
+    # a different bound is a different problem
+    assert sat(cache, num_cycles = 4).run() is not None
+    assert cache.stats == {"hits": 1, "misses": 2}
+
+    assert unsat(cache).run() is None
+    cs = unsat(cache)
+    assert cs.run() is None
+    assert cs.cegis.stats == {**cs.cegis.empty_stats(), "status": "unsat"}
+    assert cache.stats == {"hits": 2, "misses": 3}
+    # without trusting unsat entries, the problem is solved again
+    cs = unsat(ResultCache(str(tmp_path), trust_unsat = False))
+    assert cs.run() is None
+    assert cs.cegis.stats["status"] == "unsat" and cs.cegis.stats["iterations"] > 0
+
+def test_result_cache_key_keeps_deepening(tmp_path):
+    cs = pipelined_adder(make_btor_solver(), num_cycles = 4, depth = 1, num_inputs = 3, timing = False, deepening = True, initial_cycles = 1)
+    key = ResultCache(str(tmp_path)).key(cs)
+    # the spec is evaluated on every cycle, the transition system is only unrolled up to the bound
+    assert len(cs.spec_outputs) == 5
+    assert len(cs.P_state) == 2
+    assert key == ResultCache(str(tmp_path)).key(pipelined_adder(make_btor_solver(), num_cycles = 4, depth = 1, num_inputs = 3, timing = False))
+
+def test_rank():
+    cs = pipelined_adder(make_btor_solver(), num_cycles = 3, depth = 1, num_inputs = 3, timing = True)
+    assert cs.run() is not None
+    assert 0 < len(cs.cegis.candidates) <= 16
+    # every counterexample refutes at least the candidate it was found for
+    scores = [score for _,score in CounterexamplePool.from_cegis(cs.cegis, rank = True).entries]
+    assert len(scores) == len(cs.cegis.counterexamples)
+    assert all(1 <= score <= len(cs.cegis.candidates) for score in scores)
+    assert all(score <= 1 for _,score in CounterexamplePool.from_cegis(cs.cegis, rank = True, max_candidates = 1).entries)
+
+def test_warm_start():
+    make = lambda: pipelined_adder(make_btor_solver(), num_cycles = 3, depth = 1, num_inputs = 3, timing = True)
+    cold = make()
+    netlist = cold.run()
+    assert netlist is not None
+    pool = CounterexamplePool.from_cegis(cold.cegis, rank = True)
+
+    warm = make()
+    assert pool.seed(warm.cegis) == len(pool) == len(cold.cegis.counterexamples)
+    assert warm.run() is not None
+    assert warm.cegis.stats["iterations"] <= cold.cegis.stats["iterations"]
+    assert warm.check_netlist(netlist)
+
+    # a related problem without timing has the same answer when warm started from the timed one
+    related = lambda: pipelined_adder(make_btor_solver(), num_cycles = 3, depth = 1, num_inputs = 3, timing = False)
+    cs = related()
+    pool.seed(cs.cegis)
+    assert cs.run() is not None
+    assert related().run() is not None
+
+def test_verify_solver_round_trip():
+    cs = pipelined_adder(make_btor_solver(), num_cycles = 3, depth = 2, num_inputs = 2, timing = False, verify_solver = make_btor_solver())
+    wrong = cs.enc.encode(wrong_after_two_cycles)
+    cexs = cs.cegis.find_counterexamples(wrong)
+    assert len(cexs) == 1
+    # the counterexample is made of vars and values of the synth solver, so it instantiates there
+    assert set(cexs[0]) == set(cs.cegis.A_vars)
+    cs.cegis.add_counterexample(cexs[0])
+    assert cs.cegis.refutes(wrong, 0)
+    assert cs.cegis.find_counterexamples(cs.enc.encode(correct)) == []
+
+def test_diverse_counterexamples():
+    cs = pipelined_adder(make_btor_solver(), num_cycles = 3, depth = 2, num_inputs = 2, timing = False, num_counterexamples = 4)
+    # the wrong netlist can fail on cycle 2, on cycle 3 or on both, each counterexample of a round fails differently
+    res = cs.cegis.check(cs.enc.encode(wrong_after_two_cycles), (), 4)
+    patterns = [tuple(term_to_int(vals[eq]) for eq in cs.cegis.distinguish) for vals in res]
+    assert len(patterns) == 3
+    assert len(set(patterns)) == 3
+
+def sweep(make, objective):
+    #smallest delay limit of the objective a circuit is found for, trying every limit in turn
+    for d in range(16):
+        limit = {"max_output_delays": (d,)} if objective == "output" else {"cycle_delay": d}
+        if make(**limit).run() is not None:
+            return d
+    return None
+
+@pytest.mark.parametrize("objective", ["output", "cycle"])
+@pytest.mark.parametrize("lazy_timing", [False, True])
+def test_optimize_matches_sweep(objective, lazy_timing):
+    make = lambda **kwargs: pipelined_adder(make_btor_solver(), num_cycles = 3, depth = 1, num_inputs = 3, incremental = True, lazy_timing = lazy_timing, **kwargs)
+    cs = make()
+    netlist, cost, infeasible = cs.optimize(objective)
+    # optimize keeps lazy timing rather than falling back to the symbolic delay terms
+    assert (cs.timing is not None) == lazy_timing
+    assert netlist is not None
+    assert cost == sweep(make, objective)
+    assert infeasible == cost - 1
+
+def excludes(cs, lemma, netlist):
+    #whether a lemma rules out the encoding of a netlist
+    cs.solver.push()
+    cs.solver.assert_formula(cs.solver.substitute(lemma, cs.enc.encode(netlist)))
+    sat = cs.solver.check_sat().is_sat()
+    cs.solver.pop()
+    return not sat
+
+def test_enumerate_complete():
+    cs = pipelined_adder(make_btor_solver(), num_cycles = 3, depth = 2, num_inputs = 2, timing = False, incremental = True)
+    netlists = list(cs.enumerate())
+    # the two registers are not identical, so both orders behind the adder are solutions, and there are no others
+    signatures = [cs.enc.signature(netlist) for netlist in netlists]
+    assert len(set(signatures)) == len(signatures)
+    assert set(signatures) == {cs.enc.signature(correct), cs.enc.signature(correct_swapped)}
+    assert cs.cegis.stats["status"] == "unsat"
+    assert all(cs.check_netlist(netlist) for netlist in netlists)
+    assert not cs.cegis.scope_open
+
+def test_enumerate_limit_and_timeout():
+    make = lambda: pipelined_adder(make_btor_solver(), num_cycles = 3, depth = 2, num_inputs = 2, timing = False, incremental = True)
+    assert len(list(make().enumerate(limit = 1))) == 1
+    assert list(make().enumerate(timeout = 0)) == []
+
+def test_blocking_lemmas_and_signature():
+    cs = pipelined_adder(make_btor_solver(), num_cycles = 3, depth = 2, num_inputs = 2, timing = False)
+    lemmas = cs.enc.blocking_lemmas(correct)
+    assert len(lemmas) == 1
+    assert excludes(cs, lemmas[0], correct)
+    assert not excludes(cs, lemmas[0], correct_swapped)
+    assert cs.enc.signature(correct) != cs.enc.signature(correct_swapped)
+
+    # one adder out of two identical ones: the relabeling onto the other adder is blocked as well, and has the same signature
+    cs = adder_library(make_btor_solver(), num_ops = 2, num_inputs = 2)
+    first = ((0, 1), ((0, 1), (0, 0)), ((2,), (3,)), (2,))
+    second = ((0, 1), ((0, 0), (0, 1)), ((3,), (2,)), (2,))
+    lemmas = cs.enc.blocking_lemmas(first)
+    assert len(lemmas) == 2
+    assert excludes(cs, lemmas[0], first) and excludes(cs, lemmas[1], second)
+    assert len(cs.enc.blocking_lemmas(first, max_blocks = 1)) == 1
+    assert cs.enc.signature(first) == cs.enc.signature(second)
+    assert len(list(cs.enumerate())) == 1
+
+@pytest.mark.parametrize(
+    "make,expected",
+    [(lambda: pipelined_adder(make_btor_solver(), num_cycles = 3, depth = 1, width = 8, num_inputs = 2, timing = False), "sat"),
+     # without a register the sum cannot be delayed, at any width
+     (lambda: pipelined_adder_library(make_btor_solver(), (("Add", {"N": 8, "delay": 1}),), num_cycles = 3, depth = 1, width = 8, num_inputs = 2), "unsat")])
+def test_width_abstraction_same_answer(make, expected):
+    assert answer(make) == expected
+    cs = make()
+    netlist = cs.run_abstracted(pipelined_adder_narrow_spec(depth = 1, width = 8), (2, 4))
+    assert ("sat" if netlist is not None else cs.cegis.stats["status"]) == expected
+    if netlist is not None:
+        assert make().check_netlist(netlist)
+
+    # narrow widths never exceed the requested one
+    for width in (1, 2, 4):
+        scale = cs.abstraction.scale(width)
+        assert all(scale(w) <= width for w in cs.abstraction.full_widths)
@@ -0,0 +1,22 @@
+from src.counterexamples import CounterexamplePool
+
+entries = [
+    ({"input_var[0]@0": (4, 3), "input_var[0]@1": (4, 7)}, 1),
+    ({"input_var[0]@0": (4, 0), "input_var[0]@1": (4, 15)}, 5),
+    ({"input_var[0]@0": (4, 9)}, 2),
+]
+
+def test_save_load(tmp_path):
+    path = str(tmp_path / "pool.json")
+    CounterexamplePool(entries).save(path)
+    assert CounterexamplePool.load(path).entries == entries
+
+def test_best():
+    pool = CounterexamplePool(entries)
+    assert [score for _,score in pool.best().entries] == [5, 2, 1]
+    assert pool.best(2).entries == [entries[1], entries[2]]
+
+def test_merge():
+    pool = CounterexamplePool(entries[:2]).merge(CounterexamplePool(entries[1:]))
+    assert len(pool) == 3
+    assert dict((vals["input_var[0]@0"], score) for vals,score in pool.entries) == {(4, 3): 1, (4, 0): 10, (4, 9): 2}
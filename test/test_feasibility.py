@@ -0,0 +1,77 @@
+import pytest
+from src.feasibility import InfeasibleError, Presolve
+
+class FakeNodes:
+    class Node:
+        can_sta = True
+        def __init__(self, ins, outs, delay = 1):
+            self.types = (ins, outs)
+            self.delay = delay
+
+    class CombNode(Node):
+        def sta(self, *delays):
+            return tuple(max(delays) + self.delay for _ in self.types[1])
+
+    class SeqNode(Node):
+        def sta_launch(self):
+            return tuple(self.delay for _ in self.types[1])
+
+        def sta_capture(self, *delays):
+            return tuple(d + 1 for d in delays), tuple(d - 1 for d in delays)
+
+    class SpecNode(Node):
+        pass
+
+n = FakeNodes
+
+def test_keep_unused():
+    # every op has to be connected even if it never reaches an output, so only prune drops the comparator
+    ops = (n.CombNode((4, 4), (4,)), n.CombNode((4, 4), (1,)))
+    kept, domains = Presolve(n, ((4, 4), (4,)), ops, (False, None, None, None)).run()
+    assert kept == [0, 1]
+    assert domains[("op_input", 1, 0)] == (("input", 0), ("input", 1), ("op_output", 0, 0))
+    kept, _ = Presolve(n, ((4, 4), (4,)), ops, (False, None, None, None), prune = True).run()
+    assert kept == [0]
+
+def test_undriven_op():
+    ops = (n.CombNode((4, 4), (4,)), n.CombNode((8, 8), (8,)))
+    with pytest.raises(InfeasibleError) as e:
+        Presolve(n, ((4, 4), (4,)), ops, (False, None, None, None)).run()
+    assert "op 1" in e.value.reason
+
+def test_prune_unusable():
+    # the 8 bit adder has no 8 bit source and the comparator output never reaches the 4 bit output
+    ops = (n.CombNode((4, 4), (4,)), n.CombNode((8, 8), (8,)), n.CombNode((4, 4), (1,)))
+    kept, domains = Presolve(n, ((4, 4), (4,)), ops, (False, None, None, None), prune = True).run()
+    assert kept == [0]
+    assert domains[("output", 0)] == (("input", 0), ("input", 1), ("op_output", 0, 0))
+    # comb op outputs come after the op inputs
+    assert domains[("op_input", 0, 0)] == (("input", 0), ("input", 1))
+
+def test_no_source():
+    with pytest.raises(InfeasibleError) as e:
+        Presolve(n, ((4,), (8,)), (n.CombNode((4, 4), (4,)),), (False, None, None, None)).run()
+    assert "output 0 of width 8" in e.value.reason
+
+def test_output_delay():
+    ops = (n.CombNode((4, 4), (4,), delay = 2),)
+    with pytest.raises(InfeasibleError):
+        Presolve(n, ((4, 4), (4,)), ops, (True, (3, 3), 10, (2,))).run()
+    kept, domains = Presolve(n, ((4, 4), (4,)), ops, (True, (1, 3), 10, (2,))).run()
+    assert domains[("output", 0)] == (("input", 0),)
+
+def test_register_setup():
+    # the register can only capture the early input, the late one misses the cycle
+    ops = (n.SeqNode((4,), (4,)), n.CombNode((4, 4), (4,)))
+    kept, domains = Presolve(n, ((4, 4), (4,)), ops, (True, (0, 5), 3, (10,))).run()
+    assert kept == [0, 1]
+    assert domains[("op_input", 0, 0)] == (("input", 0), ("op_output", 0, 0), ("op_output", 1, 0))
+
+def test_late_register():
+    # the slow register can neither capture the inputs nor its own output within the cycle
+    ops = (n.CombNode((4, 4), (4,)), n.SeqNode((4,), (4,), delay = 5))
+    with pytest.raises(InfeasibleError) as e:
+        Presolve(n, ((4, 4), (4,)), ops, (True, (5, 5), 3, (10,))).run()
+    assert "op 1 input 0" in e.value.reason
+    kept, _ = Presolve(n, ((4, 4), (4,)), ops, (True, (5, 5), 3, (10,)), prune = True).run()
+    assert kept == [0]
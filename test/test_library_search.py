@@ -0,0 +1,36 @@
+from bench.workloads import pipelined_adder_library
+from src.library_search import LibrarySearch
+
+menu = (("Add", {"N": 4, "delay": 1}), ("Register", {"N": 4, "init": 0, "setup": 1, "hold": 1, "output_delay": 1}))
+
+def build(solver, library, **kwargs):
+    # sum of three 2 bit inputs, needs two adders
+    return pipelined_adder_library(solver, library, num_cycles = 0, depth = 0, width = 2, num_inputs = 3, **kwargs)
+
+def test_libraries():
+    search = LibrarySearch(build, menu, max_counts = (2, 1))
+    assert search.max_size == 3
+    assert search.libraries(2) == [(2, 0), (1, 1)]
+    assert search.libraries(3) == [(2, 1)]
+    assert LibrarySearch(build, menu, min_counts = (0, 1), max_size = 2).libraries(1) == [(0, 1)]
+
+def test_expand():
+    search = LibrarySearch(build, menu, max_size = 3)
+    assert [name for name,_ in search.expand((2, 1))] == ["Add", "Add", "Register"]
+
+def test_smallest():
+    # libraries with a mux have no 1 bit source for its select input, which counts as unsat
+    search = LibrarySearch(build, (("Mux", {"N": 2, "delay": 1}), ("Add", {"N": 2, "delay": 1})), max_size = 3)
+    library, netlist = search.run()
+    assert [name for name,_ in library] == ["Add", "Add"]
+    assert netlist is not None
+    assert search.status == "sat"
+    assert search.errors == []
+    assert [status for _,status in search.tried] == ["unsat"] * 4 + ["sat"]
+
+def test_open():
+    # out of budget on the one adder libraries, which is not a proof that none works
+    search = LibrarySearch(build, (("Add", {"N": 2, "delay": 1}), ("Sub", {"N": 2, "delay": 1})), max_size = 1, config = {"kwargs": {"max_iterations": 1}})
+    assert search.run() is None
+    assert search.status == "open"
+    assert [status for _,status in search.tried] == ["max_iterations"] * 2
@@ -0,0 +1,24 @@
+import pytest
+import smt_switch as ss
+import smt_switch.primops as pops
+from src.lvar_encoding import LVAR_ENCODINGS
+
+@pytest.mark.parametrize("encoding", list(LVAR_ENCODINGS))
+@pytest.mark.parametrize("num_lines", [2, 5, 8])
+def test_valid_has_one_model_per_line(encoding, num_lines):
+    solver = ss.create_btor_solver(False)
+    solver.set_opt('produce-models', 'true')
+    solver.set_opt('incremental', 'true')
+    lvars = LVAR_ENCODINGS[encoding](solver, num_lines)
+    lvar = lvars.symbol("lvar")
+    solver.assert_formula(lvars.valid(lvar))
+    if encoding == "binary":
+        # line numbers past the last line are ruled out by the encoding, not by valid
+        solver.assert_formula(lvars.ule(lvar, lvars.const(num_lines - 1)))
+    lines = []
+    while solver.check_sat().is_sat():
+        vals = {var:solver.get_value(var) for var in lvars.vars(lvar)}
+        lines.append(lvars.decode(lvar, vals))
+        same = lvars.conj(solver.make_term(pops.Equal, var, val) for var,val in vals.items())
+        solver.assert_formula(solver.make_term(pops.Not, same))
+    assert sorted(lines) == list(range(num_lines))
@@ -0,0 +1,38 @@
+import logging
+import pytest
+from bench.workloads import make_btor_solver, pipelined_adder
+from src.metrics import LogObserver, MetricsCollector
+
+def test_events_match_stats(caplog):
+    metrics = MetricsCollector()
+    cs = pipelined_adder(make_btor_solver(), num_cycles = 3, depth = 1, num_inputs = 3, timing = True, lazy_timing = True, observers = (metrics, LogObserver()))
+    with caplog.at_level(logging.INFO, logger = "cegis"):
+        assert cs.run() is not None
+    stats = cs.cegis.stats
+    summary = metrics.summary()
+    assert summary["runs"] == 1
+    assert summary["status"] == stats["status"] == "sat"
+    assert summary["iterations"] == stats["iterations"]
+    assert summary["counterexamples"] == stats["counterexamples"] == len(cs.cegis.counterexamples)
+    assert summary["lemmas"] == stats["lemmas"] == len(cs.cegis.lemmas)
+    assert summary["fresh_vars"] == sum(len(cs.cegis.fresh_vars(A_vals)) for A_vals in cs.cegis.counterexamples)
+
+    iterations = metrics.runs[0]["iterations"]
+    assert [it["iteration"] for it in iterations] == list(range(1, stats["iterations"] + 1))
+    assert [it["synth_time"] for it in iterations] == stats["synth_times"]
+    assert [it["verify_time"] for it in iterations] == stats["verify_times"]
+
+    # one line per synth step, one per refine or verify step and one at the end
+    messages = [record.getMessage() for record in caplog.records]
+    assert len([m for m in messages if ": synth " in m]) == stats["iterations"]
+    assert len([m for m in messages if ": verify found " in m or " lemmas in " in m]) == stats["iterations"]
+    assert len([m for m in messages if f": sat after {stats['iterations']} iterations" in m]) == 1
+
+@pytest.mark.parametrize("budget,status", [({"timeout": 0}, "timeout"), ({"max_iterations": 0}, "max_iterations")])
+def test_budget_exit(budget, status):
+    metrics = MetricsCollector()
+    cs = pipelined_adder(make_btor_solver(), num_cycles = 3, depth = 1, num_inputs = 3, timing = True, observers = (metrics,), **budget)
+    assert cs.run() is None
+    assert cs.cegis.stats["status"] == status
+    assert metrics.summary()["status"] == status
+    assert metrics.summary()["iterations"] == 0
@@ -110,4 +110,47 @@ def test_register_delay(d, setup, hold, output_delay):
     res = register.timing(d_)
     assert register.setup[0] == solver.make_term(d + setup, BVsort)
     assert register.hold[0] == solver.make_term(d - hold, BVsort)
-    assert res[0] == solver.make_term(output_delay, BVsort)
\ No newline at end of file
+    assert res[0] == solver.make_term(output_delay, BVsort)
+
+@pytest.mark.parametrize(
+    "N,x,y", 
+    [(8, random.randint(0, 255), random.randint(0, 255)) for _ in range(10)])
+def test_sub_sim(N, x, y):
+    BVN = solver.make_sort(BV, N)
+    sub = nodes.Sub(N = N, delay = 0)
+    res = sub(solver.make_term(x, BVN), solver.make_term(y, BVN))
+    assert res[0] == solver.make_term(sub.sim(x, y)[0], BVN)
+
+@pytest.mark.parametrize(
+    "N,s,x,y", 
+    [(4, 1, 7, 8), (2, 0, 1, 0), (15, 1, 0, 96), (27, 0, 100, 1)])
+def test_mux_sim(N, s, x, y):
+    mux = nodes.Mux(N = N, delay = 0)
+    assert mux.sim(s, x, y) == ((x if s else y),)
+
+@pytest.mark.parametrize(
+    "N,d,init", 
+    [(4, 1, 0), (2, 0, 1), (15, 96, 4), (27, 100, 20)])
+def test_register_sim(N, d, init):
+    register = nodes.Register(N = N, init = init, setup = 0, hold = 0, output_delay = 0)
+    state = register.sim_init()
+    assert register.sim(state) == (init,)
+    state = register.sim_next(state, d)
+    assert register.sim(state) == (d,)
+
+@pytest.mark.parametrize(
+    "x,y,delay", 
+    [(4, 1, 7), (2, 0, 1), (15, 1, 0), (27, 0, 100)])
+def test_add_sta(x, y, delay):
+    BVsort = solver.make_sort(BV, 16)
+    add = nodes.Add(N = 4, delay = delay)
+    res = add.timing(solver.make_term(x, BVsort), solver.make_term(y, BVsort))
+    assert res[0] == solver.make_term(add.sta(x, y)[0], BVsort)
+
+@pytest.mark.parametrize(
+    "d,setup,hold,output_delay", 
+    [(4, 1, 7, 0), (2, 0, 1, 5), (15, 1, 0, 3), (27, 0, 100, 2)])
+def test_register_sta(d, setup, hold, output_delay):
+    register = nodes.Register(N = 4, init = 0, setup = setup, hold = hold, output_delay = output_delay)
+    assert register.sta_launch() == (output_delay,)
+    assert register.sta_capture(d) == ((d + setup,), (d - hold,))
@@ -0,0 +1,20 @@
+import pytest
+from src.options import Budget, CegisOptions, EncodingOptions, synth_options
+
+def test_synth_options_groups():
+    res = synth_options(incremental = True, max_instances = 4, presolve = True, timeout = 2.0, enforce_timing = True, observers = ())
+    assert res == {
+        "cegis_options": CegisOptions(incremental = True, max_instances = 4),
+        "encoding_options": EncodingOptions(presolve = True),
+        "budget": Budget(timeout = 2.0),
+        "enforce_timing": True,
+        "observers": (),
+    }
+
+def test_synth_options_passthrough():
+    assert synth_options() == {}
+    assert synth_options(budget = Budget(max_iterations = 3)) == {"budget": Budget(max_iterations = 3)}
+
+def test_synth_options_conflict():
+    with pytest.raises(TypeError):
+        synth_options(budget = Budget(), timeout = 1.0)
@@ -0,0 +1,40 @@
+import pytest
+from bench.workloads import make_btor_solver, pipelined_adder, pipelined_adder_library
+from src.parallel import CubeAndConquer, Portfolio, make_cubes
+
+problem = {"num_cycles": 3, "depth": 1, "num_inputs": 3, "timing": False}
+
+def test_portfolio():
+    configs = ({"backend": "btor", "kwargs": problem}, {"backend": "btor", "options": {"seed": 1}, "kwargs": {**problem, "incremental": True}})
+    portfolio = Portfolio(pipelined_adder, configs, mp_context = "spawn")
+    config, netlist = portfolio.run()
+    assert config in configs
+    assert portfolio.status == "sat"
+    assert pipelined_adder(make_btor_solver(), **problem).check_netlist(netlist)
+
+def test_portfolio_budget_is_no_answer():
+    # without a single iteration there is no candidate, which must not be taken for unsat
+    configs = ({"backend": "btor", "kwargs": {**problem, "max_iterations": 0}},) * 2
+    portfolio = Portfolio(pipelined_adder, configs, mp_context = "spawn")
+    assert portfolio.run() is None
+    assert portfolio.status == "max_iterations"
+    assert portfolio.exits == {0: "max_iterations", 1: "max_iterations"}
+
+# the pipelined adder over a library without registers, which cannot delay the sum
+unsat_problem = {"library": (("Add", {"N": 4, "delay": 1}),), "num_cycles": 2, "depth": 1, "num_inputs": 2}
+
+def test_make_cubes():
+    cs = pipelined_adder(make_btor_solver(), **problem)
+    cubes = make_cubes(cs.enc, 8)
+    assert len(cubes) >= 8
+    assert len(set(cubes)) == len(cubes)
+
+@pytest.mark.parametrize("build,kwargs", [(pipelined_adder, problem), (pipelined_adder_library, unsat_problem)])
+def test_cube_and_conquer_same_answer(build, kwargs):
+    expected = build(make_btor_solver(), **kwargs).run()
+    cc = CubeAndConquer(build, 2, 8, {"kwargs": {**kwargs, "incremental": True}}, mp_context = "spawn")
+    netlist = cc.run()
+    assert cc.errors == {}
+    assert cc.status == ("sat" if expected is not None else "unsat")
+    if netlist is not None:
+        assert build(make_btor_solver(), **kwargs).check_netlist(netlist)
@@ -0,0 +1,52 @@
+import pono
+import smt_switch.primops as pops
+from bench.workloads import fib, make_btor_solver
+from src.circuit_synth import CircuitSynth
+from src.nodes import Nodes
+from src.proof import EquivalenceProof
+from src.spec import StepSpec
+
+def adder(s, num_cycles = 1):
+    # in0 + in1 from a single adder, as a StepSpec without state
+    fts = pono.FunctionalTransitionSystem(s)
+    n = Nodes(fts, 16)
+    spec = StepSpec(lambda state, inputs: ((s.make_term(pops.BVAdd, *inputs),), state), ())
+    return CircuitSynth(n, ((4, 4), (4,)), (n.Add(N = 4, delay = 1),), spec, num_cycles)
+
+# inputs on lines 0 and 1, the adder output on line 2
+adder_correct = ((0, 1), ((0, 1),), ((2,),), (2,))
+adder_wrong = ((0, 1), ((0, 1),), ((2,),), (0,))
+
+def test_proof_adder():
+    cs = adder(make_btor_solver())
+    proof = EquivalenceProof(cs)
+    assert proof.check(adder_correct) is None
+    assert proof.status == "proved"
+
+    A_vals = proof.check(adder_wrong)
+    assert proof.status == "refuted"
+    # the mismatch is on the first cycle, and the trace is a counterexample of the wrong netlist only
+    assert proof.trace_length == 0
+    assert set(A_vals) <= set(cs.input_vars[0])
+    cs.cegis.add_counterexample(A_vals)
+    k = len(cs.cegis.counterexamples) - 1
+    assert cs.cegis.refutes(cs.enc.encode(adder_wrong), k)
+    assert not cs.cegis.refutes(cs.enc.encode(adder_correct), k)
+
+def test_run_unbounded_adder():
+    cs = adder(make_btor_solver())
+    netlist = cs.run_unbounded()
+    assert netlist is not None
+    assert cs.proof.status == "proved"
+    assert cs.proof.num_cycles == cs.num_cycles == 1
+
+def test_run_unbounded_fib():
+    cs = fib(make_btor_solver(), num_cycles = 3)
+    netlist = cs.run_unbounded()
+    assert netlist is not None
+    assert cs.proof.status == "proved"
+    # the proof bound is tracked on the proof, the synthesis problem keeps its own
+    assert cs.num_cycles == 3
+
+    check = fib(make_btor_solver(), num_cycles = 10)
+    assert check.check_netlist(netlist)
@@ -0,0 +1,41 @@
+import os
+import pytest
+from src.result_cache import ResultCache
+
+netlist = ((0, 1), ((0, 1), (2, 1)), ((2,), (3,)), (3,))
+
+def test_roundtrip(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    assert cache.get("a") is None
+    cache.put("a", netlist)
+    cache.put("b", None)
+    assert cache.get("a") == {"netlist": netlist}
+    assert cache.get("b") == {"netlist": None}
+    assert cache.stats == {"hits": 2, "misses": 1}
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    with open(cache.path("a"), "w") as f:
+        f.write("{")
+    assert cache.get("a") is None
+
+@pytest.mark.parametrize("max_entries", [2, 3, 4])
+def test_lru_eviction(tmp_path, max_entries):
+    cache = ResultCache(str(tmp_path), max_entries)
+    keys = tuple(f"k{i}" for i in range(max_entries))
+    for i,k in enumerate(keys):
+        cache.put(k, netlist)
+        os.utime(cache.path(k), (i, i))
+    # using the oldest entry makes the second oldest the least recently used
+    assert cache.get(keys[0]) is not None
+    cache.put("new", netlist)
+    kept = sorted(name[:-len(".json")] for name in os.listdir(str(tmp_path)))
+    assert kept == sorted(set(keys + ("new",)) - {keys[1]})
+
+def test_untrusted_unsat_is_a_miss(tmp_path):
+    cache = ResultCache(str(tmp_path), trust_unsat = False)
+    cache.put("a", netlist)
+    cache.put("b", None)
+    assert cache.get("a") == {"netlist": netlist}
+    assert cache.get("b") is None
+    assert cache.stats == {"hits": 1, "misses": 1}
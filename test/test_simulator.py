@@ -0,0 +1,53 @@
+import pytest
+from bench.workloads import make_btor_solver, fib, pipelined_adder
+from src.simulator import Simulator
+
+pytest.importorskip("numpy")
+from src.batch_sim import BatchSimulator
+
+# pipelined_adder(num_inputs = 2, depth = 2) netlists, see test_circuit_synth
+adder_netlists = [((0, 1), ((0, 1), (first_register_input,), (2,)), ((4,), (2,), (3,)), (3,)) for first_register_input in (1, 4)]
+
+# fib: the adder on line 3 sums both registers, which hold the last two numbers
+fib_netlist = ((0,), ((1, 2), (2,), (3,)), ((3,), (1,), (2,)), (1,))
+
+@pytest.mark.parametrize(
+    "make,netlist",
+    [(lambda s: pipelined_adder(s, num_cycles = 3, depth = 2, num_inputs = 2, width = 4, timing = False), netlist) for netlist in adder_netlists] +
+    [(lambda s: fib(s, num_cycles = 3, width = 4), fib_netlist)])
+def test_batch_matches_scalar(make, netlist):
+    enc = make(make_btor_solver()).enc
+    batch = BatchSimulator(enc)
+    scalar = Simulator(enc)
+    assert batch.supported and scalar.supported
+
+    inputs = batch.random_inputs(16, 8, seed = 1)
+    outputs = batch.run(netlist, inputs)
+    for n in range(16):
+        trace = [tuple(int(x[n]) for x in inputs_at_cycle) for inputs_at_cycle in inputs]
+        assert scalar.run(netlist, trace) == [tuple(int(o[n]) for o in outs) for outs in outputs]
+
+def test_prefilter_rejects_without_verifier():
+    cs = pipelined_adder(make_btor_solver(), num_cycles = 3, depth = 2, num_inputs = 2, timing = False, prefilter = True)
+    assert cs.sim_filter is not None and cs.sim_filter.batch is not None
+
+    def verify(*args, **kwargs):
+        raise AssertionError("the verifier was called")
+    cs.cegis.check = verify
+    # the wrong netlist fails on the random traces, the correct one has to go on to the verifier
+    wrong = cs.enc.encode(adder_netlists[0])
+    cexs = cs.cegis.find_counterexamples(wrong)
+    assert len(cexs) == 1
+    with pytest.raises(AssertionError):
+        cs.cegis.find_counterexamples(cs.enc.encode(adder_netlists[1]))
+    del cs.cegis.check
+
+    # the simulated counterexample refutes the wrong netlist in the solver as well
+    cs.cegis.add_counterexample(cexs[0])
+    assert cs.cegis.refutes(wrong, 0)
+    assert cs.cegis.find_counterexamples(cs.enc.encode(adder_netlists[1])) == []
+
+def test_prefilter_run():
+    netlist = pipelined_adder(make_btor_solver(), num_cycles = 3, depth = 2, num_inputs = 2, timing = False, prefilter = True).run()
+    assert netlist is not None
+    assert pipelined_adder(make_btor_solver(), num_cycles = 3, depth = 2, num_inputs = 2, timing = False).check_netlist(netlist)
@@ -0,0 +1,39 @@
+import pytest
+from src.spec import StepSpec, memoize_prefix
+
+def test_step_spec_replay():
+    # running sum of the first input
+    spec = StepSpec(lambda state, inputs: ((state + inputs[0],), state + inputs[0]), 0)
+    assert spec(((1,), (2,), (3,))) == (6,)
+
+def test_memoize_prefix():
+    calls = []
+
+    @memoize_prefix
+    def fib(inputs):
+        calls.append(len(inputs))
+        if len(inputs) < 2:
+            return (len(inputs),)
+        return (fib(inputs[:-1])[0] + fib(inputs[:-2])[0],)
+
+    assert fib(tuple((0,) for _ in range(30))) == (832040,)
+    assert sorted(calls) == list(range(31))
+
+def test_step_spec_no_inputs():
+    spec = StepSpec(lambda state, inputs: ((state,), state), 0)
+    with pytest.raises(ValueError):
+        spec(())
+
+def test_memoize_prefix_bounded():
+    calls = []
+
+    @memoize_prefix(maxsize = 3)
+    def fib(inputs):
+        calls.append(len(inputs))
+        if len(inputs) < 2:
+            return (len(inputs),)
+        return (fib(inputs[:-1])[0] + fib(inputs[:-2])[0],)
+
+    assert fib(tuple((0,) for _ in range(30))) == (832040,)
+    assert sorted(calls) == list(range(31))
+    assert len(fib.memo) == 3